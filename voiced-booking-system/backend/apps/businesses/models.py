@@ -1,5 +1,5 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from apps.core.mixins import BusinessModel, BaseFieldsMixin, BusinessStatsMixin
 from apps.core.utils import PHONE_REGEX_VALIDATOR
@@ -82,6 +82,10 @@ class Business(BusinessModel, BusinessStatsMixin):
         if is_new:
             BusinessDashboardConfig.objects.create(business=self)
             BusinessOnboardingStatus.objects.create(business=self)
+        else:
+            from apps.vapi_integration.tenant_cache import tenant_resolver
+            pk, slug = self.pk, self.slug
+            transaction.on_commit(lambda: tenant_resolver.invalidate(pk, slug))
     
     @property
     def full_address(self):
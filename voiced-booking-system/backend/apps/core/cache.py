@@ -1,6 +1,12 @@
-from functools import wraps
+from collections import OrderedDict
+from functools import lru_cache, wraps
 from typing import Any, Callable, Optional
+from django.conf import settings
 from django.core.cache import cache
+import hashlib
+import threading
+import time
+import weakref
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,6 +25,19 @@ class CacheService:
     def delete(self, key: str):
         cache.delete(key)
     
+    async def aget(self, key: str, default=None):
+        return await cache.aget(key, default)
+    
+    async def aset(self, key: str, value: Any, timeout: Optional[int] = None):
+        await cache.aset(key, value, timeout or self.default_timeout)
+    
+    def incr(self, key: str, delta: int = 1) -> int:
+        cache.add(key, 0, None)
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            return 0
+    
     def get_or_set(self, key: str, callable_func: Callable, timeout: Optional[int] = None) -> Any:
         result = cache.get(key)
         if result is None:
@@ -33,30 +52,44 @@ class CacheService:
             cache.clear()
 
 
-class CircuitBreaker:
-    def __init__(self, max_failures: int = 3):
-        self.max_failures = max_failures
-        self.failure_count = 0
-        self.is_open = False
+class LocalLRUCache:
+    def __init__(self, max_size: int = 1024, timeout: Optional[float] = None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
     
-    def __call__(self, func: Callable) -> Callable:
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            if self.is_open and self.failure_count >= self.max_failures:
-                logger.warning(f"Circuit breaker OPEN for {func.__name__}")
-                raise Exception("Service temporarily unavailable")
-            
-            try:
-                result = func(*args, **kwargs)
-                self.failure_count = 0
-                self.is_open = False
-                return result
-            except Exception as e:
-                self.failure_count += 1
-                if self.failure_count >= self.max_failures:
-                    self.is_open = True
-                raise e
-        return wrapper
+    def get(self, key: str, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: Any, timeout: Optional[float] = None):
+        timeout = timeout if timeout is not None else self.timeout
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self):
+        return len(self._data)
 
 
 def cached_method(timeout: int = 300, key_func: Optional[Callable] = None):
@@ -66,7 +99,8 @@ def cached_method(timeout: int = 300, key_func: Optional[Callable] = None):
             if key_func:
                 cache_key = key_func(self, *args, **kwargs)
             else:
-                cache_key = f"{func.__name__}:{hash(str(args) + str(kwargs))}"
+                digest = hashlib.md5(repr((args, sorted(kwargs.items()))).encode('utf-8')).hexdigest()
+                cache_key = f"{func.__module__}.{func.__qualname__}:{digest}"
             
             result = cache.get(cache_key)
             if result is None:
@@ -77,5 +111,25 @@ def cached_method(timeout: int = 300, key_func: Optional[Callable] = None):
     return decorator
 
 
+@lru_cache(maxsize=1)
+def get_redis_client():
+    import redis
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+_async_redis_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis_client():
+    import asyncio
+    import redis.asyncio
+    
+    # asyncio connection pools belong to the event loop that created them
+    loop = asyncio.get_running_loop()
+    client = _async_redis_clients.get(loop)
+    if client is None:
+        client = _async_redis_clients[loop] = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+    return client
+
+
 cache_service = CacheService()
-circuit_breaker = CircuitBreaker()
@@ -0,0 +1,209 @@
+from dataclasses import dataclass, fields
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+from django.conf import settings
+from django.core.cache import cache
+from .metrics import metrics
+import math
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+OUTCOMES = ('ok', 'failed')
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuit '{name}' is open, retry in {math.ceil(retry_after)}s")
+
+
+@dataclass(frozen=True)
+class BreakerPolicy:
+    window_seconds: int = 60
+    bucket_seconds: int = 10
+    min_requests: int = 10
+    failure_rate: float = 0.5
+    cooldown_seconds: int = 30
+    half_open_requests: int = 1
+    
+    @classmethod
+    def for_breaker(cls, name: str, **overrides) -> 'BreakerPolicy':
+        # Settings defaults, then per-breaker settings overrides, then the caller's own
+        values = {
+            'window_seconds': settings.CIRCUIT_BREAKER_WINDOW,
+            'min_requests': settings.CIRCUIT_BREAKER_MIN_REQUESTS,
+            'failure_rate': settings.CIRCUIT_BREAKER_FAILURE_RATE,
+            'cooldown_seconds': settings.CIRCUIT_BREAKER_COOLDOWN,
+            'half_open_requests': settings.CIRCUIT_BREAKER_HALF_OPEN_REQUESTS,
+        }
+        values.update(getattr(settings, 'CIRCUIT_BREAKER_POLICIES', {}).get(name, {}))
+        values.update(overrides)
+        known = {field.name for field in fields(cls)}
+        return cls(**{key: value for key, value in values.items() if key in known})
+
+
+def _always(exc: Exception) -> bool:
+    return True
+
+
+# State lives in the shared cache so every process and worker sees the same circuit:
+# per-bucket outcome counters for the failure-rate window, the time the circuit opened,
+# and a counter of half-open trial requests handed out since the cooldown ended
+class CircuitBreaker:
+    KEY_PREFIX = 'circuit'
+    
+    def __init__(self, name: str, policy: Optional[BreakerPolicy] = None,
+                 is_failure: Optional[Callable[[Exception], bool]] = None, clock: Callable[[], float] = time.time):
+        self.name = name
+        self.policy = policy or BreakerPolicy()
+        self.is_failure = is_failure or _always
+        self._clock = clock
+    
+    def __call__(self, func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        return wrapper
+    
+    def call(self, func: Callable, *args, **kwargs):
+        trial = self.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.record(trial, failed=self.is_failure(e))
+            raise
+        self.record(trial, failed=False)
+        return result
+    
+    def acquire(self) -> bool:
+        try:
+            opened_at = cache.get(self._key('opened'))
+            if opened_at is None:
+                return False
+            retry_after = opened_at + self.policy.cooldown_seconds - self._clock()
+            if retry_after <= 0 and self._claim_trial():
+                return True
+        except Exception as e:
+            # A breaker that cannot read its state must not take the dependency down with it
+            logger.warning(f"Circuit '{self.name}' state unavailable, allowing request: {e}")
+            return False
+        
+        metrics.increment('circuit_breaker.rejected', breaker=self.name)
+        raise CircuitOpenError(self.name, max(retry_after, 0))
+    
+    def record(self, trial: bool, failed: bool):
+        try:
+            if trial:
+                self._settle_trial(failed)
+            else:
+                self._count(failed)
+        except Exception as e:
+            logger.warning(f"Could not record outcome for circuit '{self.name}': {e}")
+    
+    def state(self) -> str:
+        opened_at = cache.get(self._key('opened'))
+        if opened_at is None:
+            return 'closed'
+        return 'open' if opened_at + self.policy.cooldown_seconds > self._clock() else 'half_open'
+    
+    def reset(self):
+        buckets = self._buckets(self._clock())
+        cache.delete_many(
+            [self._key('opened'), self._key('trials')] +
+            [self._key(bucket, outcome) for bucket in buckets for outcome in OUTCOMES]
+        )
+    
+    def _claim_trial(self) -> bool:
+        # Trial slots expire with the cooldown, so a probe lost with its process frees its slot
+        trials_key = self._key('trials')
+        cache.add(trials_key, 0, self.policy.cooldown_seconds)
+        if cache.incr(trials_key) > self.policy.half_open_requests:
+            return False
+        metrics.increment('circuit_breaker.trial', breaker=self.name)
+        return True
+    
+    def _settle_trial(self, failed: bool):
+        if failed:
+            cache.set(self._key('opened'), self._clock(), None)
+            cache.delete(self._key('trials'))
+            self._transition('open', 'trial request failed')
+        else:
+            self.reset()
+            self._transition('closed', 'trial request succeeded')
+    
+    def _count(self, failed: bool):
+        now = self._clock()
+        key = self._key(int(now // self.policy.bucket_seconds), OUTCOMES[failed])
+        cache.add(key, 0, self.policy.window_seconds + self.policy.bucket_seconds)
+        try:
+            cache.incr(key)
+        except ValueError:
+            return
+        # Successes never trip the circuit, so only failures pay for reading the window
+        if failed:
+            self._maybe_trip(now)
+    
+    def _maybe_trip(self, now: float):
+        keys = [self._key(bucket, outcome) for bucket in self._buckets(now) for outcome in OUTCOMES]
+        counts = cache.get_many(keys)
+        total = sum(counts.values())
+        failures = sum(count for key, count in counts.items() if key.endswith(':failed'))
+        if total < self.policy.min_requests or failures / total < self.policy.failure_rate:
+            return
+        # Only the process that wins the add reports the transition
+        if cache.add(self._key('opened'), now, None):
+            self._transition('open', f'{failures}/{total} requests failed')
+    
+    def _buckets(self, now: float) -> List[int]:
+        current = int(now // self.policy.bucket_seconds)
+        count = math.ceil(self.policy.window_seconds / self.policy.bucket_seconds)
+        return list(range(current - count + 1, current + 1))
+    
+    def _transition(self, state: str, reason: str):
+        metrics.increment('circuit_breaker.state', breaker=self.name, state=state)
+        log = logger.warning if state == 'open' else logger.info
+        log(f"Circuit '{self.name}' {state}: {reason}")
+    
+    def _key(self, *parts) -> str:
+        return ':'.join([self.KEY_PREFIX, self.name, *map(str, parts)])
+
+
+# Breakers are named '<dependency>.<endpoint>' so one failing endpoint only fails fast for itself
+class CircuitBreakerRegistry:
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, name: str, is_failure: Optional[Callable[[Exception], bool]] = None, **policy) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(name)
+                if breaker is None:
+                    breaker = self._breakers[name] = CircuitBreaker(
+                        name, BreakerPolicy.for_breaker(name, **policy), is_failure
+                    )
+        return breaker
+    
+    def __call__(self, name: str, is_failure: Optional[Callable[[Exception], bool]] = None, **policy) -> Callable:
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                # Resolved on first call so the policy reflects the running settings
+                return self.get(name, is_failure, **policy).call(func, *args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def names(self) -> List[str]:
+        return sorted(self._breakers)
+    
+    def clear(self):
+        with self._lock:
+            self._breakers.clear()
+
+
+circuit_breakers = CircuitBreakerRegistry()
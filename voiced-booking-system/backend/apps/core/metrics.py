@@ -0,0 +1,105 @@
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+from .cache import get_redis_client
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsRecorder:
+    KEY_PREFIX = 'metrics'
+    
+    def __init__(self, flush_interval: Optional[int] = None):
+        self._flush_interval = flush_interval
+        self._totals = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flusher: Optional[threading.Thread] = None
+    
+    @property
+    def flush_interval(self) -> int:
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return getattr(settings, 'METRICS_FLUSH_INTERVAL', 10)
+    
+    def increment(self, name: str, value: int = 1, **tags):
+        self._record(name, tags, value, 0.0)
+    
+    def timing(self, name: str, duration_ms: float, **tags):
+        self._record(name, tags, 1, duration_ms)
+    
+    @contextmanager
+    def timer(self, name: str, **tags):
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            yield
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            self.timing(name, (time.perf_counter() - started) * 1000, outcome=outcome, **tags)
+    
+    def snapshot(self, name: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                self._series(series_name, tags): {'count': count, 'total_ms': total_ms}
+                for (series_name, tags), (count, total_ms) in self._totals.items()
+                if name is None or series_name == name
+            }
+    
+    def read(self, name: str) -> Dict[str, float]:
+        raw = get_redis_client().hgetall(f"{self.KEY_PREFIX}:{name}")
+        return {field.decode('utf-8'): float(value) for field, value in raw.items()}
+    
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        
+        try:
+            pipeline = get_redis_client().pipeline(transaction=False)
+            for (name, tags), (count, total_ms) in pending.items():
+                key = f"{self.KEY_PREFIX}:{name}"
+                field = self._series('', tags) or 'all'
+                pipeline.hincrby(key, f"{field}:count", count)
+                if total_ms:
+                    pipeline.hincrbyfloat(key, f"{field}:total_ms", round(total_ms, 3))
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Failed to flush metrics: {e}")
+    
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+            self._pending.clear()
+    
+    def _record(self, name: str, tags: Dict, count: int, duration_ms: float):
+        key = (name, tuple(sorted((k, str(v)) for k, v in tags.items())))
+        with self._lock:
+            for bucket in (self._totals, self._pending):
+                current = bucket.get(key, (0, 0.0))
+                bucket[key] = (current[0] + count, current[1] + duration_ms)
+            due = self.flush_interval and time.monotonic() - self._last_flush >= self.flush_interval
+            if due and (self._flusher is None or not self._flusher.is_alive()):
+                # Recording happens on request paths, including the async webhook view's event loop, so
+                # the Redis round trip runs on its own thread; one flush at a time is enough
+                self._last_flush = time.monotonic()
+                self._flusher = threading.Thread(target=self.flush, name='metrics-flush', daemon=True)
+                self._flusher.start()
+    
+    @staticmethod
+    def _series(name: str, tags: Tuple) -> str:
+        labels = ','.join(f"{k}={v}" for k, v in tags)
+        if not name:
+            return labels
+        return f"{name}|{labels}" if labels else name
+
+
+metrics = MetricsRecorder()
@@ -0,0 +1,11 @@
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def vapi_webhook(event_type, call_id='call-123', tenant_id=None, timestamp=None, **call_fields):
+    call = {'id': call_id, **call_fields}
+    if tenant_id is not None:
+        call['metadata'] = {'tenant_id': str(tenant_id)}
+    message = {'type': event_type, 'call': call}
+    if timestamp is not None:
+        message['timestamp'] = timestamp
+    return {'message': message}
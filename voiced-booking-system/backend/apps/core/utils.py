@@ -2,6 +2,7 @@ import random
 import string
 from datetime import datetime
 from typing import Optional
+from django.db import DEFAULT_DB_ALIAS
 from django.utils.text import slugify
 from django.core.validators import RegexValidator
 from django.utils.translation import gettext_lazy as _
@@ -64,6 +65,11 @@ def get_model_fields(model, exclude_fields=None):
     return [field.name for field in model._meta.fields if field.name not in exclude_fields]
 
 
+def instance_from_values(model, values):
+    field_names = [f.attname for f in model._meta.concrete_fields if f.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, field_names, [values[name] for name in field_names])
+
+
 def clean_dict(d):
     return {k: v for k, v in d.items() if v is not None and v != ''}
 
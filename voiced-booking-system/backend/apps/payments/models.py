@@ -15,6 +15,8 @@ class SubscriptionPlan(SimpleModel):
     max_resources = models.IntegerField(_('max resources'), default=5)
     max_appointments_per_month = models.IntegerField(_('max appointments per month'), default=100)
     max_staff_users = models.IntegerField(_('max staff users'), default=3)
+    max_webhooks_per_minute = models.PositiveIntegerField(_('max webhooks per minute'), default=300)
+    webhook_burst = models.PositiveIntegerField(_('webhook burst'), default=60)
     features = models.JSONField(_('features'), default=dict, blank=True)
     stripe_price_id_monthly = models.CharField(_('stripe monthly price ID'), max_length=100, blank=True)
     stripe_price_id_yearly = models.CharField(_('stripe yearly price ID'), max_length=100, blank=True)
@@ -1,48 +1,55 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import requests
 from django.conf import settings
 from django.core.cache import cache
-from .optimizations import cached_method, circuit_breaker, VapiCacheKeys
+from apps.core.circuit_breakers import circuit_breakers
+from .optimizations import cached_method, VapiCacheKeys
+from .security import TENANT_HEADER
+from .transport import VapiTransport, vapi_transport
+import hashlib
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def is_vapi_outage(exc: Exception) -> bool:
+    # Rejected requests (404 lookups, validation errors) say nothing about Vapi's health
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code >= 500 or exc.response.status_code == 429
+    return isinstance(exc, requests.RequestException)
+
+
+def assistant_config_hash(assistant_config: Dict) -> str:
+    canonical = json.dumps(assistant_config, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
 class VapiAPIClient:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, transport: Optional[VapiTransport] = None):
         self.api_key = api_key or settings.VAPI_API_KEY
         self.base_url = settings.VAPI_BASE_URL
-        self.session = requests.Session()
-        self.session.headers.update({
+        # Clients are cheap to create; connections live in the shared, process-wide transport
+        self.transport = transport or vapi_transport
+        self.headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
-        })
+        }
     
-    @circuit_breaker
     def create_assistant(self, config: Dict) -> Dict:
-        response = self.session.post(f'{self.base_url}/assistant', json=config)
-        response.raise_for_status()
-        return response.json()
+        return self._request('POST', '/assistant', 'create_assistant', json=config).json()
     
-    @circuit_breaker
     def update_assistant(self, assistant_id: str, config: Dict) -> Dict:
-        response = self.session.patch(f'{self.base_url}/assistant/{assistant_id}', json=config)
-        response.raise_for_status()
-        return response.json()
+        # PATCH sets absolute values, so repeating it is harmless
+        return self._request('PATCH', f'/assistant/{assistant_id}', 'update_assistant', idempotent=True, json=config).json()
     
-    @circuit_breaker
     def get_assistant(self, assistant_id: str) -> Dict:
-        response = self.session.get(f'{self.base_url}/assistant/{assistant_id}')
-        response.raise_for_status()
-        return response.json()
+        return self._request('GET', f'/assistant/{assistant_id}', 'get_assistant').json()
     
-    @circuit_breaker
     def delete_assistant(self, assistant_id: str) -> bool:
-        response = self.session.delete(f'{self.base_url}/assistant/{assistant_id}')
-        response.raise_for_status()
+        self._request('DELETE', f'/assistant/{assistant_id}', 'delete_assistant')
         return True
     
-    @circuit_breaker
     def create_phone_call(self, phone_number: str, assistant_id: str, **kwargs) -> Dict:
         payload = {
             'phoneNumberId': kwargs.get('phone_number_id'),
@@ -50,24 +57,15 @@ class VapiAPIClient:
             'customer': {'number': phone_number},
             **kwargs
         }
-        response = self.session.post(f'{self.base_url}/call/phone', json=payload)
-        response.raise_for_status()
-        return response.json()
+        return self._request('POST', '/call/phone', 'create_phone_call', json=payload).json()
     
-    @circuit_breaker
     def get_call(self, call_id: str) -> Dict:
-        response = self.session.get(f'{self.base_url}/call/{call_id}')
-        response.raise_for_status()
-        return response.json()
+        return self._request('GET', f'/call/{call_id}', 'get_call').json()
     
-    @circuit_breaker
     def list_calls(self, limit: int = 100, **filters) -> Dict:
         params = {'limit': limit, **filters}
-        response = self.session.get(f'{self.base_url}/call', params=params)
-        response.raise_for_status()
-        return response.json()
+        return self._request('GET', '/call', 'list_calls', params=params).json()
     
-    @circuit_breaker
     def buy_phone_number(self, area_code: str = None, name: str = None) -> Dict:
         payload = {}
         if area_code:
@@ -75,21 +73,28 @@ class VapiAPIClient:
         if name:
             payload['name'] = name
         
-        response = self.session.post(f'{self.base_url}/phone-number/buy', json=payload)
-        response.raise_for_status()
-        return response.json()
+        return self._request('POST', '/phone-number/buy', 'buy_phone_number', json=payload).json()
     
-    @circuit_breaker
     def list_phone_numbers(self) -> List[Dict]:
-        response = self.session.get(f'{self.base_url}/phone-number')
-        response.raise_for_status()
-        return response.json()
+        return self._request('GET', '/phone-number', 'list_phone_numbers').json()
     
-    @circuit_breaker
     def update_phone_number(self, phone_number_id: str, config: Dict) -> Dict:
-        response = self.session.patch(f'{self.base_url}/phone-number/{phone_number_id}', json=config)
+        return self._request(
+            'PATCH', f'/phone-number/{phone_number_id}', 'update_phone_number', idempotent=True, json=config
+        ).json()
+    
+    def _request(self, method: str, path: str, endpoint: str, idempotent: Optional[bool] = None,
+                 **kwargs) -> requests.Response:
+        # One breaker per endpoint: a failing purchase endpoint must not fail fast for assistant lookups
+        breaker = circuit_breakers.get(f'vapi.{endpoint}', is_failure=is_vapi_outage)
+        return breaker.call(self._send, method, path, endpoint, idempotent, **kwargs)
+    
+    def _send(self, method: str, path: str, endpoint: str, idempotent: Optional[bool], **kwargs) -> requests.Response:
+        response = self.transport.request(
+            method, f'{self.base_url}{path}', endpoint, idempotent=idempotent, headers=self.headers, **kwargs
+        )
         response.raise_for_status()
-        return response.json()
+        return response
 
 
 class VapiBusinessService:
@@ -110,15 +115,20 @@ class VapiBusinessService:
             except requests.HTTPError:
                 pass
         
-        assistant_config = self._build_assistant_config(config)
+        assistant_config, config_hash = self.assistant_payload(config)
         result = self.client.create_assistant(assistant_config)
         
         config.assistant_id = result['id']
+        config.assistant_config_hash = config_hash
         config.save()
         
         logger.info(f"Created assistant {result['id']} for business {self.business.id}")
         return result['id']
     
+    def assistant_payload(self, config) -> Tuple[Dict, str]:
+        assistant_config = self._build_assistant_config(config)
+        return assistant_config, assistant_config_hash(assistant_config)
+    
     def _build_assistant_config(self, config) -> Dict:
         return {
             **config.assistant_config,
@@ -126,6 +136,11 @@ class VapiBusinessService:
             'name': config.assistant_name,
             'serverUrl': config.server_url,
             'serverUrlSecret': config.server_secret,
+            'server': {
+                'url': config.server_url,
+                'secret': config.server_secret,
+                'headers': {TENANT_HEADER: str(config.business_id)},
+            },
         }
     
     def _get_business_tools(self) -> List[Dict]:
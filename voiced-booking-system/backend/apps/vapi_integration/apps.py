@@ -4,3 +4,8 @@ class VapiIntegrationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.vapi_integration'
     verbose_name = 'Vapi Integration'
+
+    def ready(self):
+        import apps.vapi_integration.signals
+        from .functions import voice_functions
+        voice_functions.autodiscover()
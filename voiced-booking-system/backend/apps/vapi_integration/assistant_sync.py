@@ -0,0 +1,147 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils import timezone
+from apps.core.metrics import metrics
+from .api_client import VapiAPIClient, VapiBusinessService
+from .models import VapiConfiguration
+from .optimizations import VapiCacheKeys, VapiConfigManager, vapi_cache_service
+from .tenant_cache import tenant_resolver, tenant_routing_table
+import time
+import requests
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AssistantSyncStats:
+    total: int = 0
+    unchanged: int = 0
+    updated: int = 0
+    created: int = 0
+    shared: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    
+    @property
+    def done(self) -> int:
+        return self.unchanged + self.updated + self.created + self.shared + self.failed
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), 'done': self.done}
+
+
+@dataclass(frozen=True)
+class AssistantPush:
+    config_id: Any
+    business_id: Any
+    assistant_id: str
+    payload: Dict
+    config_hash: str
+
+
+# Diffs each dedicated assistant's config against the hash stored when it was last pushed and only
+# sends the changed ones. Vapi requests run on a bounded pool; database reads and writes stay on the
+# calling thread. The hash is stored as soon as a push succeeds, so an interrupted sync picks up
+# where it stopped when rerun.
+class AssistantSynchronizer:
+    def __init__(self, client: Optional[VapiAPIClient] = None, workers: Optional[int] = None, force: bool = False,
+                 progress: Optional[Callable[[AssistantSyncStats], None]] = None, progress_every: int = 100):
+        self.client = client or VapiAPIClient()
+        self.workers = max(workers or settings.VAPI_ASSISTANT_SYNC_WORKERS, 1)
+        self.force = force
+        self.progress = progress
+        self.progress_every = progress_every
+        self._started = time.monotonic()
+        self._reported = 0
+    
+    def run(self, configs: QuerySet) -> AssistantSyncStats:
+        configs = configs.filter(is_active=True).select_related('business').order_by('pk')
+        stats = AssistantSyncStats(total=configs.count())
+        self._started, self._reported = time.monotonic(), 0
+        
+        in_flight: Dict[Future, AssistantPush] = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='assistant-sync') as executor:
+                for config in configs.iterator(chunk_size=500):
+                    push = self._plan(config, stats)
+                    if push is not None:
+                        in_flight[executor.submit(self._push, push)] = push
+                    # Planning is cheap, so cap what is queued behind the pool instead of loading every tenant
+                    if len(in_flight) >= self.workers * 2:
+                        self._finish(in_flight, stats)
+                    self._report(stats)
+                while in_flight:
+                    self._finish(in_flight, stats)
+                    self._report(stats)
+        finally:
+            if stats.created:
+                # New assistant ids are routes; the next lookup rebuilds the table with all of them
+                tenant_routing_table.invalidate()
+        
+        self._report(stats, final=True)
+        return stats
+    
+    def _plan(self, config: VapiConfiguration, stats: AssistantSyncStats) -> Optional[AssistantPush]:
+        if config.is_shared_agent:
+            # Shared-agent tenants point at the multi-tenant assistant, which SharedAgentRegistry maintains
+            stats.shared += 1
+            return None
+        
+        payload, config_hash = VapiBusinessService(config.business).assistant_payload(config)
+        if config.assistant_id and config.assistant_config_hash == config_hash and not self.force:
+            stats.unchanged += 1
+            return None
+        return AssistantPush(config.pk, config.business_id, config.assistant_id, payload, config_hash)
+    
+    def _push(self, push: AssistantPush) -> Tuple[str, str]:
+        if push.assistant_id:
+            try:
+                self.client.update_assistant(push.assistant_id, push.payload)
+                return 'updated', push.assistant_id
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                logger.warning(f"Assistant {push.assistant_id} no longer exists in Vapi, creating a new one")
+        return 'created', self.client.create_assistant(push.payload)['id']
+    
+    def _finish(self, in_flight: Dict[Future, AssistantPush], stats: AssistantSyncStats):
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            push = in_flight.pop(future)
+            try:
+                outcome, assistant_id = future.result()
+            except Exception as e:
+                stats.failed += 1
+                metrics.increment('vapi.assistant_sync', outcome='failed')
+                logger.error(f"Assistant sync failed for business {push.business_id}: {e}")
+                continue
+            self._save(push, outcome, assistant_id)
+            setattr(stats, outcome, getattr(stats, outcome) + 1)
+            metrics.increment('vapi.assistant_sync', outcome=outcome)
+    
+    def _save(self, push: AssistantPush, outcome: str, assistant_id: str):
+        if outcome == 'updated':
+            # Only the hash changed, so skip save() and the cache and routing invalidations it triggers
+            VapiConfiguration.objects.filter(pk=push.config_id).update(
+                assistant_config_hash=push.config_hash, updated_at=timezone.now()
+            )
+            return
+        
+        # save() would queue a full routing table rebuild per tenant; run() invalidates the table once instead
+        VapiConfiguration.objects.filter(pk=push.config_id).update(
+            assistant_id=assistant_id, assistant_config_hash=push.config_hash, updated_at=timezone.now()
+        )
+        VapiConfigManager.invalidate_business_cache(push.business_id)
+        tenant_resolver.invalidate(push.business_id)
+        vapi_cache_service.delete(VapiCacheKeys.assistant(push.business_id))
+    
+    def _report(self, stats: AssistantSyncStats, final: bool = False):
+        if not self.progress or (not final and stats.done - self._reported < self.progress_every):
+            return
+        self._reported = stats.done
+        stats.elapsed = round(time.monotonic() - self._started, 3)
+        self.progress(stats)
@@ -0,0 +1,288 @@
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from queue import Empty, Queue
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+import copy
+import hashlib
+import hmac
+import json
+import math
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+REPORT_SCHEMA = 1
+TARGETS = ('processor', 'view', 'http')
+BENCHMARK_SLUG_PREFIX = 'bench-tenant'
+BENCHMARK_SERVICE = 'Corte de pelo'
+
+
+@dataclass(frozen=True)
+class Sample:
+    event_type: str
+    duration_ms: float
+    queries: Optional[int]
+    ok: bool
+
+
+def synthetic_call(call_id: str, tenant_id: str, day: date) -> List[Dict]:
+    # One inbound booking call as Vapi delivers it: reply events first, then lifecycle and the final report
+    base_ms = int(time.time() * 1000)
+    call = {
+        'id': call_id,
+        'orgId': 'bench-org',
+        'type': 'inboundPhoneCall',
+        'customer': {'number': '+34600000000'},
+        'metadata': {'tenant_id': tenant_id},
+    }
+    
+    def event(offset_ms: int, event_type: str, call_fields: Optional[Dict] = None, **message) -> Dict:
+        return {'message': {
+            'type': event_type,
+            'timestamp': base_ms + offset_ms,
+            'call': {**call, **(call_fields or {})},
+            **message,
+        }}
+    
+    def tool_call(name: str, **arguments) -> Dict:
+        return {'id': f'{call_id}-{name}', 'type': 'function', 'function': {'name': name, 'arguments': arguments}}
+    
+    return [
+        event(0, 'assistant-request', {'status': 'queued'}),
+        event(50, 'status-update', {'status': 'ringing'}, status='ringing'),
+        event(900, 'status-update', {'status': 'in-progress', 'startedAt': '2025-01-01T10:00:00Z'}, status='in-progress'),
+        event(5000, 'tool-calls', toolCallList=[tool_call('get_business_services')]),
+        event(9000, 'tool-calls', toolCallList=[
+            tool_call('check_service_availability', service_name=BENCHMARK_SERVICE, date=day.isoformat()),
+        ]),
+        event(12000, 'function-call', functionCall={'name': 'get_business_hours', 'parameters': {'date': day.isoformat()}}),
+        event(30000, 'status-update', {
+            'status': 'ended', 'endedReason': 'customer-ended-call', 'endedAt': '2025-01-01T10:00:30Z',
+        }, status='ended'),
+        event(31000, 'end-of-call-report', {
+            'status': 'ended', 'endedReason': 'customer-ended-call', 'cost': 0.12,
+        }, transcript='User: Quiero un corte de pelo\nAI: Tenemos huecos mañana', analysis={'summary': 'Consulta de disponibilidad'}),
+    ]
+
+
+def load_recording(lines: Iterable[str]) -> List[List[Dict]]:
+    # Recordings are JSON lines of raw webhook bodies; events are grouped per call in delivery order
+    calls: Dict[str, List[Dict]] = {}
+    for line in lines:
+        if line.strip():
+            payload = json.loads(line)
+            call_id = (payload.get('message', {}).get('call') or {}).get('id', '')
+            calls.setdefault(call_id, []).append(payload)
+    return list(calls.values())
+
+
+def retarget(events: List[Dict], call_id: str, tenant_id: str) -> List[Dict]:
+    replayed = copy.deepcopy(events)
+    for payload in replayed:
+        call = payload.setdefault('message', {}).setdefault('call', {})
+        call['id'] = call_id
+        call['metadata'] = {**(call.get('metadata') or {}), 'tenant_id': tenant_id}
+    return replayed
+
+
+def ensure_tenants(count: int) -> List[str]:
+    from django.contrib.auth import get_user_model
+    from apps.businesses.models import Business
+    from apps.services.models import Service
+    
+    owner, _ = get_user_model().objects.get_or_create(
+        email='benchmark@voiced.local', defaults={'first_name': 'Benchmark'}
+    )
+    tenant_ids = []
+    for index in range(count):
+        business, created = Business.objects.get_or_create(
+            slug=f'{BENCHMARK_SLUG_PREFIX}-{index}',
+            defaults={
+                'owner': owner,
+                'name': f'Benchmark Tenant {index}',
+                'email': f'tenant-{index}@voiced.local',
+                'phone': '+34600000000',
+                'address': 'Calle Benchmark 1',
+                'city': 'Madrid',
+                'state': 'Madrid',
+                'postal_code': '28001',
+            }
+        )
+        if created:
+            Service.objects.create(business=business, name=BENCHMARK_SERVICE, duration=30, price=Decimal('20.00'))
+        tenant_ids.append(str(business.id))
+    return tenant_ids
+
+
+def percentile(values: List[float], pct: float) -> float:
+    # Nearest-rank on pre-sorted values
+    if not values:
+        return 0.0
+    return round(values[max(0, math.ceil(pct / 100 * len(values)) - 1)], 2)
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.1) -> List[str]:
+    regressions = []
+    for event_type, stats in report['event_types'].items():
+        previous = baseline.get('event_types', {}).get(event_type)
+        if not previous:
+            continue
+        for metric in ('p95_ms', 'p99_ms', 'queries_per_event'):
+            before, after = previous.get(metric), stats.get(metric)
+            if before and after is not None and after > before * (1 + tolerance):
+                regressions.append(f'{event_type} {metric}: {before} -> {after}')
+    
+    before, after = baseline.get('throughput_eps'), report['throughput_eps']
+    if before and after < before * (1 - tolerance):
+        regressions.append(f'throughput_eps: {before} -> {after}')
+    return regressions
+
+
+class WebhookBenchmark:
+    def __init__(self, tenant_ids: List[str], calls: int = 100, concurrency: int = 8, target: str = 'processor',
+                 recording: Optional[List[List[Dict]]] = None, url: Optional[str] = None,
+                 slo_p99_ms: Optional[float] = None):
+        if target not in TARGETS:
+            raise ValueError(f"Unknown benchmark target '{target}'")
+        if target == 'http' and not url:
+            raise ValueError("The http target needs a webhook URL")
+        
+        self.tenant_ids = tenant_ids
+        self.calls = calls
+        self.concurrency = max(concurrency, 1)
+        self.target = target
+        self.recording = recording
+        self.url = url
+        self.slo_p99_ms = slo_p99_ms or settings.VAPI_WEBHOOK_TIMEOUT_MS - settings.VAPI_WEBHOOK_DEADLINE_MARGIN_MS
+        self._local = threading.local()
+    
+    def sequences(self) -> List[List[Dict]]:
+        # Fresh call ids per run keep the dedupe ledger and call state from treating a rerun as redeliveries
+        run = uuid.uuid4().hex[:8]
+        day = date.today() + timedelta(days=1)
+        sequences = []
+        for index in range(self.calls):
+            call_id = f'bench-{run}-{index}'
+            tenant_id = self.tenant_ids[index % len(self.tenant_ids)]
+            if self.recording:
+                sequences.append(retarget(self.recording[index % len(self.recording)], call_id, tenant_id))
+            else:
+                sequences.append(synthetic_call(call_id, tenant_id, day))
+        return sequences
+    
+    def run(self) -> Dict[str, Any]:
+        pending = Queue()
+        for events in self.sequences():
+            pending.put(events)
+        
+        # Events of one call are replayed in order, as Vapi delivers them; calls run concurrently
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='webhook-bench') as executor:
+            workers = [executor.submit(self._worker, pending) for _ in range(self.concurrency)]
+            samples = [sample for worker in workers for sample in worker.result()]
+        return self.report(samples, time.perf_counter() - started)
+    
+    def report(self, samples: List[Sample], elapsed: float) -> Dict[str, Any]:
+        groups: Dict[str, List[Sample]] = {}
+        for sample in samples:
+            groups.setdefault(sample.event_type, []).append(sample)
+        event_types = {event_type: self._summarize(group) for event_type, group in sorted(groups.items())}
+        breaches = sorted(event_type for event_type, stats in event_types.items() if stats['p99_ms'] > self.slo_p99_ms)
+        
+        return {
+            'schema': REPORT_SCHEMA,
+            'target': self.target,
+            'tenants': len(self.tenant_ids),
+            'calls': self.calls,
+            'concurrency': self.concurrency,
+            'duration_s': round(elapsed, 3),
+            'throughput_eps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+            'overall': self._summarize(samples),
+            'event_types': event_types,
+            'slo': {'p99_ms': self.slo_p99_ms, 'met': not breaches, 'breaches': breaches},
+        }
+    
+    def _worker(self, pending: Queue) -> List[Sample]:
+        send = getattr(self, f'_send_{self.target}')
+        samples = []
+        try:
+            while True:
+                try:
+                    events = pending.get_nowait()
+                except Empty:
+                    return samples
+                samples.extend(self._measure(send, payload) for payload in events)
+        finally:
+            connection.close()
+    
+    def _measure(self, send: Callable[[Dict], bool], payload: Dict) -> Sample:
+        event_type = payload.get('message', {}).get('type', 'unknown')
+        # Queries are only visible when the event is processed on this thread's connection
+        capture = CaptureQueriesContext(connection) if self.target == 'processor' else nullcontext()
+        with capture:
+            started = time.perf_counter()
+            try:
+                ok = send(payload)
+            except Exception as e:
+                logger.warning(f"Benchmark {event_type} event failed: {e}")
+                ok = False
+            duration_ms = (time.perf_counter() - started) * 1000
+        queries = len(capture.captured_queries) if self.target == 'processor' else None
+        return Sample(event_type, duration_ms, queries, ok)
+    
+    def _send_processor(self, payload: Dict) -> bool:
+        from .processors import WebhookProcessor
+        
+        return 'error' not in WebhookProcessor().process_webhook(payload)
+    
+    def _send_view(self, payload: Dict) -> bool:
+        from .views import VapiWebhookView
+        
+        body = json.dumps(payload).encode('utf-8')
+        request = RequestFactory().post(
+            '/vapi/webhook/', data=body, content_type='application/json', HTTP_X_VAPI_SIGNATURE=self._sign(body)
+        )
+        response = async_to_sync(VapiWebhookView.as_view())(request)
+        return response.status_code < 400
+    
+    def _send_http(self, payload: Dict) -> bool:
+        import requests
+        
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        body = json.dumps(payload).encode('utf-8')
+        response = session.post(
+            self.url, data=body, timeout=30,
+            headers={'Content-Type': 'application/json', 'X-Vapi-Signature': self._sign(body)},
+        )
+        return response.status_code < 400
+    
+    @staticmethod
+    def _sign(body: bytes) -> str:
+        return hmac.new(settings.VAPI_WEBHOOK_SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    
+    @staticmethod
+    def _summarize(samples: List[Sample]) -> Dict[str, Any]:
+        durations = sorted(sample.duration_ms for sample in samples)
+        queries = [sample.queries for sample in samples if sample.queries is not None]
+        return {
+            'count': len(samples),
+            'errors': sum(1 for sample in samples if not sample.ok),
+            'p50_ms': percentile(durations, 50),
+            'p95_ms': percentile(durations, 95),
+            'p99_ms': percentile(durations, 99),
+            'max_ms': round(durations[-1], 2) if durations else 0.0,
+            'queries_per_event': round(sum(queries) / len(queries), 2) if queries else None,
+        }
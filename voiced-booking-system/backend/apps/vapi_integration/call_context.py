@@ -0,0 +1,85 @@
+from typing import Optional
+from apps.core.cache import LocalLRUCache
+from .optimizations import vapi_cache_service, VapiCacheKeys
+from .tenant_cache import tenant_resolver
+from .value_objects import CallContext, TenantSnapshot
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CallContextStore:
+    DEFAULT_MAX_DURATION = 1800
+    GRACE_SECONDS = 300
+    SERVICE_FIELDS = ('id', 'name', 'description', 'duration', 'price')
+    
+    def __init__(self, max_size: int = 2048):
+        self._local = LocalLRUCache(max_size=max_size)
+    
+    def preload(self, call) -> Optional[CallContext]:
+        try:
+            return self._store(self.build(call))
+        except Exception as e:
+            logger.error(f"Could not preload context for call {call.call_id}: {e}")
+            return None
+    
+    def get(self, call) -> CallContext:
+        key = VapiCacheKeys.call_context(call.call_id)
+        context = self._local.get(key)
+        if context is not None:
+            return context
+        
+        context = vapi_cache_service.get(key)
+        if context is None:
+            return self._store(self.build(call))
+        
+        self._local.set(key, context, self._timeout(context.tenant))
+        return context
+    
+    def discard(self, call_id: str):
+        key = VapiCacheKeys.call_context(call_id)
+        self._local.delete(key)
+        vapi_cache_service.delete(key)
+    
+    def build(self, call) -> CallContext:
+        from apps.businesses.models import BusinessHours
+        from apps.services.models import Service
+        
+        tenant = tenant_resolver.get_by_id(call.business_id)
+        if tenant is None:
+            raise ValueError(f"Business {call.business_id} not found")
+        
+        services = tuple(Service.objects.filter(
+            business_id=call.business_id,
+            is_active=True
+        ).values(*self.SERVICE_FIELDS))
+        
+        weekly_hours = {
+            hours.day_of_week: {
+                'is_closed': hours.is_closed,
+                'open_time': hours.open_time,
+                'close_time': hours.close_time,
+                'day': str(hours.get_day_of_week_display()),
+            }
+            for hours in BusinessHours.objects.filter(business_id=call.business_id)
+        }
+        
+        return CallContext(
+            call_id=call.call_id,
+            tenant=tenant,
+            services=services,
+            weekly_hours=weekly_hours,
+        )
+    
+    def _store(self, context: CallContext) -> CallContext:
+        key = VapiCacheKeys.call_context(context.call_id)
+        timeout = self._timeout(context.tenant)
+        vapi_cache_service.set(key, context, timeout)
+        self._local.set(key, context, timeout)
+        return context
+    
+    def _timeout(self, tenant: TenantSnapshot) -> int:
+        return (tenant.max_duration_seconds or self.DEFAULT_MAX_DURATION) + self.GRACE_SECONDS
+
+
+call_context_store = CallContextStore()
@@ -0,0 +1,57 @@
+from typing import Any, Dict, Optional, Tuple
+from apps.core.cache import LocalLRUCache
+import json
+import threading
+import time
+
+_MISSING = object()
+
+
+class CallResultMemo:
+    def __init__(self, timeout: int = 120, max_calls: int = 2048):
+        self.timeout = timeout
+        self._calls = LocalLRUCache(max_size=max_calls)
+        self._generations = LocalLRUCache(max_size=max_calls)
+        self._lock = threading.Lock()
+    
+    def get(self, call_id: str, function_name: str, parameters: Dict[str, Any]) -> Tuple[bool, Any]:
+        entries = self._calls.get(call_id)
+        if entries is None:
+            return False, None
+        
+        value, expires_at = entries.get(self.key(function_name, parameters), (_MISSING, 0))
+        if value is _MISSING or expires_at < time.monotonic():
+            return False, None
+        return True, value
+    
+    def generation(self, call_id: str) -> int:
+        return self._generations.get(call_id) or 0
+    
+    def set(self, call_id: str, function_name: str, parameters: Dict[str, Any], value: Any,
+            generation: Optional[int] = None):
+        with self._lock:
+            if generation is not None and generation != self.generation(call_id):
+                # The call wrote something while this result was being read, so it may already be stale
+                return
+            entries = self._calls.get(call_id)
+            if entries is None:
+                entries = {}
+                self._calls.set(call_id, entries)
+            entries[self.key(function_name, parameters)] = (value, time.monotonic() + self.timeout)
+    
+    def invalidate(self, call_id: str):
+        with self._lock:
+            self._generations.set(call_id, self.generation(call_id) + 1)
+            self._calls.delete(call_id)
+    
+    @staticmethod
+    def key(function_name: str, parameters: Dict[str, Any]) -> str:
+        normalized = {
+            name: ' '.join(value.split()).lower() if isinstance(value, str) else value
+            for name, value in (parameters or {}).items()
+            if value not in (None, '')
+        }
+        return f"{function_name}:{json.dumps(normalized, sort_keys=True, default=str)}"
+
+
+call_result_memo = CallResultMemo()
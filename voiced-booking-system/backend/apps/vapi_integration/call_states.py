@@ -0,0 +1,64 @@
+from typing import Any, Dict, Optional, Tuple
+from django.utils import timezone
+from apps.core.metrics import metrics
+from .models import VapiCall
+import logging
+
+logger = logging.getLogger(__name__)
+
+CALL_STATUS_ORDER = ('scheduled', 'queued', 'ringing', 'in_progress', 'forwarding', 'ended')
+LIFECYCLE_FIELDS = ('status', 'ended_reason', 'ended_at')
+
+_RANKS = {status: rank for rank, status in enumerate(CALL_STATUS_ORDER)}
+TERMINAL_RANK = _RANKS['ended']
+
+
+def status_rank(status: Optional[str]) -> Optional[int]:
+    # Vapi sends 'in-progress' while the model choices spell it 'in_progress'
+    return _RANKS.get((status or '').replace('-', '_'))
+
+
+class CallLifecycle:
+    def accepts(self, current: Optional[str], target: Optional[str]) -> bool:
+        target_rank = status_rank(target)
+        if target_rank is None:
+            return False
+        current_rank = status_rank(current)
+        # Repeated terminal events may still fill in the ended reason and time
+        return current_rank is None or target_rank > current_rank or target_rank == TERMINAL_RANK
+    
+    def predecessors(self, status: str) -> Tuple[str, ...]:
+        rank = status_rank(status)
+        if rank is None:
+            return ()
+        if rank == TERMINAL_RANK:
+            rank += 1
+        return ('',) + tuple(
+            spelling
+            for previous in CALL_STATUS_ORDER[:rank]
+            for spelling in sorted({previous, previous.replace('_', '-')})
+        )
+    
+    def transition(self, call_id: str, status: str, **fields: Any) -> bool:
+        predecessors = self.predecessors(status)
+        if not predecessors:
+            return False
+        
+        changes = {name: value for name, value in fields.items() if value}
+        updated = VapiCall.objects.filter(call_id=call_id, status__in=predecessors).update(
+            status=status, updated_at=timezone.now(), **changes
+        )
+        metrics.increment('vapi.call_state.transition', status=status, outcome='applied' if updated else 'stale')
+        if not updated:
+            logger.debug(f"Ignored stale '{status}' transition for call {call_id}")
+        return bool(updated)
+    
+    def later(self, first: Dict[str, Any], second: Dict[str, Any]) -> Dict[str, Any]:
+        first_rank = status_rank(first.get('status'))
+        second_rank = status_rank(second.get('status'))
+        if second_rank is None or (first_rank is not None and first_rank > second_rank):
+            return first
+        return second
+
+
+call_lifecycle = CallLifecycle()
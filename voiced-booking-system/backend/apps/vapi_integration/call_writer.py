@@ -0,0 +1,153 @@
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from django.utils.dateparse import parse_datetime
+from apps.core.metrics import metrics
+from .call_states import LIFECYCLE_FIELDS, call_lifecycle
+from .models import VapiCall
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _text(value: Any) -> str:
+    return value or ''
+
+
+def _datetime(value: Any):
+    return parse_datetime(value) if value else None
+
+
+def _decimal(value: Any) -> Optional[Decimal]:
+    return Decimal(str(value)) if value is not None else None
+
+
+CALL_FIELDS: Tuple[Tuple[str, str, Callable], ...] = (
+    ('org_id', 'orgId', _text),
+    ('type', 'type', _text),
+    ('status', 'status', _text),
+    ('ended_reason', 'endedReason', _text),
+    ('started_at', 'startedAt', _datetime),
+    ('ended_at', 'endedAt', _datetime),
+    ('cost', 'cost', _decimal),
+    ('cost_breakdown', 'costBreakdown', lambda value: value or {}),
+    ('phone_number', 'phoneNumber', _text),
+    ('customer_number', 'customer', lambda value: (value or {}).get('number', '')),
+    ('assistant_id', 'assistantId', _text),
+    ('squad_id', 'squadId', _text),
+    ('phone_call_provider', 'phoneCallProvider', _text),
+    ('phone_call_transport', 'phoneCallTransport', _text),
+)
+
+
+class CallStateWriter:
+    def __init__(self, batch_size: int = 200, window_ms: float = 5):
+        self.batch_size = batch_size
+        self.window_ms = window_ms
+        self._local = threading.local()
+    
+    def upsert(self, call_data: Dict, business, pk=None) -> VapiCall:
+        values = {field: parse(call_data[key]) for field, key, parse in CALL_FIELDS if key in call_data}
+        call = self.instance({'id': pk, 'call_id': call_data['id'], **values})
+        call.business = business
+        return self.write(call, values.keys(), immediate=True)
+    
+    def instance(self, values: Dict[str, Any]) -> VapiCall:
+        # Unlike from_db instances, every field is loaded, so an upsert never triggers deferred-field reads
+        pk = values.get('id')
+        call = VapiCall(**{name: value for name, value in values.items() if name != 'id'})
+        if pk is not None:
+            call.pk, call._state.adding = pk, False
+        return call
+    
+    def write(self, call: VapiCall, fields: Iterable[str], immediate: bool = False) -> VapiCall:
+        fields = set(fields)
+        pending = getattr(self._local, 'pending', None)
+        if pending is not None and call.call_id in pending:
+            # Coalesce with the queued row; the newer event wins on overlapping fields
+            queued, queued_fields = pending.pop(call.call_id)
+            for field in queued_fields - fields:
+                setattr(call, field, getattr(queued, field))
+            if 'status' in queued_fields and 'status' in fields:
+                # Events can arrive out of order, so the lifecycle fields come from whichever is further along
+                lifecycle = [{field: getattr(row, field) for field in LIFECYCLE_FIELDS} for row in (queued, call)]
+                for field, value in call_lifecycle.later(*lifecycle).items():
+                    setattr(call, field, value)
+            fields |= queued_fields
+            if call._state.adding:
+                call.pk, call._state.adding = queued.pk, False
+        
+        if pending is None or immediate:
+            self._flush([(call, fields)])
+            return call
+        
+        if not pending:
+            self._local.opened = time.monotonic()
+        pending[call.call_id] = (call, fields)
+        if len(pending) >= self.batch_size or (time.monotonic() - self._local.opened) * 1000 >= self.window_ms:
+            self.flush()
+        return call
+    
+    def flush(self):
+        pending = getattr(self._local, 'pending', None)
+        if pending:
+            rows, self._local.pending = list(pending.values()), {}
+            self._flush(rows)
+    
+    @contextmanager
+    def buffered(self):
+        self._local.pending = {}
+        try:
+            yield
+        finally:
+            try:
+                self.flush()
+            finally:
+                self._local.pending = None
+    
+    def _flush(self, rows: List[Tuple[VapiCall, set]]):
+        # bulk_create applies one update_fields list per statement, so rows are grouped by the fields they carry.
+        # Lifecycle fields are only written on insert; existing rows move through conditional transitions instead.
+        groups: Dict[frozenset, List[VapiCall]] = {}
+        for call, fields in rows:
+            upsert_fields = frozenset(fields) - frozenset(LIFECYCLE_FIELDS)
+            if upsert_fields or call._state.adding:
+                groups.setdefault(upsert_fields, []).append(call)
+        
+        inserted = set()
+        for fields, calls in groups.items():
+            unknown = [call for call in calls if call._state.adding]
+            VapiCall.objects.bulk_create(
+                calls,
+                update_conflicts=True,
+                unique_fields=['call_id'],
+                update_fields=sorted(fields | {'updated_at'}),
+            )
+            if unknown:
+                inserted |= self._refresh_pks(unknown)
+        
+        for call, fields in rows:
+            # A freshly inserted row already carries its lifecycle, so a transition would match nothing
+            if 'status' in fields and call.call_id not in inserted:
+                call_lifecycle.transition(
+                    call.call_id,
+                    call.status,
+                    **{field: getattr(call, field) for field in LIFECYCLE_FIELDS[1:] if field in fields}
+                )
+        metrics.increment('vapi.call_state.rows', value=len(rows))
+    
+    def _refresh_pks(self, calls: List[VapiCall]) -> Set[str]:
+        # UUID primary keys are generated client-side and not returned, so a conflicting row keeps its own id;
+        # a row that still has the id generated here was inserted rather than merged into an existing one
+        ids = dict(VapiCall.objects.filter(call_id__in=[call.call_id for call in calls]).values_list('call_id', 'id'))
+        inserted = set()
+        for call in calls:
+            if ids.get(call.call_id) == call.pk:
+                inserted.add(call.call_id)
+            call.pk = ids.get(call.call_id, call.pk)
+        return inserted
+
+
+call_state_writer = CallStateWriter()
@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from django.conf import settings
+from apps.core.metrics import metrics
+from .value_objects import TenantSnapshot
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_current_deadline: ContextVar = ContextVar('vapi_webhook_deadline', default=None)
+
+
+class Deadline:
+    def __init__(self, budget_ms: float, started: Optional[float] = None, tenant_id: Optional[str] = None):
+        self.budget_ms = budget_ms
+        self.started = started if started is not None else time.monotonic()
+        self.tenant_id = tenant_id
+    
+    @classmethod
+    def for_tenant(cls, tenant: Optional[TenantSnapshot], started: Optional[float] = None) -> 'Deadline':
+        timeout = (tenant.webhook_timeout if tenant else None) or settings.VAPI_WEBHOOK_TIMEOUT_MS
+        # Leave room for serializing the response and the network hop back to Vapi
+        budget = max(timeout - settings.VAPI_WEBHOOK_DEADLINE_MARGIN_MS, 0)
+        return cls(budget, started=started, tenant_id=tenant.id if tenant else None)
+    
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started) * 1000
+    
+    @property
+    def remaining_ms(self) -> float:
+        return self.budget_ms - self.elapsed_ms
+    
+    @property
+    def expired(self) -> bool:
+        return self.remaining_ms <= 0
+    
+    def allows(self, duration_ms: float) -> bool:
+        return self.remaining_ms >= duration_ms
+    
+    def checkpoint(self, stage: str) -> bool:
+        if not self.expired:
+            return True
+        self.record_overrun(stage)
+        return False
+    
+    def record_overrun(self, stage: str, function: Optional[str] = None):
+        tags = {'tenant': self.tenant_id, 'stage': stage}
+        if function:
+            tags['function'] = function
+        metrics.increment('vapi.deadline.overrun', **tags)
+        logger.warning(
+            f"Webhook deadline overrun at {stage}{f' ({function})' if function else ''} "
+            f"for tenant {self.tenant_id}: {self.elapsed_ms:.0f}ms of {self.budget_ms:.0f}ms"
+        )
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
@@ -1,12 +1,14 @@
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.db import transaction
+from django.db import DatabaseError, transaction
 from apps.services.models import Service
 from apps.appointments.models import Appointment
 from apps.clients.models import Client
-from .value_objects import AppointmentBookingData
-from .optimizations import cached_method, circuit_breaker, cache_service, VapiCacheKeys
+from apps.core.utils import instance_from_values
+from .value_objects import AppointmentBookingData, CallContext
+from .optimizations import cached_method, circuit_breakers, cache_service, VapiCacheKeys
+from .service_matcher import service_matcher_registry
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,44 +20,44 @@ class BaseBusinessService:
 
 
 class AppointmentBookingDomainService(BaseBusinessService):
-    @circuit_breaker
     def book_appointment(self, booking_data: AppointmentBookingData) -> Dict[str, any]:
         if not booking_data.is_valid:
             return {'success': False, 'error': 'Invalid booking data'}
         
         try:
-            with transaction.atomic():
-                service = self._find_service(booking_data.service_name)
-                if not service:
-                    return {'success': False, 'error': 'Service not found'}
-                
-                start_time = datetime.fromisoformat(booking_data.datetime_iso)
-                
-                if not self._is_slot_available(service, start_time):
-                    return {'success': False, 'error': 'Time slot not available'}
-                
-                client = self._get_or_create_client(booking_data)
-                appointment = self._create_appointment(service, client, booking_data, start_time)
-                
-                self._invalidate_availability_cache(service, start_time)
-                
-                logger.info(f"Appointment booked: {appointment.id} for business {self.business.id}")
-                return {
-                    'success': True,
-                    'appointment_id': appointment.id,
-                    'booking_reference': appointment.booking_reference
-                }
-                
+            return self._book(booking_data)
         except Exception as e:
             logger.error(f"Booking failed: {e}")
             return {'success': False, 'error': str(e)}
     
+    # Only database errors count against the bookings circuit; bad input from a call is not an outage
+    @circuit_breakers('bookings.book_appointment', is_failure=lambda exc: isinstance(exc, DatabaseError))
+    def _book(self, booking_data: AppointmentBookingData) -> Dict[str, any]:
+        with transaction.atomic():
+            service = self._find_service(booking_data.service_name)
+            if not service:
+                return {'success': False, 'error': 'Service not found'}
+            
+            start_time = datetime.fromisoformat(booking_data.datetime_iso)
+            
+            if not self._is_slot_available(service, start_time):
+                return {'success': False, 'error': 'Time slot not available'}
+            
+            client = self._get_or_create_client(booking_data)
+            appointment = self._create_appointment(service, client, booking_data, start_time)
+            
+            self._invalidate_availability_cache(service, start_time)
+            
+            logger.info(f"Appointment booked: {appointment.id} for business {self.business.id}")
+            return {
+                'success': True,
+                'appointment_id': appointment.id,
+                'booking_reference': appointment.booking_reference
+            }
+    
     def _find_service(self, service_name: str) -> Optional[Service]:
-        return Service.objects.select_related('business').filter(
-            business=self.business,
-            name__icontains=service_name,
-            is_active=True
-        ).first()
+        match = service_matcher_registry.match(self.business.id, service_name)
+        return instance_from_values(Service, match.service) if match else None
     
     def _is_slot_available(self, service: Service, start_time: datetime) -> bool:
         end_time = start_time + timedelta(minutes=service.duration)
@@ -108,6 +110,10 @@ class AppointmentBookingDomainService(BaseBusinessService):
 
 
 class AvailabilityQueryService(BaseBusinessService):
+    def __init__(self, business, call_context: Optional[CallContext] = None):
+        super().__init__(business)
+        self.call_context = call_context
+    
     @cached_method(timeout=600, key_func=lambda self: VapiCacheKeys.services(self.business.id))
     def get_available_services(self) -> List[Dict]:
         return list(Service.objects.filter(
@@ -115,26 +121,23 @@ class AvailabilityQueryService(BaseBusinessService):
             is_active=True
         ).values('id', 'name', 'description', 'duration', 'price'))
     
-    @cached_method(timeout=300)
     def check_availability(self, service_id: int, date: str, duration: Optional[int] = None) -> Dict:
         try:
-            service = Service.objects.select_related('business').get(
-                id=service_id, business=self.business
-            )
+            service = self._get_service(service_id)
             date_obj = datetime.fromisoformat(date).date()
-            duration_minutes = duration or service.duration
+            duration_minutes = duration or service['duration']
             
             cache_key = VapiCacheKeys.availability(self.business.id, service_id, date)
             slots = cache_service.get_or_set(
                 cache_key,
-                lambda: self._find_available_slots(service, date_obj, duration_minutes),
+                lambda: self._find_available_slots(service['id'], date_obj, duration_minutes),
                 timeout=900
             )
             
             return {
                 'available': len(slots) > 0,
                 'slots': slots,
-                'service_name': service.name,
+                'service_name': service['name'],
                 'duration': duration_minutes
             }
         except Service.DoesNotExist:
@@ -142,32 +145,49 @@ class AvailabilityQueryService(BaseBusinessService):
         except ValueError:
             return {'available': False, 'error': 'Invalid date format'}
     
-    def _find_available_slots(self, service: Service, date_obj, duration_minutes: int) -> List[str]:
+    def _get_service(self, service_id) -> Dict:
+        service = self.call_context.get_service(service_id) if self.call_context else None
+        if service is None:
+            service = Service.objects.filter(
+                id=service_id, business=self.business
+            ).values('id', 'name', 'duration').first()
+        if service is None:
+            raise Service.DoesNotExist
+        return service
+    
+    def _find_available_slots(self, service_id, date_obj, duration_minutes: int) -> List[str]:
         business_hours = self._get_business_hours(date_obj)
         if not business_hours:
             return []
         
         start_time, end_time = business_hours
-        existing_appointments = self._get_existing_appointments(service, date_obj)
+        existing_appointments = self._get_existing_appointments(service_id, date_obj)
         
         return self._calculate_available_slots(start_time, end_time, duration_minutes, existing_appointments)
     
     def _get_business_hours(self, date_obj) -> Optional[tuple]:
         day_of_week = date_obj.weekday()
-        hours = self.business.business_hours.filter(day_of_week=day_of_week, is_closed=False).first()
+        if self.call_context:
+            hours = self.call_context.hours_for(day_of_week)
+            if not hours or hours['is_closed']:
+                return None
+            open_time, close_time = hours['open_time'], hours['close_time']
+        else:
+            hours = self.business.business_hours.filter(day_of_week=day_of_week, is_closed=False).first()
+            open_time, close_time = (hours.open_time, hours.close_time) if hours else (None, None)
         
-        if not hours or not hours.open_time or not hours.close_time:
+        if not open_time or not close_time:
             return None
         
-        start_time = timezone.datetime.combine(date_obj, hours.open_time)
-        end_time = timezone.datetime.combine(date_obj, hours.close_time)
+        start_time = timezone.datetime.combine(date_obj, open_time)
+        end_time = timezone.datetime.combine(date_obj, close_time)
         
         return start_time, end_time
     
-    def _get_existing_appointments(self, service: Service, date_obj):
+    def _get_existing_appointments(self, service_id, date_obj):
         return Appointment.objects.filter(
             business=self.business,
-            service=service,
+            service_id=service_id,
             start_time__date=date_obj,
             status__in=['confirmed', 'in_progress']
         ).values_list('start_time', 'end_time')
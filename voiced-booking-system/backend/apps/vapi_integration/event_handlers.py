@@ -1,22 +1,32 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from apps.core.metrics import metrics
 from .value_objects import VapiEventType, CallAnalysisData
 from .models import VapiCall
-from .domain_services import AvailabilityQueryService, AppointmentBookingDomainService
-from .multi_tenant_services import SharedAgentManager
+from .multi_tenant_services import shared_agent_registry
+from .call_context import call_context_store
+from .call_memo import call_result_memo
+from .functions import voice_functions
+from .transcripts import transcript_segments
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class EventHandler(ABC):
-    @abstractmethod
+    event_types: Tuple[str, ...] = ()
+    
     def can_handle(self, event_type: VapiEventType) -> bool:
-        pass
+        return event_type.value in self.event_types
     
     @abstractmethod
     def handle(self, call: VapiCall, event_data: Dict[str, Any]) -> Dict[str, Any]:
         pass
+    
+    def degrade(self, call: VapiCall, event_data: Dict[str, Any]) -> Dict[str, Any]:
+        # What Vapi gets when the webhook deadline is spent before the handler could run
+        return {'status': 'degraded'}
 
 
 class BaseCallEventHandler(EventHandler):
@@ -35,17 +45,16 @@ class BaseCallEventHandler(EventHandler):
 
 
 class CallStartedHandler(BaseCallEventHandler):
-    def can_handle(self, event_type: VapiEventType) -> bool:
-        return event_type.is_call_started
+    event_types = ('call-started',)
     
     def handle(self, call: VapiCall, event_data: Dict[str, Any]) -> Dict[str, Any]:
         self._log_event("Call started", call)
+        call_context_store.preload(call)
         return self._create_success_response(call, 'call_started')
 
 
 class CallEndedHandler(BaseCallEventHandler):
-    def can_handle(self, event_type: VapiEventType) -> bool:
-        return event_type.is_call_ended
+    event_types = ('call-ended',)
     
     def handle(self, call: VapiCall, event_data: Dict[str, Any]) -> Dict[str, Any]:
         if not hasattr(call, 'analysis') or not call.analysis.structured_data:
@@ -69,11 +78,14 @@ class CallEndedHandler(BaseCallEventHandler):
 
 
 class FunctionCallHandler(BaseCallEventHandler):
-    def can_handle(self, event_type: VapiEventType) -> bool:
-        return event_type.is_function_call
+    event_types = ('function-call', 'tool-calls')
     
     def handle(self, call: VapiCall, event_data: Dict[str, Any]) -> Dict[str, Any]:
-        function_call = event_data.get('functionCall', {})
+        message = event_data.get('message', event_data)
+        if message.get('toolCallList'):
+            return self._handle_tool_calls(call, message['toolCallList'])
+        
+        function_call = message.get('functionCall', {})
         function_name = function_call.get('name', '')
         parameters = function_call.get('parameters', {})
         
@@ -100,137 +112,141 @@ class FunctionCallHandler(BaseCallEventHandler):
                 }
             }
     
-    def _execute_function(self, call: VapiCall, function_name: str, parameters: Dict) -> Any:
-        if function_name == 'get_business_services':
-            service = AvailabilityQueryService(call.business)
-            return service.get_available_services()
-        
-        elif function_name == 'check_service_availability':
-            service = AvailabilityQueryService(call.business)
-            service_id = self._find_service_id_by_name(call.business, parameters.get('service_name', ''))
-            if not service_id:
-                return {'error': f"Servicio '{parameters.get('service_name')}' no encontrado"}
-            
-            return service.check_availability(
-                service_id,
-                parameters.get('date'),
-                None
-            )
+    def degrade(self, call: VapiCall, event_data: Dict[str, Any]) -> Dict[str, Any]:
+        message = event_data.get('message', event_data)
+        if message.get('toolCallList'):
+            results = []
+            for tool_call in message['toolCallList']:
+                function_name, parameters = self._parse_tool_call(tool_call)
+                result = voice_functions.fallback(call, function_name, parameters)
+                results.append({
+                    'toolCallId': tool_call.get('id', ''),
+                    'name': function_name,
+                    'result': result if isinstance(result, str) else json.dumps(result, default=str, ensure_ascii=False),
+                })
+            return {'status': 'tools_executed', 'results': results}
         
-        elif function_name == 'book_appointment':
-            booking_service = AppointmentBookingDomainService(call.business)
-            from .value_objects import AppointmentBookingData
-            
-            booking_data = AppointmentBookingData(
-                service_name=parameters.get('service_name', ''),
-                client_name=parameters.get('client_name', ''),
-                client_phone=parameters.get('client_phone', ''),
-                client_email=parameters.get('client_email', ''),
-                datetime_iso=parameters.get('datetime', ''),
-                notes=parameters.get('notes', '')
-            )
-            
-            return booking_service.book_appointment(booking_data)
+        function_call = message.get('functionCall', {})
+        function_name = function_call.get('name', '')
+        result = voice_functions.fallback(call, function_name, function_call.get('parameters', {}))
+        return {'status': 'function_executed', 'result': result, 'functionCall': {'name': function_name, 'result': result}}
+    
+    def _handle_tool_calls(self, call: VapiCall, tool_calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        invocations = [self._parse_tool_call(tool_call) for tool_call in tool_calls]
+        self._log_event("Tool calls", call, f"- {', '.join(name for name, _ in invocations)}")
         
-        elif function_name == 'get_business_hours':
-            date_str = parameters.get('date')
-            if date_str:
-                try:
-                    from datetime import datetime
-                    date_obj = datetime.fromisoformat(date_str).date()
-                    day_of_week = date_obj.weekday()
-                    
-                    hours = call.business.business_hours.filter(
-                        day_of_week=day_of_week
-                    ).first()
-                    
-                    if hours and not hours.is_closed:
-                        return {
-                            'open': True,
-                            'open_time': str(hours.open_time),
-                            'close_time': str(hours.close_time),
-                            'day': hours.get_day_of_week_display()
-                        }
-                    else:
-                        from django.utils.formats import date_format
-                        day_name = date_format(date_obj, 'l')
-                        return {
-                            'open': False,
-                            'day': day_name
-                        }
-                except ValueError:
-                    return {'error': 'Formato de fecha inválido'}
-            
-            return {'error': 'Fecha requerida'}
+        results = []
+        outcomes = voice_functions.execute_many(call, invocations)
+        for tool_call, (function_name, _), (result, error) in zip(tool_calls, invocations, outcomes):
+            entry = {'toolCallId': tool_call.get('id', ''), 'name': function_name}
+            if error is not None:
+                logger.error(f"Tool call failed for {function_name}: {error}")
+                entry['error'] = str(error)
+            else:
+                entry['result'] = result if isinstance(result, str) else json.dumps(result, default=str, ensure_ascii=False)
+            results.append(entry)
         
-        else:
-            raise ValueError(f"Unknown function: {function_name}")
+        return {'status': 'tools_executed', 'results': results}
+    
+    @staticmethod
+    def _parse_tool_call(tool_call: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        function = tool_call.get('function', {})
+        arguments = function.get('arguments') or {}
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except ValueError:
+                arguments = {}
+        return function.get('name', ''), arguments
     
-    def _find_service_id_by_name(self, business, service_name: str) -> Optional[int]:
-        from apps.services.models import Service
-        service = Service.objects.filter(
-            business=business,
-            name__icontains=service_name,
-            is_active=True
-        ).first()
-        return service.id if service else None
+    def _execute_function(self, call: VapiCall, function_name: str, parameters: Dict) -> Any:
+        return voice_functions.execute(call, function_name, parameters)
 
 
 class AssistantRequestHandler(BaseCallEventHandler):
-    def can_handle(self, event_type: VapiEventType) -> bool:
-        return event_type.is_assistant_request
+    event_types = ('assistant-request',)
     
     def handle(self, call: VapiCall, event_data: Dict[str, Any]) -> Dict[str, Any]:
         phone_number = event_data.get('call', {}).get('from', {}).get('phoneNumber', '')
         self._log_event("Assistant request", call, f"from {phone_number}")
+        call_context_store.preload(call)
         
-        shared_agent = SharedAgentManager()
-        
-        return {
-            'status': 'assistant_provided',
-            'assistantId': shared_agent.shared_agent_id
-        }
+        return self._assistant_response()
+    
+    def degrade(self, call: VapiCall, event_data: Dict[str, Any]) -> Dict[str, Any]:
+        # The shared agent id is a local lookup, so it is still cheap to answer properly
+        return self._assistant_response()
+    
+    @staticmethod
+    def _assistant_response() -> Dict[str, Any]:
+        agent_id = shared_agent_registry.get_agent_id()
+        if not agent_id:
+            # An empty assistantId fails the call on Vapi's side; an error at least says why
+            logger.error("No shared agent id is known yet; a refresh has been scheduled")
+            return {'status': 'error', 'error': 'Shared agent is not available yet'}
+        return {'status': 'assistant_provided', 'assistantId': agent_id}
 
 
 class TranscriptHandler(BaseCallEventHandler):
-    def can_handle(self, event_type: VapiEventType) -> bool:
-        return event_type.is_transcript
+    event_types = ('transcript',)
     
     def handle(self, call: VapiCall, event_data: Dict[str, Any]) -> Dict[str, Any]:
-        transcript_data = event_data.get('transcript', {})
-        self._log_event("Transcript", call, f"received")
+        transcript_segments.append(call.call_id, event_data.get('message', event_data))
+        self._log_event("Transcript", call, "received")
         
         return {'status': 'transcript_processed'}
 
 
 class EndOfCallReportHandler(BaseCallEventHandler):
-    def can_handle(self, event_type: VapiEventType) -> bool:
-        return event_type.is_end_of_call_report
+    event_types = ('end-of-call-report',)
     
     def handle(self, call: VapiCall, event_data: Dict[str, Any]) -> Dict[str, Any]:
         self._log_event("End of call report", call, "received")
         
         from .tasks import process_call_analysis
         process_call_analysis.delay(call.id, event_data)
+        call_context_store.discard(call.call_id)
+        call_result_memo.invalidate(call.call_id)
         
         return {'status': 'analysis_scheduled'}
 
 
 class EventHandlerRegistry:
-    def __init__(self):
-        self._handlers = [
+    def __init__(self, handlers: Optional[Iterable[EventHandler]] = None):
+        self._handlers: Dict[str, EventHandler] = {}
+        for handler in handlers if handlers is not None else (
             CallStartedHandler(),
             CallEndedHandler(),
             FunctionCallHandler(),
             AssistantRequestHandler(),
             TranscriptHandler(),
             EndOfCallReportHandler(),
-        ]
+        ):
+            self.register(handler)
+    
+    def register(self, handler: EventHandler):
+        for event_type in handler.event_types:
+            self._handlers[event_type] = handler
+    
+    def degrade_event(self, event_type: VapiEventType, call: VapiCall, event_data: Dict[str, Any]) -> Dict[str, Any]:
+        handler = self._handlers.get(event_type.value)
+        if handler is None:
+            return {'status': 'unhandled_event', 'event_type': event_type.value}
+        metrics.increment('vapi.event.degraded', event=event_type.value)
+        return handler.degrade(call, event_data)
+    
+    def get_handler(self, event_type: VapiEventType) -> Optional[EventHandler]:
+        return self._handlers.get(event_type.value)
     
     def handle_event(self, event_type: VapiEventType, call: VapiCall, event_data: Dict[str, Any]) -> Dict[str, Any]:
-        for handler in self._handlers:
-            if handler.can_handle(event_type):
-                return handler.handle(call, event_data)
+        handler = self._handlers.get(event_type.value)
+        if handler is None:
+            logger.warning(f"No handler found for event type: {event_type.value}")
+            metrics.increment('vapi.event.unhandled', event=event_type.value)
+            return {'status': 'unhandled_event', 'event_type': event_type.value}
         
-        logger.warning(f"No handler found for event type: {event_type.value}")
-        return {'status': 'unhandled_event', 'event_type': event_type.value}
+        with metrics.timer('vapi.event', event=event_type.value):
+            return handler.handle(call, event_data)
+
+
+event_handler_registry = EventHandlerRegistry()
@@ -0,0 +1,378 @@
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from datetime import datetime
+from importlib import import_module
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.formats import date_format
+from apps.core.metrics import metrics
+from .call_context import call_context_store
+from .call_memo import call_result_memo
+from .deadlines import Deadline, current_deadline
+from .domain_services import AvailabilityQueryService, AppointmentBookingDomainService
+from .optimizations import cache_service, VapiCacheKeys
+from .service_matcher import service_matcher_registry
+from .value_objects import AppointmentBookingData, CallContext
+import contextvars
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEGRADED_RESPONSE = {
+    'status': 'pending',
+    'callback': True,
+    'message': 'Estoy tardando más de lo normal en comprobarlo. Te llamaremos en breve para confirmarlo.',
+}
+
+
+@dataclass(frozen=True)
+class VoiceFunction:
+    name: str
+    handler: Callable[..., Any]
+    description: str = ''
+    parameters: Dict[str, Any] = field(default_factory=lambda: {'type': 'object', 'properties': {}, 'required': []})
+    timeout_ms: int = 2000
+    cacheable: bool = False
+    read_only: bool = True
+    fallback: Optional[Callable[..., Any]] = None
+    
+    def tool_definition(self) -> Dict[str, Any]:
+        return {
+            'type': 'function',
+            'function': {
+                'name': self.name,
+                'description': self.description,
+                'parameters': self.parameters,
+            }
+        }
+
+
+class VoiceFunctionRegistry:
+    def __init__(self):
+        self._functions: Dict[str, VoiceFunction] = {}
+        self._tenant_functions: Dict[str, Dict[str, VoiceFunction]] = {}
+    
+    def register(self, name: str, business_id=None, **options):
+        def decorator(handler):
+            self.add(VoiceFunction(name=name, handler=handler, **options), business_id=business_id)
+            return handler
+        return decorator
+    
+    def add(self, function: VoiceFunction, business_id=None):
+        functions = self._functions if business_id is None else self._tenant_functions.setdefault(str(business_id), {})
+        if function.name in functions:
+            logger.warning(f"Replacing voice function {function.name}")
+        functions[function.name] = function
+    
+    def remove(self, name: str, business_id=None):
+        functions = self._functions if business_id is None else self._tenant_functions.get(str(business_id), {})
+        functions.pop(name, None)
+    
+    def get(self, name: str, business_id=None) -> Optional[VoiceFunction]:
+        if business_id is not None:
+            function = self._tenant_functions.get(str(business_id), {}).get(name)
+            if function is not None:
+                return function
+        return self._functions.get(name)
+    
+    def available(self, business_id=None) -> List[VoiceFunction]:
+        functions = dict(self._functions)
+        if business_id is not None:
+            functions.update(self._tenant_functions.get(str(business_id), {}))
+        return list(functions.values())
+    
+    def tool_definitions(self, business_id=None) -> List[Dict[str, Any]]:
+        return [function.tool_definition() for function in self.available(business_id)]
+    
+    def execute(self, call, name: str, parameters: Dict[str, Any]) -> Any:
+        function = self._resolve(call, name)
+        hit, result = self._recall(call, function, parameters)
+        if hit:
+            return result
+        
+        deadline = current_deadline()
+        if deadline is None:
+            return self._invoke(call, function, parameters)
+        
+        if not function.read_only:
+            # Writes are never abandoned halfway, so only start one while a useful share of the budget is left
+            if not deadline.allows(min(function.timeout_ms, deadline.budget_ms / 2)):
+                return self._degrade(call, function, parameters, deadline)
+            return self._invoke(call, function, parameters)
+        
+        if deadline.expired:
+            return self._degrade(call, function, parameters, deadline)
+        # A lone read runs on the request thread: a pool hop would cost a thread switch and a second
+        # DB connection. Only batches with several reads go to the pool, where overlap pays for it.
+        return self._invoke(call, function, parameters)
+    
+    def execute_many(self, call, invocations: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[Any, Optional[Exception]]]:
+        functions = [self.get(name, call.business_id) for name, _ in invocations]
+        concurrent = [
+            index for index, function in enumerate(functions)
+            if function is not None and function.read_only
+            and not (function.cacheable and call_result_memo.get(call.call_id, function.name, invocations[index][1])[0])
+        ]
+        deadline = current_deadline()
+        if len(concurrent) < 2 or (deadline is not None and deadline.expired):
+            # execute() degrades each function without submitting it once the budget is spent
+            return [self._capture(self.execute, call, name, parameters) for name, parameters in invocations]
+        
+        # Warm the per-call context once so pool threads don't all rebuild it
+        call_context_store.get(call)
+        concurrent = set(concurrent)
+        outcomes = [None] * len(invocations)
+        futures = {}
+        for index, (name, parameters) in enumerate(invocations):
+            if index in concurrent:
+                futures[index] = self._submit(call, functions[index], parameters)
+                continue
+            if functions[index] is not None and not functions[index].read_only:
+                # Writes keep their place in the batch: reads sent before one finish first, and reads
+                # sent after it only start once it is done, so none of them sees the other half-way
+                self._join(call, functions, invocations, futures, outcomes, deadline)
+            outcomes[index] = self._capture(self.execute, call, name, parameters)
+        
+        self._join(call, functions, invocations, futures, outcomes, deadline)
+        return outcomes
+    
+    def _join(self, call, functions: List[Optional[VoiceFunction]], invocations: List[Tuple[str, Dict[str, Any]]],
+              futures: Dict[int, Future], outcomes: List, deadline: Optional[Deadline]):
+        for index, future in futures.items():
+            if deadline is None:
+                outcomes[index] = self._capture(future.result)
+            else:
+                outcomes[index] = self._capture(
+                    self._await, call, functions[index], invocations[index][1], future, deadline
+                )
+        futures.clear()
+    
+    def _resolve(self, call, name: str) -> VoiceFunction:
+        function = self.get(name, call.business_id)
+        if function is None:
+            # The name comes from the model, so it stays out of metric tags
+            metrics.increment('vapi.function.unknown')
+            logger.warning(f"Unknown voice function requested for tenant {call.business_id}: {name!r}")
+            raise ValueError(f"Unknown function: {name}")
+        return function
+    
+    def _invoke(self, call, function: VoiceFunction, parameters: Dict[str, Any]) -> Any:
+        context = call_context_store.get(call)
+        generation = call_result_memo.generation(call.call_id)
+        with metrics.timer('vapi.function', function=function.name):
+            result = function.handler(call, context, parameters)
+        self._remember(call, function, parameters, result, generation)
+        return result
+    
+    def _recall(self, call, function: VoiceFunction, parameters: Dict[str, Any]) -> Tuple[bool, Any]:
+        if not function.cacheable:
+            return False, None
+        hit, result = call_result_memo.get(call.call_id, function.name, parameters)
+        metrics.increment('vapi.function.memo', function=function.name, outcome='hit' if hit else 'miss')
+        return hit, result
+    
+    def _remember(self, call, function: VoiceFunction, parameters: Dict[str, Any], result: Any, generation: int):
+        if not function.read_only:
+            # Anything this call wrote (e.g. a booking) can change what the memoized reads returned
+            call_result_memo.invalidate(call.call_id)
+        elif function.cacheable and not (isinstance(result, dict) and 'error' in result):
+            # A read that overlapped a write is not memoized, even if it was abandoned and finishes late
+            call_result_memo.set(call.call_id, function.name, parameters, result, generation=generation)
+    
+    def _invoke_in_thread(self, call, function: VoiceFunction, parameters: Dict[str, Any]) -> Any:
+        close_old_connections()
+        try:
+            return self._invoke(call, function, parameters)
+        finally:
+            close_old_connections()
+    
+    def _submit(self, call, function: VoiceFunction, parameters: Dict[str, Any]) -> Future:
+        # Run under a copy of the caller's context so the worker sees the request deadline
+        return _get_executor().submit(
+            contextvars.copy_context().run, self._invoke_in_thread, call, function, parameters
+        )
+    
+    def _await(self, call, function: VoiceFunction, parameters: Dict[str, Any], future: Future,
+               deadline: Deadline) -> Any:
+        timeout_ms = min(function.timeout_ms, deadline.remaining_ms)
+        try:
+            if timeout_ms <= 0:
+                raise FutureTimeoutError()
+            return future.result(timeout=timeout_ms / 1000)
+        except FutureTimeoutError:
+            future.cancel()
+            return self._degrade(call, function, parameters, deadline)
+    
+    def fallback(self, call, name: str, parameters: Dict[str, Any]) -> Any:
+        function = self.get(name, call.business_id)
+        if function is None:
+            return dict(DEGRADED_RESPONSE)
+        return self._fallback(call, function, parameters)
+    
+    def _degrade(self, call, function: VoiceFunction, parameters: Dict[str, Any], deadline: Deadline) -> Any:
+        deadline.record_overrun('function', function.name)
+        return self._fallback(call, function, parameters)
+    
+    def _fallback(self, call, function: VoiceFunction, parameters: Dict[str, Any]) -> Any:
+        if function.fallback is not None:
+            try:
+                result = function.fallback(call, parameters)
+                if result is not None:
+                    return result
+            except Exception as e:
+                logger.warning(f"Fallback for {function.name} failed: {e}")
+        return dict(DEGRADED_RESPONSE)
+    
+    @staticmethod
+    def _capture(func: Callable[..., Any], *args) -> Tuple[Any, Optional[Exception]]:
+        try:
+            return func(*args), None
+        except Exception as e:
+            return None, e
+    
+    def autodiscover(self):
+        for module in getattr(settings, 'VAPI_FUNCTION_MODULES', []):
+            import_module(module)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'VAPI_TOOL_CALL_WORKERS', 8),
+                    thread_name_prefix='voice-function',
+                )
+    return _executor
+
+
+voice_functions = VoiceFunctionRegistry()
+
+
+@voice_functions.register(
+    'get_business_services',
+    description='Get available services for the current business',
+    timeout_ms=500,
+    cacheable=True,
+)
+def get_business_services(call, context: CallContext, parameters: Dict) -> List[Dict]:
+    return list(context.services)
+
+
+def cached_availability(call, parameters: Dict) -> Optional[Dict]:
+    match = service_matcher_registry.match(call.business_id, parameters.get('service_name', ''))
+    if not match:
+        return None
+    
+    slots = cache_service.get(VapiCacheKeys.availability(call.business_id, match.service_id, parameters.get('date')))
+    if slots is None:
+        return None
+    return {
+        'available': len(slots) > 0,
+        'slots': slots,
+        'service_name': match.name,
+        'cached': True,
+    }
+
+
+@voice_functions.register(
+    'check_service_availability',
+    description='Check availability slots for a specific service and date',
+    parameters={
+        'type': 'object',
+        'properties': {
+            'service_name': {'type': 'string', 'description': 'Name of the service'},
+            'date': {'type': 'string', 'description': 'Date in YYYY-MM-DD format'},
+            'time_preference': {'type': 'string', 'description': 'Preferred time (morning, afternoon, evening)'}
+        },
+        'required': ['service_name', 'date']
+    },
+    timeout_ms=2000,
+    cacheable=True,
+    fallback=cached_availability,
+)
+def check_service_availability(call, context: CallContext, parameters: Dict) -> Dict:
+    match = service_matcher_registry.match(call.business_id, parameters.get('service_name', ''))
+    if not match:
+        return {'error': f"Servicio '{parameters.get('service_name')}' no encontrado"}
+    
+    result = AvailabilityQueryService(call.business, call_context=context).check_availability(
+        match.service_id,
+        parameters.get('date'),
+        None
+    )
+    return {**result, 'match_confidence': match.confidence}
+
+
+@voice_functions.register(
+    'book_appointment',
+    description='Book an appointment for a client',
+    parameters={
+        'type': 'object',
+        'properties': {
+            'service_name': {'type': 'string', 'description': 'Name of the service to book'},
+            'datetime': {'type': 'string', 'description': 'Appointment datetime in ISO format'},
+            'client_name': {'type': 'string', 'description': 'Full name of the client'},
+            'client_phone': {'type': 'string', 'description': 'Client phone number'},
+            'client_email': {'type': 'string', 'description': 'Client email address'},
+            'notes': {'type': 'string', 'description': 'Additional notes or requirements'}
+        },
+        'required': ['service_name', 'datetime', 'client_name', 'client_phone']
+    },
+    timeout_ms=4000,
+    read_only=False,
+)
+def book_appointment(call, context: CallContext, parameters: Dict) -> Dict:
+    booking_data = AppointmentBookingData(
+        service_name=parameters.get('service_name', ''),
+        client_name=parameters.get('client_name', ''),
+        client_phone=parameters.get('client_phone', ''),
+        client_email=parameters.get('client_email', ''),
+        datetime_iso=parameters.get('datetime', ''),
+        notes=parameters.get('notes', '')
+    )
+    return AppointmentBookingDomainService(call.business).book_appointment(booking_data)
+
+
+@voice_functions.register(
+    'get_business_hours',
+    description='Get operating hours for the current business',
+    parameters={
+        'type': 'object',
+        'properties': {
+            'date': {'type': 'string', 'description': 'Date in YYYY-MM-DD format'}
+        },
+        'required': ['date']
+    },
+    timeout_ms=500,
+    cacheable=True,
+)
+def get_business_hours(call, context: CallContext, parameters: Dict) -> Dict:
+    date_str = parameters.get('date')
+    if not date_str:
+        return {'error': 'Fecha requerida'}
+    
+    try:
+        date_obj = datetime.fromisoformat(date_str).date()
+    except ValueError:
+        return {'error': 'Formato de fecha inválido'}
+    
+    hours = context.hours_for(date_obj.weekday())
+    if hours and not hours['is_closed']:
+        return {
+            'open': True,
+            'open_time': str(hours['open_time']),
+            'close_time': str(hours['close_time']),
+            'day': hours['day']
+        }
+    return {
+        'open': False,
+        'day': date_format(date_obj, 'l')
+    }
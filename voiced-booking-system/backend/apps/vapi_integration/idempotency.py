@@ -0,0 +1,85 @@
+from typing import Dict, Optional
+from django.conf import settings
+from apps.core.cache import get_redis_client
+from apps.core.metrics import metrics
+from .optimizations import VapiCacheKeys
+from .value_objects import VapiEventType
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROCESSING = b'processing'
+DONE = b'done'
+
+FIRST = 'first'
+DUPLICATE = 'duplicate'
+IN_FLIGHT = 'in_flight'
+
+
+class WebhookLedger:
+    def __init__(self, client=None):
+        self._client = client
+    
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_redis_client()
+        return self._client
+    
+    @property
+    def enabled(self) -> bool:
+        return settings.VAPI_WEBHOOK_DEDUPE_TTL > 0
+    
+    def fingerprint(self, event_type: VapiEventType, webhook_data: Dict) -> Optional[str]:
+        # Reply events must always be answered, so only fire-and-forget deliveries are deduplicated
+        if not self.enabled or event_type.requires_sync_response:
+            return None
+        
+        message = webhook_data.get('message', {})
+        call_id = (message.get('call') or {}).get('id', '')
+        sequence = message.get('timestamp')
+        if not sequence:
+            # Without a timestamp only the payload itself tells two deliveries apart
+            sequence = hashlib.sha1(json.dumps(message, sort_keys=True, default=str).encode()).hexdigest()
+        return f"{call_id}:{event_type.value}:{sequence}"
+    
+    def claim(self, fingerprint: str) -> str:
+        # A short lease while processing lets a crashed worker's delivery be retried before the stream reclaims it
+        key = VapiCacheKeys.webhook_receipt(fingerprint)
+        try:
+            if self.client.set(key, PROCESSING, nx=True, ex=settings.VAPI_WEBHOOK_DEDUPE_LEASE):
+                outcome = FIRST
+            else:
+                # Only a completed receipt makes this a duplicate: the delivery holding the lease may
+                # still fail and release it, and then nothing else would process the event
+                outcome = DUPLICATE if self.client.get(key) == DONE else IN_FLIGHT
+        except Exception as e:
+            logger.warning(f"Webhook ledger unavailable, processing {fingerprint}: {e}")
+            metrics.increment('vapi.webhook.dedupe', outcome='unavailable')
+            return FIRST
+        
+        metrics.increment('vapi.webhook.dedupe', outcome=outcome)
+        return outcome
+    
+    def complete(self, fingerprint: str):
+        self._write(fingerprint, lambda key: self.client.set(key, DONE, ex=settings.VAPI_WEBHOOK_DEDUPE_TTL))
+    
+    def release(self, fingerprint: str):
+        self._write(fingerprint, lambda key: self.client.delete(key))
+    
+    def hit_rate(self) -> float:
+        counts = metrics.read('vapi.webhook.dedupe')
+        first = counts.get('outcome=first:count', 0)
+        duplicate = counts.get('outcome=duplicate:count', 0)
+        return duplicate / (first + duplicate) if first or duplicate else 0.0
+    
+    def _write(self, fingerprint: str, operation):
+        try:
+            operation(VapiCacheKeys.webhook_receipt(fingerprint))
+        except Exception as e:
+            logger.warning(f"Webhook ledger unavailable, could not record {fingerprint}: {e}")
+
+
+webhook_ledger = WebhookLedger()
@@ -0,0 +1,178 @@
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db import close_old_connections, connections
+from apps.core.cache import get_async_redis_client, get_redis_client
+from .value_objects import VapiEventType
+import json
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookEventStream:
+    def __init__(self, client=None):
+        self.client = client or get_redis_client()
+        self.stream = settings.VAPI_WEBHOOK_STREAM
+        self.group = settings.VAPI_WEBHOOK_STREAM_GROUP
+        self.dead_letter_stream = f"{self.stream}:dead"
+    
+    @staticmethod
+    def accepts(webhook_data: Dict) -> bool:
+        if getattr(settings, 'VAPI_WEBHOOK_INGESTION_MODE', 'sync') != 'stream':
+            return False
+        try:
+            event_type = VapiEventType(webhook_data.get('message', {}).get('type', ''))
+        except ValueError:
+            return False
+        return not event_type.requires_sync_response
+    
+    def publish(self, webhook_data: Dict) -> str:
+        message_id = self.client.xadd(
+            self.stream, self._entry(webhook_data), maxlen=settings.VAPI_WEBHOOK_STREAM_MAXLEN, approximate=True
+        )
+        return self._decode(message_id)
+    
+    async def apublish(self, webhook_data: Dict) -> str:
+        message_id = await get_async_redis_client().xadd(
+            self.stream, self._entry(webhook_data), maxlen=settings.VAPI_WEBHOOK_STREAM_MAXLEN, approximate=True
+        )
+        return self._decode(message_id)
+    
+    def ensure_group(self):
+        import redis
+        try:
+            self.client.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+    
+    def read(self, consumer: str, count: int, block_ms: int) -> List[Tuple[str, Dict]]:
+        response = self.client.xreadgroup(
+            self.group, consumer, {self.stream: '>'}, count=count, block=block_ms
+        )
+        if not response:
+            return []
+        return self._decode_messages(response[0][1])
+    
+    def claim_stale(self, consumer: str, min_idle_ms: int, count: int) -> List[Tuple[str, Dict]]:
+        response = self.client.xautoclaim(
+            self.stream, self.group, consumer, min_idle_time=min_idle_ms, start_id='0-0', count=count
+        )
+        return self._decode_messages(response[1])
+    
+    def ack(self, message_ids: List[str]):
+        if message_ids:
+            self.client.xack(self.stream, self.group, *message_ids)
+    
+    def delivery_count(self, message_id: str) -> int:
+        pending = self.client.xpending_range(
+            self.stream, self.group, min=message_id, max=message_id, count=1
+        )
+        return pending[0]['times_delivered'] if pending else 0
+    
+    def dead_letter(self, message_id: str, fields: Dict):
+        self.client.xadd(
+            self.dead_letter_stream,
+            {**fields, 'source_id': message_id},
+            maxlen=settings.VAPI_WEBHOOK_STREAM_MAXLEN,
+            approximate=True,
+        )
+        self.ack([message_id])
+    
+    @staticmethod
+    def _entry(webhook_data: Dict) -> Dict[str, str]:
+        return {
+            'type': webhook_data.get('message', {}).get('type', ''),
+            'payload': json.dumps(webhook_data),
+        }
+    
+    def _decode_messages(self, messages) -> List[Tuple[str, Dict]]:
+        decoded = []
+        for message_id, fields in messages:
+            if not fields:
+                continue
+            decoded.append((
+                self._decode(message_id),
+                {self._decode(key): self._decode(value) for key, value in fields.items()}
+            ))
+        return decoded
+    
+    @staticmethod
+    def _decode(value) -> str:
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class WebhookStreamConsumer:
+    def __init__(self, name: str, event_stream: Optional[WebhookEventStream] = None,
+                 batch_size: int = 10, block_ms: int = 2000, claim_idle_ms: int = 60000):
+        self.name = name
+        self.event_stream = event_stream or WebhookEventStream()
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self._stopped = threading.Event()
+        self._last_claim = 0.0
+    
+    def stop(self):
+        self._stopped.set()
+    
+    def run(self):
+        self.event_stream.ensure_group()
+        logger.info(f"Webhook stream consumer {self.name} started")
+        try:
+            while not self._stopped.is_set():
+                try:
+                    messages = self._next_batch()
+                    if messages:
+                        self.process_batch(messages)
+                except Exception as e:
+                    logger.error(f"Webhook stream consumer {self.name} failed: {e}")
+                    time.sleep(1)
+        finally:
+            connections.close_all()
+            logger.info(f"Webhook stream consumer {self.name} stopped")
+    
+    def process_batch(self, messages: List[Tuple[str, Dict]]) -> int:
+        from .call_writer import call_state_writer
+        from .transcripts import transcript_segments
+        
+        close_old_connections()
+        # Transcript segments and call state changes from the whole batch go out as bulk upserts
+        with transcript_segments.buffered(), call_state_writer.buffered():
+            processed = self._process_messages(messages)
+        
+        self.event_stream.ack(processed)
+        return len(processed)
+    
+    def _process_messages(self, messages: List[Tuple[str, Dict]]) -> List[str]:
+        from .processors import WebhookProcessor
+        
+        processed = []
+        for message_id, fields in messages:
+            try:
+                webhook_data = json.loads(fields['payload'])
+            except (KeyError, ValueError):
+                logger.error(f"Malformed webhook stream entry {message_id}")
+                self.event_stream.dead_letter(message_id, fields)
+                continue
+            
+            result = WebhookProcessor().process_webhook(webhook_data)
+            if 'error' not in result:
+                processed.append(message_id)
+                continue
+            
+            logger.warning(f"Webhook stream entry {message_id} failed: {result['error']}")
+            if self.event_stream.delivery_count(message_id) >= settings.VAPI_WEBHOOK_STREAM_MAX_DELIVERIES:
+                self.event_stream.dead_letter(message_id, fields)
+        return processed
+    
+    def _next_batch(self) -> List[Tuple[str, Dict]]:
+        now = time.monotonic()
+        if now - self._last_claim >= self.claim_idle_ms / 1000:
+            self._last_claim = now
+            stale = self.event_stream.claim_stale(self.name, self.claim_idle_ms, self.batch_size)
+            if stale:
+                return stale
+        return self.event_stream.read(self.name, self.batch_size, self.block_ms)
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.vapi_integration.benchmark import TARGETS, WebhookBenchmark, compare, ensure_tenants, load_recording
+import json
+
+
+class Command(BaseCommand):
+    help = 'Replay Vapi webhook call sequences and report per-event latency percentiles, queries and throughput'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=TARGETS, default='processor', help='Layer the events are replayed against')
+        parser.add_argument('--url', help='Webhook URL for the http target')
+        parser.add_argument('--tenants', type=int, default=5, help='Number of benchmark tenants to spread calls over')
+        parser.add_argument('--calls', type=int, default=100, help='Number of calls to replay')
+        parser.add_argument('--concurrency', type=int, default=8, help='Calls replayed in parallel')
+        parser.add_argument('--recording', help='JSON lines file of recorded webhook bodies (synthetic calls otherwise)')
+        parser.add_argument('--slo-p99-ms', type=float, help='p99 budget per event type (defaults to the webhook deadline)')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--baseline', help='Previous JSON report to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed relative regression against the baseline')
+    
+    def handle(self, *args, **options):
+        recording = None
+        if options['recording']:
+            with open(options['recording']) as recording_file:
+                recording = load_recording(recording_file)
+            if not recording:
+                raise CommandError(f"No webhook events found in {options['recording']}")
+        
+        try:
+            benchmark = WebhookBenchmark(
+                ensure_tenants(options['tenants']),
+                calls=options['calls'],
+                concurrency=options['concurrency'],
+                target=options['target'],
+                recording=recording,
+                url=options['url'],
+                slo_p99_ms=options['slo_p99_ms'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        report = benchmark.run()
+        self._print(report)
+        
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump(report, output_file, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+        
+        failures = [f"p99 SLO of {report['slo']['p99_ms']}ms breached by {event_type}" for event_type in report['slo']['breaches']]
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                failures += compare(report, json.load(baseline_file), options['tolerance'])
+        
+        if failures:
+            for failure in failures:
+                self.stdout.write(self.style.ERROR(failure))
+            raise CommandError(f'{len(failures)} benchmark check(s) failed')
+        self.stdout.write(self.style.SUCCESS('Benchmark within SLO'))
+    
+    def _print(self, report):
+        self.stdout.write(
+            f"{report['target']}: {report['overall']['count']} events from {report['calls']} calls "
+            f"in {report['duration_s']}s ({report['throughput_eps']} events/s, concurrency {report['concurrency']})"
+        )
+        self.stdout.write(f"{'event':<22}{'count':>7}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'queries':>9}")
+        for event_type, stats in [*report['event_types'].items(), ('all', report['overall'])]:
+            queries = stats['queries_per_event'] if stats['queries_per_event'] is not None else '-'
+            self.stdout.write(
+                f"{event_type:<22}{stats['count']:>7}{stats['errors']:>8}"
+                f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{queries:>9}"
+            )
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from apps.vapi_integration.ingestion import WebhookStreamConsumer
+import os
+import socket
+import threading
+
+
+class Command(BaseCommand):
+    help = 'Drain queued Vapi webhook events from the Redis stream into the event handlers'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of consumer threads')
+        parser.add_argument('--batch-size', type=int, default=10, help='Events read per consumer round-trip')
+        parser.add_argument('--block-ms', type=int, default=2000, help='Blocking read timeout in milliseconds')
+        parser.add_argument('--claim-idle-ms', type=int, default=60000, help='Reclaim events pending longer than this')
+    
+    def handle(self, *args, **options):
+        prefix = f'{socket.gethostname()}-{os.getpid()}'
+        consumers = [
+            WebhookStreamConsumer(
+                name=f'{prefix}-{index}',
+                batch_size=options['batch_size'],
+                block_ms=options['block_ms'],
+                claim_idle_ms=options['claim_idle_ms'],
+            )
+            for index in range(options['workers'])
+        ]
+        threads = [threading.Thread(target=consumer.run, daemon=True) for consumer in consumers]
+        
+        for thread in threads:
+            thread.start()
+        
+        self.stdout.write(self.style.SUCCESS(f'Started {len(threads)} webhook stream consumers ({prefix})'))
+        
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping webhook stream consumers...')
+            for consumer in consumers:
+                consumer.stop()
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from apps.vapi_integration.reconciliation import CallReconciler
+
+
+def _moment(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"'{value}' is not a date or datetime")
+        moment = datetime(day.year, day.month, day.day)
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment, dt_timezone.utc)
+
+
+class Command(BaseCommand):
+    help = "Backfill and reconcile VapiCall rows from Vapi's call listing, resuming from the org checkpoint"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--org-id', help='Checkpoint to resume from and advance (defaults to VAPI_ORG_ID)')
+        parser.add_argument('--since', help='Start here instead of at the checkpoint, e.g. 2025-01-01 for a backfill')
+        parser.add_argument('--until', help='Stop at this date or datetime (defaults to now)')
+        parser.add_argument('--max-windows', type=int, help='Stop after this many windows; rerun to continue')
+        parser.add_argument('--window-hours', type=int, help='Width of each createdAt window')
+        parser.add_argument('--concurrency', type=int, help='Windows fetched from Vapi in parallel')
+        parser.add_argument('--page-size', type=int, help='Calls requested per listing page')
+        parser.add_argument('--chunk-size', type=int, help='Calls diffed and upserted per transaction')
+    
+    def handle(self, *args, **options):
+        reconciler = CallReconciler(
+            org_id=options['org_id'],
+            page_size=options['page_size'],
+            chunk_size=options['chunk_size'],
+            concurrency=options['concurrency'],
+            window=timedelta(hours=options['window_hours']) if options['window_hours'] else None,
+        )
+        stats = reconciler.run(
+            since=_moment(options['since']) if options['since'] else None,
+            until=_moment(options['until']) if options['until'] else None,
+            max_windows=options['max_windows'],
+        )
+        if stats is None:
+            raise CommandError(f'Reconciliation for org {reconciler.org_id} is already running')
+        
+        for name, value in stats.as_dict().items():
+            self.stdout.write(f'{name}: {value}')
+        self.stdout.write(self.style.SUCCESS(f'Vapi calls reconciled up to {stats.synced_until:%Y-%m-%d %H:%M} UTC'))
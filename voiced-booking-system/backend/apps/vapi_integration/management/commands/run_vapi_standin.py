@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from apps.vapi_integration.standin import FaultProfile, VapiStandIn
+
+
+class Command(BaseCommand):
+    help = 'Serve a local stand-in for the Vapi REST API (point VAPI_BASE_URL at it)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+        parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+        parser.add_argument('--latency-ms', type=float, default=0, help='Added latency per request')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='Uniform +/- jitter on the added latency')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with --error-status')
+        parser.add_argument('--error-status', type=int, default=500, help='Status code of injected failures')
+        parser.add_argument('--rate-limit', type=float, help='Requests per second before answering 429')
+        parser.add_argument('--rate-limit-burst', type=int, default=10, help='Requests allowed in a burst')
+        parser.add_argument('--seed', type=int, help='Seed for reproducible jitter and failures')
+    
+    def handle(self, *args, **options):
+        standin = VapiStandIn(options['host'], options['port'], FaultProfile(
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'],
+            error_status=options['error_status'],
+            rate_limit_per_second=options['rate_limit'],
+            rate_limit_burst=options['rate_limit_burst'],
+            seed=options['seed'],
+        ))
+        self.stdout.write(self.style.SUCCESS(f'Vapi stand-in listening on {standin.url} (set VAPI_BASE_URL={standin.url})'))
+        
+        try:
+            standin.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping Vapi stand-in...')
+        finally:
+            standin.stop()
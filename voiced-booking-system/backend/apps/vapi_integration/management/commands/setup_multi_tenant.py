@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from apps.vapi_integration.multi_tenant_services import TenantRegistrationService, SharedAgentManager
+from apps.vapi_integration.multi_tenant_services import TenantRegistrationService, shared_agent_registry
 from apps.businesses.models import Business
 
 
@@ -25,8 +25,7 @@ class Command(BaseCommand):
 
     def init_shared_agent(self):
         try:
-            shared_agent = SharedAgentManager()
-            agent_id = shared_agent.shared_agent_id
+            agent_id = shared_agent_registry.refresh()
             self.stdout.write(
                 self.style.SUCCESS(f'Shared agent initialized: {agent_id}')
             )
@@ -67,8 +66,7 @@ class Command(BaseCommand):
 
     def show_status(self):
         try:
-            shared_agent = SharedAgentManager()
-            agent_id = shared_agent.shared_agent_id
+            agent_id = shared_agent_registry.get_agent_id(wait=True)
             self.stdout.write(f'Shared Agent ID: {agent_id}')
             
             total_businesses = Business.objects.filter(is_active=True).count()
@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 from django.conf import settings
 from apps.businesses.models import Business
 from apps.vapi_integration.api_client import VapiBusinessService, VapiAPIClient
+from apps.vapi_integration.assistant_sync import AssistantSynchronizer
 from apps.vapi_integration.models import VapiConfiguration
 import logging
 
@@ -21,6 +22,9 @@ class Command(BaseCommand):
         parser.add_argument('--business-slug', type=str, help='Business slug for specific operations')
         parser.add_argument('--area-code', type=str, help='Area code for buying phone number')
         parser.add_argument('--phone-name', type=str, help='Name for the phone number')
+        parser.add_argument('--workers', type=int, help='Assistants pushed to Vapi in parallel')
+        parser.add_argument('--force', action='store_true', help='Push every assistant, even if its config is unchanged')
+        parser.add_argument('--progress-every', type=int, default=100, help='Report progress every N tenants')
 
     def handle(self, *args, **options):
         action = options['action']
@@ -36,23 +40,37 @@ class Command(BaseCommand):
 
     def sync_assistants(self, options):
         businesses = self._get_businesses(options)
-        synced_count = 0
+        configs = VapiConfiguration.objects.filter(business__in=businesses)
+        synchronizer = AssistantSynchronizer(
+            workers=options['workers'],
+            force=options['force'],
+            progress=self._report_progress,
+            progress_every=options['progress_every'],
+        )
+        stats = synchronizer.run(configs)
         
-        for business in businesses:
-            try:
-                service = VapiBusinessService(business)
-                assistant_id = service.get_or_create_assistant()
-                self.stdout.write(
-                    self.style.SUCCESS(f'Synced assistant {assistant_id} for {business.name}')
-                )
-                synced_count += 1
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f'Failed to sync assistant for {business.name}: {e}')
-                )
+        # Businesses without an active configuration have no assistant to sync; they are still reported
+        unconfigured = 0
+        for name in businesses.exclude(vapi_configurations__is_active=True).values_list('name', flat=True).iterator():
+            unconfigured += 1
+            self.stdout.write(
+                self.style.ERROR(f'Failed to sync assistant for {name}: No active VAPI configuration found')
+            )
         
+        style = self.style.ERROR if stats.failed or unconfigured else self.style.SUCCESS
+        self.stdout.write(style(
+            f'Synced {stats.updated + stats.created} assistants ({stats.updated} updated, {stats.created} created), '
+            f'{stats.unchanged} unchanged, {stats.shared} on the shared agent, {stats.failed} failed, '
+            f'{unconfigured} without a configuration'
+        ))
+        if stats.failed:
+            self.stdout.write('Rerun to retry the failed assistants; unchanged ones are skipped')
+
+    def _report_progress(self, stats):
+        rate = stats.done / stats.elapsed if stats.elapsed else 0
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully synced {synced_count} assistants')
+            f'{stats.done}/{stats.total} tenants checked, {stats.updated + stats.created} pushed, '
+            f'{stats.failed} failed ({rate:.1f}/s)'
         )
 
     def create_assistant(self, options):
@@ -1,9 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator, MaxValueValidator
 from apps.core.mixins import BaseModel, SimpleModel
 from apps.core.choices import VAPI_CALL_STATUS_CHOICES, VAPI_CALL_TYPE_CHOICES, VAPI_ENDED_REASON_CHOICES, LANGUAGE_CHOICES
 from .optimizations import VapiConfigManager, VapiCacheKeys
+from .security import webhook_verifier
+from .tenant_cache import tenant_resolver, tenant_routing_table
 
 
 class VapiConfiguration(BaseModel):
@@ -11,6 +13,8 @@ class VapiConfiguration(BaseModel):
     phone_number_id = models.CharField(_('phone number ID'), max_length=255, blank=True)
     phone_number = models.CharField(_('phone number'), max_length=20, blank=True)
     assistant_id = models.CharField(_('assistant ID'), max_length=255, blank=True)
+    # sha256 of the assistant config last pushed to Vapi; sync only PATCHes assistants whose config changed
+    assistant_config_hash = models.CharField(_('assistant config hash'), max_length=64, blank=True)
     assistant_name = models.CharField(_('assistant name'), max_length=100, default='Booking Assistant')
     language = models.CharField(_('language'), max_length=10, choices=LANGUAGE_CHOICES, default='es')
     server_url = models.URLField(_('server URL'))
@@ -66,12 +70,22 @@ class VapiConfiguration(BaseModel):
                 'business_slug': self.business.slug
             }
         super().save(*args, **kwargs)
-        VapiConfigManager.invalidate_business_cache(self.business_id)
+        business_id = self.business_id
+        VapiConfigManager.invalidate_business_cache(business_id)
+        # Dropped before commit, the snapshot or secret could be reloaded from the old row and kept
+        transaction.on_commit(lambda: tenant_resolver.invalidate(business_id))
+        transaction.on_commit(lambda: webhook_verifier.invalidate(business_id))
+        tenant_routing_table.invalidate()
+        transaction.on_commit(tenant_routing_table.rebuild)
     
     def delete(self, *args, **kwargs):
         business_id = self.business_id
         super().delete(*args, **kwargs)
         VapiConfigManager.invalidate_business_cache(business_id)
+        transaction.on_commit(lambda: tenant_resolver.invalidate(business_id))
+        transaction.on_commit(lambda: webhook_verifier.invalidate(business_id))
+        tenant_routing_table.invalidate()
+        transaction.on_commit(tenant_routing_table.rebuild)
     
     @property
     def assistant_config(self):
@@ -87,6 +101,31 @@ class VapiConfiguration(BaseModel):
         }
 
 
+class VapiPhoneNumber(models.Model):
+    # Numbers bought ahead of demand; a number with no business is free for the next registration
+    phone_number_id = models.CharField(_('phone number ID'), max_length=255, unique=True)
+    number = models.CharField(_('number'), max_length=20)
+    area_code = models.CharField(_('area code'), max_length=10, blank=True)
+    business = models.ForeignKey(
+        'businesses.Business', on_delete=models.SET_NULL, null=True, blank=True, related_name='vapi_phone_numbers'
+    )
+    assigned_at = models.DateTimeField(_('assigned at'), null=True, blank=True)
+    configured_at = models.DateTimeField(_('configured at'), null=True, blank=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Vapi Phone Number')
+        verbose_name_plural = _('Vapi Phone Numbers')
+        db_table = 'vapi_phone_numbers'
+        indexes = [
+            models.Index(fields=['area_code', 'business']),
+            models.Index(fields=['business', 'configured_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.number} ({'assigned' if self.business_id else 'available'})"
+
+
 class VapiCall(SimpleModel):
     business = models.ForeignKey('businesses.Business', on_delete=models.CASCADE, related_name='vapi_calls')
     call_id = models.CharField(_('call ID'), max_length=255, unique=True)
@@ -144,6 +183,31 @@ class VapiCallTranscript(models.Model):
         return f"Transcript for {self.call.call_id}"
 
 
+class VapiCallTranscriptSegment(models.Model):
+    call = models.ForeignKey(
+        VapiCall, to_field='call_id', db_constraint=False, on_delete=models.CASCADE, related_name='transcript_segments'
+    )
+    seq = models.BigIntegerField(_('sequence'))
+    # sha1 of the segment's timestamp, role and text: stable across redeliveries, distinct for segments
+    # that share a millisecond
+    fingerprint = models.CharField(_('fingerprint'), max_length=40)
+    role = models.CharField(_('role'), max_length=20, blank=True)
+    text = models.TextField(_('text'))
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Vapi Call Transcript Segment')
+        verbose_name_plural = _('Vapi Call Transcript Segments')
+        db_table = 'vapi_call_transcript_segments'
+        ordering = ['call', 'seq']
+        constraints = [
+            models.UniqueConstraint(fields=['call', 'fingerprint'], name='unique_vapi_transcript_segment'),
+        ]
+    
+    def __str__(self):
+        return f"Segment {self.seq} for {self.call_id}"
+
+
 class VapiCallAnalysis(models.Model):
     call = models.OneToOneField(VapiCall, on_delete=models.CASCADE, related_name='analysis')
     summary = models.TextField(_('summary'), blank=True)
@@ -159,6 +223,22 @@ class VapiCallAnalysis(models.Model):
         return f"Analysis for {self.call.call_id}"
 
 
+class VapiCallSyncCheckpoint(models.Model):
+    org_id = models.CharField(_('org ID'), max_length=255, unique=True)
+    synced_until = models.DateTimeField(_('synced until'))
+    calls_synced = models.PositiveBigIntegerField(_('calls synced'), default=0)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Vapi Call Sync Checkpoint')
+        verbose_name_plural = _('Vapi Call Sync Checkpoints')
+        db_table = 'vapi_call_sync_checkpoints'
+    
+    def __str__(self):
+        return f"{self.org_id} synced until {self.synced_until:%Y-%m-%d %H:%M}"
+
+
 class VapiAppointmentIntegration(models.Model):
     call = models.OneToOneField(VapiCall, on_delete=models.CASCADE, related_name='appointment_integration')
     appointment = models.ForeignKey('appointments.Appointment', on_delete=models.CASCADE, related_name='vapi_integration')
@@ -2,9 +2,15 @@ from typing import Dict, Optional
 from django.db import transaction
 from django.conf import settings
 from apps.businesses.models import Business
+from apps.core.cache import LocalLRUCache, get_redis_client
 from .api_client import VapiAPIClient
 from .models import VapiConfiguration
-from .optimizations import cache_service, VapiCacheKeys
+from .optimizations import cache_service, vapi_cache_service, VapiCacheKeys
+from .phone_numbers import phone_number_pool
+from .tenant_cache import tenant_resolver, tenant_routing_table
+from .value_objects import TenantSnapshot
+import threading
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,23 +19,21 @@ logger = logging.getLogger(__name__)
 class SharedAgentManager:
     def __init__(self):
         self.client = VapiAPIClient()
-        self._shared_agent_id = None
     
     @property
     def shared_agent_id(self) -> str:
-        if not self._shared_agent_id:
-            self._shared_agent_id = self._get_or_create_shared_agent()
-        return self._shared_agent_id
+        # Registration stores this id on the tenant's configuration, so it waits for the real agent
+        return shared_agent_registry.get_agent_id(wait=True)
     
-    def _get_or_create_shared_agent(self) -> str:
-        shared_agent_id = getattr(settings, 'VAPI_SHARED_AGENT_ID', None)
+    def _get_or_create_shared_agent(self, known_agent_id: Optional[str] = None) -> str:
+        candidates = [known_agent_id, getattr(settings, 'VAPI_SHARED_AGENT_ID', None)]
         
-        if shared_agent_id:
+        for shared_agent_id in filter(None, dict.fromkeys(candidates)):
             try:
                 self.client.get_assistant(shared_agent_id)
                 return shared_agent_id
             except Exception:
-                pass
+                logger.warning(f"Shared agent {shared_agent_id} could not be validated")
         
         assistant_config = self._build_shared_agent_config()
         result = self.client.create_assistant(assistant_config)
@@ -55,69 +59,8 @@ class SharedAgentManager:
         }
     
     def _get_shared_tools(self) -> list:
-        return [
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'get_business_services',
-                    'description': 'Get available services for the current business',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {},
-                        'required': []
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'check_service_availability',
-                    'description': 'Check availability slots for a specific service and date',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'service_name': {'type': 'string', 'description': 'Name of the service'},
-                            'date': {'type': 'string', 'description': 'Date in YYYY-MM-DD format'},
-                            'time_preference': {'type': 'string', 'description': 'Preferred time (morning, afternoon, evening)'}
-                        },
-                        'required': ['service_name', 'date']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'book_appointment',
-                    'description': 'Book an appointment for a client',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'service_name': {'type': 'string', 'description': 'Name of the service to book'},
-                            'datetime': {'type': 'string', 'description': 'Appointment datetime in ISO format'},
-                            'client_name': {'type': 'string', 'description': 'Full name of the client'},
-                            'client_phone': {'type': 'string', 'description': 'Client phone number'},
-                            'client_email': {'type': 'string', 'description': 'Client email address'},
-                            'notes': {'type': 'string', 'description': 'Additional notes or requirements'}
-                        },
-                        'required': ['service_name', 'datetime', 'client_name', 'client_phone']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'get_business_hours',
-                    'description': 'Get operating hours for the current business',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'date': {'type': 'string', 'description': 'Date in YYYY-MM-DD format'}
-                        },
-                        'required': ['date']
-                    }
-                }
-            }
-        ]
+        from .functions import voice_functions
+        return voice_functions.tool_definitions()
     
     def _get_shared_system_message(self) -> str:
         return """Eres un asistente virtual especializado en reservas para múltiples negocios. 
@@ -142,12 +85,86 @@ IMPORTANTE:
 - Habla en español de forma natural y profesional"""
 
 
+class SharedAgentRegistry:
+    LOCAL_KEY = 'shared_agent_id'
+    LOCK_TIMEOUT = 60
+    REFRESH_INTERVAL = 60
+    
+    def __init__(self, local_timeout: int = 300, shared_timeout: int = 86400):
+        self.shared_timeout = shared_timeout
+        self._local = LocalLRUCache(max_size=1, timeout=local_timeout)
+        self._last_known: Optional[str] = None
+        self._refresh_scheduled_at = None
+    
+    def get_agent_id(self, wait: bool = False) -> Optional[str]:
+        agent_id = self._local.get(self.LOCAL_KEY)
+        if agent_id:
+            return agent_id
+        
+        agent_id = vapi_cache_service.get(VapiCacheKeys.shared_agent())
+        if agent_id:
+            self._remember(agent_id)
+            return agent_id
+        if wait:
+            return self.refresh(validate=False)
+        
+        # Webhook paths never block on the refresh lock or a Vapi call: they answer with the last
+        # agent this process resolved, or the configured one, while a worker caches the real one.
+        # None means neither is known and callers must not hand Vapi an empty assistant id.
+        self._schedule_refresh()
+        return self._last_known or settings.VAPI_SHARED_AGENT_ID or None
+    
+    def _remember(self, agent_id: str):
+        self._local.set(self.LOCAL_KEY, agent_id)
+        self._last_known = agent_id
+    
+    def _schedule_refresh(self):
+        now = time.monotonic()
+        if self._refresh_scheduled_at is not None and now - self._refresh_scheduled_at < self.REFRESH_INTERVAL:
+            return
+        self._refresh_scheduled_at = now
+        # Publishing to the broker is a network round trip, so it stays off the caller's thread
+        threading.Thread(target=self._enqueue_refresh, name='shared-agent-refresh', daemon=True).start()
+    
+    @staticmethod
+    def _enqueue_refresh():
+        from .tasks import refresh_shared_agent
+        
+        try:
+            refresh_shared_agent.delay()
+        except Exception as e:
+            logger.error(f"Could not schedule a shared agent refresh: {e}")
+    
+    def refresh(self, validate: bool = True) -> str:
+        lock = get_redis_client().lock(
+            VapiCacheKeys.shared_agent_lock(),
+            timeout=self.LOCK_TIMEOUT,
+            blocking_timeout=self.LOCK_TIMEOUT
+        )
+        with lock:
+            agent_id = vapi_cache_service.get(VapiCacheKeys.shared_agent())
+            if not agent_id or validate:
+                agent_id = SharedAgentManager()._get_or_create_shared_agent(agent_id)
+            
+            vapi_cache_service.set(VapiCacheKeys.shared_agent(), agent_id, self.shared_timeout)
+        
+        self._remember(agent_id)
+        return agent_id
+    
+    def invalidate(self):
+        self._local.delete(self.LOCAL_KEY)
+        self._last_known = None
+        vapi_cache_service.delete(VapiCacheKeys.shared_agent())
+
+
+shared_agent_registry = SharedAgentRegistry()
+
+
 class TenantRegistrationService:
     def __init__(self):
         self.client = VapiAPIClient()
         self.shared_agent = SharedAgentManager()
     
-    @transaction.atomic
     def register_tenant(self, business: Business, area_code: Optional[str] = None) -> Dict:
         try:
             existing_config = VapiConfiguration.objects.filter(
@@ -165,46 +182,47 @@ class TenantRegistrationService:
                     'message': 'Using existing configuration'
                 }
             
-            phone_result = self._provision_phone_number(business, area_code)
-            config_result = self._create_vapi_configuration(business, phone_result)
+            # Resolved up front: on a cold cache this may call Vapi, which must not happen inside the claim
+            assistant_id = self.shared_agent.shared_agent_id
+            number = self._assign_phone_number(business, area_code, assistant_id)
+            if number is None:
+                # Empty pool: buy one outside any transaction, held for this business so a concurrent
+                # registration can't claim it first
+                purchased = phone_number_pool.purchase(area_code, business=business)
+                number = self._assign_phone_number(business, area_code, assistant_id, pk=purchased.pk)
+            if number is None:
+                return {'success': False, 'error': f"No phone number available for area code {area_code or 'any'}"}
             
             logger.info(f"Tenant registered successfully: {business.name}")
             return {
                 'success': True,
                 'business_id': business.id,
-                'phone_number': phone_result['number'],
-                'phone_number_id': phone_result['id']
+                'phone_number': number.number,
+                'phone_number_id': number.phone_number_id
             }
         except Exception as e:
             logger.error(f"Tenant registration failed for {business.name}: {e}")
             return {'success': False, 'error': str(e)}
     
-    def _provision_phone_number(self, business: Business, area_code: Optional[str]) -> Dict:
-        phone_result = self.client.buy_phone_number(area_code=area_code)
-        
-        shared_agent_id = self.shared_agent.shared_agent_id
-        
-        self.client.update_phone_number(phone_result['id'], {
-            'assistantId': shared_agent_id,
-            'metadata': {
-                'tenant_id': str(business.id),
-                'business_name': business.name,
-                'business_slug': business.slug
-            }
-        })
+    def _assign_phone_number(self, business: Business, area_code: Optional[str], assistant_id: str, pk=None):
+        from .tasks import configure_phone_number
         
-        return {
-            'id': phone_result['id'],
-            'number': phone_result['number']
-        }
+        with transaction.atomic():
+            number = phone_number_pool.claim(business, area_code, pk=pk)
+            if number is None:
+                return None
+            self._create_vapi_configuration(business, {'id': number.phone_number_id, 'number': number.number}, assistant_id)
+            # Pointing the number at the shared agent is a Vapi call, so it waits until the claim is committed
+            transaction.on_commit(lambda: configure_phone_number.delay(number.pk))
+        return number
     
-    def _create_vapi_configuration(self, business: Business, phone_result: Dict) -> VapiConfiguration:
+    def _create_vapi_configuration(self, business: Business, phone_result: Dict, assistant_id: str) -> VapiConfiguration:
         from django.utils import timezone
         return VapiConfiguration.objects.create(
             business=business,
             phone_number_id=phone_result['id'],
             phone_number=phone_result['number'],
-            assistant_id=self.shared_agent.shared_agent_id,
+            assistant_id=assistant_id,
             assistant_name='Shared Multi-Tenant Assistant',
             server_url=f"{settings.VAPI_WEBHOOK_BASE_URL}/vapi/webhook/",
             server_secret=getattr(settings, 'VAPI_WEBHOOK_SECRET', ''),
@@ -221,6 +239,30 @@ class TenantRegistrationService:
 class MetadataExtractor:
     @staticmethod
     def extract_tenant_info(webhook_data: Dict) -> Optional[Dict]:
+        tenant_info = MetadataExtractor._tenant_from_metadata(webhook_data)
+        if tenant_info:
+            return tenant_info
+        
+        tenant_id = tenant_routing_table.resolve(**MetadataExtractor.extract_routing_keys(webhook_data))
+        if tenant_id:
+            return {'tenant_id': tenant_id, 'business_slug': ''}
+        
+        return None
+    
+    @staticmethod
+    async def aextract_tenant_info(webhook_data: Dict) -> Optional[Dict]:
+        tenant_info = MetadataExtractor._tenant_from_metadata(webhook_data)
+        if tenant_info:
+            return tenant_info
+        
+        tenant_id = await tenant_routing_table.aresolve(**MetadataExtractor.extract_routing_keys(webhook_data))
+        if tenant_id:
+            return {'tenant_id': tenant_id, 'business_slug': ''}
+        
+        return None
+    
+    @staticmethod
+    def _tenant_from_metadata(webhook_data: Dict) -> Optional[Dict]:
         call_data = webhook_data.get('message', {}).get('call', {})
         
         metadata = call_data.get('metadata', {})
@@ -238,16 +280,43 @@ class MetadataExtractor:
                     'tenant_id': metadata['tenant_id'],
                     'business_slug': metadata.get('business_slug', '')
                 }
-        
         return None
     
     @staticmethod
-    def get_business_from_metadata(webhook_data: Dict) -> Optional[Business]:
+    def extract_routing_keys(webhook_data: Dict) -> Dict[str, Optional[str]]:
+        message = webhook_data.get('message', {})
+        call_data = message.get('call', {})
+        
+        phone_number = call_data.get('phoneNumber') or message.get('phoneNumber') or {}
+        if isinstance(phone_number, dict):
+            phone_number_id = call_data.get('phoneNumberId') or phone_number.get('id')
+            phone_number = phone_number.get('number')
+        else:
+            phone_number_id = call_data.get('phoneNumberId')
+        
+        return {
+            'phone_number_id': phone_number_id,
+            'phone_number': phone_number,
+            'assistant_id': call_data.get('assistantId') or message.get('assistant', {}).get('id'),
+        }
+    
+    @staticmethod
+    def get_tenant_from_metadata(webhook_data: Dict) -> Optional[TenantSnapshot]:
         tenant_info = MetadataExtractor.extract_tenant_info(webhook_data)
         if not tenant_info:
             return None
         
-        try:
-            return Business.objects.get(id=tenant_info['tenant_id'])
-        except (Business.DoesNotExist, ValueError):
+        return tenant_resolver.get_by_id(tenant_info['tenant_id'])
+    
+    @staticmethod
+    def get_business_from_metadata(webhook_data: Dict) -> Optional[Business]:
+        snapshot = MetadataExtractor.get_tenant_from_metadata(webhook_data)
+        return tenant_resolver.to_business(snapshot) if snapshot else None
+    
+    @staticmethod
+    async def aget_tenant_from_metadata(webhook_data: Dict) -> Optional[TenantSnapshot]:
+        tenant_info = await MetadataExtractor.aextract_tenant_info(webhook_data)
+        if not tenant_info:
             return None
+        
+        return await tenant_resolver.aget_by_id(tenant_info['tenant_id'])
@@ -1,4 +1,5 @@
-from apps.core.cache import cache_service
+from apps.core.cache import cache_service, cached_method
+from apps.core.circuit_breakers import circuit_breakers
 from functools import wraps
 from typing import Any, Dict, Optional, Union
 
@@ -10,6 +11,26 @@ class VapiCacheKeys:
     def business_config(cls, business_id: int) -> str:
         return f"{cls.PREFIX}:config:{business_id}"
     
+    @classmethod
+    def tenant(cls, business_id) -> str:
+        return f"{cls.PREFIX}:tenant:{business_id}"
+    
+    @classmethod
+    def tenant_slug(cls, slug: str) -> str:
+        return f"{cls.PREFIX}:tenant_slug:{slug}"
+    
+    @classmethod
+    def routing_table(cls) -> str:
+        return f"{cls.PREFIX}:routing_table"
+    
+    @classmethod
+    def shared_agent(cls) -> str:
+        return f"{cls.PREFIX}:shared_agent"
+    
+    @classmethod
+    def shared_agent_lock(cls) -> str:
+        return f"{cls.PREFIX}:shared_agent:lock"
+    
     @classmethod
     def assistant(cls, business_id: int) -> str:
         return f"{cls.PREFIX}:assistant:{business_id}"
@@ -18,10 +39,34 @@ class VapiCacheKeys:
     def services(cls, business_id: int) -> str:
         return f"{cls.PREFIX}:services:{business_id}"
     
+    @classmethod
+    def service_catalog_version(cls, business_id) -> str:
+        return f"{cls.PREFIX}:service_catalog_version:{business_id}"
+    
+    @classmethod
+    def webhook_receipt(cls, fingerprint: str) -> str:
+        return f"{cls.PREFIX}:webhook_receipt:{fingerprint}"
+    
+    @classmethod
+    def webhook_secret_version(cls, tenant_id) -> str:
+        return f"{cls.PREFIX}:webhook_secret_version:{tenant_id}"
+    
+    @classmethod
+    def webhook_rate_limit(cls, tenant_id) -> str:
+        return f"{cls.PREFIX}:rate_limit:{tenant_id}"
+    
+    @classmethod
+    def call_reconcile_lock(cls, org_id: str) -> str:
+        return f"{cls.PREFIX}:call_reconcile:lock:{org_id}"
+    
     @classmethod
     def availability(cls, business_id: int, service_id: int, date: str) -> str:
         return f"{cls.PREFIX}:availability:{business_id}:{service_id}:{date}"
     
+    @classmethod
+    def call_context(cls, call_id: str) -> str:
+        return f"{cls.PREFIX}:call_context:{call_id}"
+    
     @classmethod
     def call_analysis(cls, call_id: str) -> str:
         return f"{cls.PREFIX}:analysis:{call_id}"
@@ -45,6 +90,15 @@ class VapiCacheService:
     def delete(self, key: str) -> None:
         self._cache.delete(key)
     
+    async def aget(self, key: str) -> Any:
+        return await self._cache.aget(key)
+    
+    async def aset(self, key: str, value: Any, ttl: int = None) -> None:
+        await self._cache.aset(key, value, ttl or self.DEFAULT_TTL)
+    
+    def incr(self, key: str, delta: int = 1) -> int:
+        return self._cache.incr(key, delta)
+    
     def invalidate_pattern(self, pattern: str) -> None:
         self._cache.invalidate_pattern(pattern)
     
@@ -0,0 +1,132 @@
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from apps.core.cache import LocalLRUCache
+from apps.core.metrics import metrics
+from apps.core.utils import instance_from_values
+from .call_states import LIFECYCLE_FIELDS, call_lifecycle
+from .call_writer import CALL_FIELDS, call_state_writer
+from .models import VapiCall
+from .serializers import VapiWebhookSerializer
+from .value_objects import VapiEventType
+import logging
+
+logger = logging.getLogger(__name__)
+
+SKIP = 'skip'
+ENSURE = 'ensure'
+STATUS = 'status'
+FULL = 'full'
+
+EVENT_PERSISTENCE = {
+    'speech-started': SKIP,
+    'speech-ended': SKIP,
+    'transcript': SKIP,
+    'hang': SKIP,
+    'assistant-request': ENSURE,
+    'function-call': ENSURE,
+    'tool-calls': ENSURE,
+    'call-started': STATUS,
+    'call-ended': STATUS,
+    'status-update': STATUS,
+    'end-of-call-report': FULL,
+}
+
+
+class CallPersistence:
+    STATE_FIELDS = ('status', 'ended_reason', 'cost', 'ended_at')
+    
+    def __init__(self, timeout: int = 7200, max_size: int = 10000):
+        self._known = LocalLRUCache(max_size=max_size, timeout=timeout)
+    
+    def policy_for(self, event_type: VapiEventType) -> str:
+        overrides = getattr(settings, 'VAPI_EVENT_PERSISTENCE', {})
+        return overrides.get(event_type.value) or EVENT_PERSISTENCE.get(event_type.value, FULL)
+    
+    def persist(self, event_type: VapiEventType, webhook_data: Dict, business) -> VapiCall:
+        policy = self.policy_for(event_type)
+        call_data = webhook_data.get('message', {}).get('call') or {}
+        if not call_data.get('id'):
+            raise serializers.ValidationError("Call data is required")
+        
+        state = self._known.get(call_data['id'])
+        if policy == FULL or (state is None and policy != SKIP):
+            return self._save(webhook_data, business, policy, state)
+        
+        if policy == STATUS:
+            changes = self._diff(state, call_data)
+            if changes:
+                state = {**state, **changes}
+                self._update(state, changes)
+                self._cache(state)
+        
+        metrics.increment('vapi.persistence', policy=policy, outcome='skipped')
+        return self._instance(state, call_data, business)
+    
+    def forget(self, call_id: str):
+        self._known.delete(call_id)
+    
+    def _save(self, webhook_data: Dict, business, policy: str, state: Optional[Dict[str, Any]] = None) -> VapiCall:
+        serializer = VapiWebhookSerializer(
+            data=webhook_data,
+            context={
+                'business': business,
+                'save_artifacts': policy == FULL,
+                'call_pk': state['id'] if state and state['business_id'] == business.pk else None,
+            }
+        )
+        serializer.is_valid(raise_exception=True)
+        call = serializer.save()
+        self._remember(call)
+        metrics.increment('vapi.persistence', policy=policy, outcome='saved')
+        return call
+    
+    def _update(self, state: Dict[str, Any], changes: Dict[str, Any]):
+        fields = set(changes)
+        if fields & set(LIFECYCLE_FIELDS):
+            fields.add('status')
+        call_state_writer.write(call_state_writer.instance(state), fields)
+    
+    def _diff(self, state: Dict[str, Any], call_data: Dict) -> Dict[str, Any]:
+        changes = {}
+        for field, key, parse in CALL_FIELDS:
+            if field in self.STATE_FIELDS and key in call_data:
+                value = parse(call_data[key])
+                if state.get(field) != value:
+                    changes[field] = value
+        
+        if not call_lifecycle.accepts(state.get('status'), call_data.get('status')):
+            # Stale or status-less events never move the lifecycle, so they cost no query
+            for field in LIFECYCLE_FIELDS:
+                changes.pop(field, None)
+        return changes
+    
+    def _remember(self, call: VapiCall):
+        state = {field: getattr(call, field) for field in self.STATE_FIELDS}
+        if state['cost'] is not None:
+            state['cost'] = Decimal(str(state['cost']))
+        self._cache({
+            'id': call.pk,
+            'call_id': call.call_id,
+            'business_id': call.business_id,
+            **state,
+        })
+    
+    def _cache(self, state: Dict[str, Any]):
+        # Only committed state is remembered: if the webhook's transaction rolls back, Vapi's retry must
+        # still diff against the database, not against the write that never landed
+        transaction.on_commit(lambda: self._known.set(state['call_id'], state))
+    
+    def _instance(self, state: Optional[Dict[str, Any]], call_data: Dict, business) -> VapiCall:
+        if state is None:
+            return VapiCall(call_id=call_data['id'], business=business)
+        
+        call = instance_from_values(VapiCall, state)
+        if business.pk == call.business_id:
+            call.business = business
+        return call
+
+
+call_persistence = CallPersistence()
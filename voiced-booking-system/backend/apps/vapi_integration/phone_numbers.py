@@ -0,0 +1,126 @@
+from typing import Dict, Optional
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from apps.core.metrics import metrics
+from .api_client import VapiAPIClient
+from .models import VapiConfiguration, VapiPhoneNumber
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Inventory of Vapi numbers bought ahead of registrations. Buying and configuring numbers are slow
+# Vapi calls, so they happen in background tasks; registration only claims a row.
+class PhoneNumberPool:
+    def __init__(self, client: Optional[VapiAPIClient] = None):
+        self._client = client
+    
+    @property
+    def client(self) -> VapiAPIClient:
+        return self._client or VapiAPIClient()
+    
+    def targets(self) -> Dict[str, int]:
+        return dict(settings.VAPI_PHONE_POOL_TARGETS)
+    
+    def available(self, area_code: Optional[str] = None) -> int:
+        queryset = VapiPhoneNumber.objects.filter(business__isnull=True)
+        if area_code:
+            queryset = queryset.filter(area_code=area_code)
+        return queryset.count()
+    
+    def replenish(self) -> Dict[str, int]:
+        purchased = {}
+        budget = settings.VAPI_PHONE_POOL_MAX_PURCHASES
+        for area_code, target in self.targets().items():
+            missing = min(max(target - self.available(area_code), 0), budget)
+            bought = 0
+            for _ in range(missing):
+                try:
+                    self.purchase(area_code)
+                except Exception as e:
+                    logger.error(f"Could not buy a phone number for area code {area_code}: {e}")
+                    break
+                bought += 1
+            budget -= bought
+            purchased[area_code] = bought
+        
+        self.configure_pending()
+        return purchased
+    
+    def purchase(self, area_code: Optional[str] = None, business=None) -> VapiPhoneNumber:
+        result = self.client.buy_phone_number(area_code=area_code)
+        try:
+            number = VapiPhoneNumber.objects.create(
+                phone_number_id=result['id'], number=result['number'], area_code=area_code or '',
+                business=business, assigned_at=timezone.now() if business else None,
+            )
+        except Exception:
+            # The number is paid for; without its id it could only be found again through Vapi
+            logger.error(f"Bought phone number {result['id']} ({result.get('number')}) but could not record it")
+            raise
+        metrics.increment('vapi.phone_pool.purchased', area_code=area_code or 'any')
+        return number
+    
+    def claim(self, business, area_code: Optional[str] = None, pk=None) -> Optional[VapiPhoneNumber]:
+        # SKIP LOCKED lets concurrent registrations each take a different free number instead of
+        # queueing behind one row lock; callers keep the claim in their own transaction
+        queryset = VapiPhoneNumber.objects.select_for_update(skip_locked=True)
+        if pk is not None:
+            # A number bought on a registration's behalf is created already held for that business
+            queryset = queryset.filter(Q(business__isnull=True) | Q(business=business), pk=pk)
+        else:
+            queryset = queryset.filter(business__isnull=True)
+            if area_code:
+                queryset = queryset.filter(area_code=area_code)
+        
+        with transaction.atomic():
+            number = queryset.order_by('created_at', 'pk').first()
+            if number is None:
+                metrics.increment('vapi.phone_pool.exhausted', area_code=area_code or 'any')
+                return None
+            number.business = business
+            number.assigned_at = timezone.now()
+            number.configured_at = None
+            number.save(update_fields=['business', 'assigned_at', 'configured_at'])
+        
+        metrics.increment('vapi.phone_pool.claimed', area_code=number.area_code or 'any')
+        return number
+    
+    def configure(self, number_id) -> bool:
+        from .multi_tenant_services import shared_agent_registry
+        
+        number = VapiPhoneNumber.objects.select_related('business').filter(pk=number_id, business__isnull=False).first()
+        if number is None or number.configured_at is not None:
+            return False
+        
+        business = number.business
+        # Points the number at the assistant registration recorded, so Vapi and the configuration agree
+        config = VapiConfiguration.objects.filter(
+            business=business, phone_number_id=number.phone_number_id, is_active=True
+        ).only('assistant_id').first()
+        self.client.update_phone_number(number.phone_number_id, {
+            'assistantId': config.assistant_id if config else shared_agent_registry.get_agent_id(wait=True),
+            'metadata': {
+                'tenant_id': str(business.id),
+                'business_name': business.name,
+                'business_slug': business.slug,
+            },
+        })
+        # Only marks the assignment that was patched, in case the number changed hands meanwhile
+        VapiPhoneNumber.objects.filter(pk=number.pk, business=business).update(configured_at=timezone.now())
+        return True
+    
+    def configure_pending(self, limit: int = 100) -> int:
+        configured = 0
+        pending = VapiPhoneNumber.objects.filter(business__isnull=False, configured_at__isnull=True)
+        for number_id in pending.order_by('assigned_at').values_list('pk', flat=True)[:limit]:
+            try:
+                configured += self.configure(number_id)
+            except Exception as e:
+                logger.error(f"Could not configure phone number {number_id}: {e}")
+        return configured
+
+
+phone_number_pool = PhoneNumberPool()
@@ -1,10 +1,14 @@
-from typing import Dict
+from typing import Dict, Optional
 from django.db import transaction
 from .models import VapiCall
-from .serializers import VapiWebhookSerializer
 from .value_objects import VapiEventType
-from .event_handlers import EventHandlerRegistry
+from .deadlines import Deadline, deadline_scope
+from .event_handlers import event_handler_registry
+from .idempotency import DUPLICATE, FIRST, IN_FLIGHT, webhook_ledger
 from .multi_tenant_services import MetadataExtractor
+from .persistence import call_persistence
+from .tenant_cache import tenant_resolver
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,39 +17,78 @@ logger = logging.getLogger(__name__)
 class WebhookProcessor:
     def __init__(self, business=None):
         self.business = business
-        self.event_registry = EventHandlerRegistry()
+        self.event_registry = event_handler_registry
     
-    def process_webhook(self, webhook_data: Dict) -> Dict:
+    def process_webhook(self, webhook_data: Dict, started: Optional[float] = None) -> Dict:
+        started = started if started is not None else time.monotonic()
         try:
             event_type = VapiEventType(webhook_data.get('message', {}).get('type', ''))
-            
+        except ValueError as e:
+            logger.error(f"Invalid event type: {e}")
+            return {'error': f'Invalid event type: {str(e)}'}
+        
+        fingerprint = webhook_ledger.fingerprint(event_type, webhook_data)
+        claim = webhook_ledger.claim(fingerprint) if fingerprint else FIRST
+        if claim == DUPLICATE:
+            logger.info(f"Dropped duplicate {event_type.value} delivery {fingerprint}")
+            return {'status': 'duplicate', 'event': event_type.value, 'message': 'Event already processed'}
+        if claim == IN_FLIGHT:
+            # Answered as a failure so the sender retries once the first delivery has settled
+            logger.info(f"Deferred {event_type.value} delivery {fingerprint} still being processed")
+            return {'status': 'in_flight', 'event': event_type.value, 'error': 'Event is still being processed'}
+        
+        result = self._process(event_type, webhook_data, started)
+        if fingerprint:
+            # Failed deliveries give up their receipt so Vapi's retry is processed
+            if 'error' in result:
+                webhook_ledger.release(fingerprint)
+            else:
+                webhook_ledger.complete(fingerprint)
+        return result
+    
+    def _process(self, event_type: VapiEventType, webhook_data: Dict, started: float) -> Dict:
+        try:
             if not self.business:
                 self.business = MetadataExtractor.get_business_from_metadata(webhook_data)
                 if not self.business:
                     logger.error("No business found in webhook metadata")
                     return {'error': 'Business not found in metadata'}
             
-            with transaction.atomic():
-                call = self._save_call_data(webhook_data)
-                result = self.event_registry.handle_event(event_type, call, webhook_data)
+            deadline = self._deadline(event_type, started)
+            if deadline and not deadline.checkpoint('tenant_resolution'):
+                # Vapi stops waiting soon; answer now and leave the call row to later events
+                call = VapiCall(call_id=webhook_data.get('message', {}).get('call', {}).get('id', ''), business=self.business)
+                return self._format_response(self.event_registry.degrade_event(event_type, call, webhook_data), call, event_type)
+            
+            with deadline_scope(deadline), transaction.atomic():
+                call = call_persistence.persist(event_type, webhook_data, self.business)
+                if deadline and not deadline.checkpoint('call_persistence'):
+                    result = self.event_registry.degrade_event(event_type, call, webhook_data)
+                else:
+                    result = self.event_registry.handle_event(event_type, call, webhook_data)
                 
                 logger.info(f"Processed {event_type.value} event for call {call.call_id} (business: {self.business.name})")
                 
                 return self._format_response(result, call, event_type)
                 
-        except ValueError as e:
-            logger.error(f"Invalid event type: {e}")
-            return {'error': f'Invalid event type: {str(e)}'}
         except Exception as e:
             logger.error(f"Error processing webhook: {e}")
             return {'error': f'Processing failed: {str(e)}'}
     
+    def _deadline(self, event_type: VapiEventType, started: float) -> Optional[Deadline]:
+        if not event_type.requires_sync_response:
+            return None
+        return Deadline.for_tenant(tenant_resolver.get_by_id(self.business.pk), started=started)
+    
     def _format_response(self, result: Dict, call: VapiCall, event_type: VapiEventType) -> Dict:
         status = result.get('status', 'unknown')
         
         if status == 'function_executed':
             return result.get('functionCall', {})
         
+        elif status == 'tools_executed':
+            return {'results': result['results']}
+        
         elif status == 'assistant_provided':
             if 'assistantId' in result:
                 return {'assistantId': result['assistantId']}
@@ -61,11 +104,3 @@ class WebhookProcessor:
             'event': event_type.value,
             'message': f'Event {event_type.value} processed successfully'
         }
-    
-    def _save_call_data(self, webhook_data: Dict) -> VapiCall:
-        serializer = VapiWebhookSerializer(
-            data=webhook_data,
-            context={'business': self.business}
-        )
-        serializer.is_valid(raise_exception=True)
-        return serializer.save()
@@ -0,0 +1,298 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from apps.core.metrics import metrics
+from .api_client import VapiAPIClient
+from .call_states import LIFECYCLE_FIELDS, call_lifecycle
+from .call_writer import CALL_FIELDS, CallStateWriter
+from .models import VapiCall, VapiCallAnalysis, VapiCallSyncCheckpoint, VapiCallTranscript
+from .multi_tenant_services import MetadataExtractor
+from .optimizations import VapiCacheKeys
+import queue
+import threading
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_FIELDS = ('summary', 'structured_data', 'success_evaluation')
+
+
+def vapi_timestamp(moment: datetime) -> str:
+    # Vapi compares createdAt filters as ISO strings in UTC with millisecond precision
+    return moment.astimezone(dt_timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def call_artifacts(call_data: Dict) -> Tuple[str, List, Dict]:
+    # Listed calls keep transcripts under `artifact`; older payloads had them on the call itself
+    artifact = call_data.get('artifact') or {}
+    transcript = artifact.get('transcript') or call_data.get('transcript') or ''
+    messages = artifact.get('messages') or call_data.get('messages') or []
+    analysis = call_data.get('analysis')
+    if analysis:
+        analysis = {
+            'summary': analysis.get('summary', ''),
+            'structured_data': analysis.get('structuredData', {}),
+            'success_evaluation': str(analysis.get('successEvaluation', '') or ''),
+        }
+    return transcript, messages, analysis or {}
+
+
+class ReconcileWindowError(Exception):
+    pass
+
+
+@dataclass
+class ReconcileStats:
+    windows: int = 0
+    fetched: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    unrouted: int = 0
+    artifacts: int = 0
+    synced_until: Optional[datetime] = None
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# Rebuilds VapiCall rows from Vapi's call listing when webhooks were lost or arrived incomplete.
+# The listing is walked in createdAt windows; windows are fetched concurrently but applied in order,
+# page by page, so the per-org checkpoint only ever covers windows whose calls are all written and
+# memory holds a few pages per window rather than whole windows.
+class CallReconciler:
+    LOCK_TIMEOUT = 3600
+    PAGE_BUFFER = 2
+    
+    def __init__(self, org_id: Optional[str] = None, client: Optional[VapiAPIClient] = None,
+                 page_size: Optional[int] = None, chunk_size: Optional[int] = None,
+                 concurrency: Optional[int] = None, window: Optional[timedelta] = None):
+        self.org_id = org_id or settings.VAPI_ORG_ID
+        self.client = client or VapiAPIClient()
+        self.page_size = page_size or settings.VAPI_RECONCILE_PAGE_SIZE
+        self.chunk_size = chunk_size or settings.VAPI_RECONCILE_CHUNK_SIZE
+        self.concurrency = max(concurrency or settings.VAPI_RECONCILE_CONCURRENCY, 1)
+        self.window = window or timedelta(hours=settings.VAPI_RECONCILE_WINDOW_HOURS)
+        # One upsert statement per chunk, however long the chunk takes to diff
+        self.writer = CallStateWriter(batch_size=self.chunk_size, window_ms=float('inf'))
+        self._fields = {name: VapiCall._meta.get_field(name) for name, _, _ in CALL_FIELDS}
+    
+    def run(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+            max_windows: Optional[int] = None) -> Optional[ReconcileStats]:
+        lock_key = VapiCacheKeys.call_reconcile_lock(self.org_id)
+        token = uuid.uuid4().hex
+        if not cache.add(lock_key, token, self.LOCK_TIMEOUT):
+            logger.info(f"Call reconciliation for org {self.org_id} is already running")
+            return None
+        
+        try:
+            until = until or timezone.now()
+            checkpoint, _ = VapiCallSyncCheckpoint.objects.get_or_create(
+                org_id=self.org_id,
+                defaults={'synced_until': since or until - timedelta(days=settings.VAPI_RECONCILE_LOOKBACK_DAYS)},
+            )
+            # Calls created shortly before the checkpoint may still have been in progress when it was taken
+            start = since or checkpoint.synced_until - timedelta(minutes=settings.VAPI_RECONCILE_OVERLAP_MINUTES)
+            stats = ReconcileStats(synced_until=checkpoint.synced_until)
+            self._sync(self.windows(start, until, max_windows), stats, lock_key)
+            logger.info(f"Reconciled Vapi calls for org {self.org_id}: {stats.as_dict()}")
+            return stats
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+    
+    def windows(self, start: datetime, end: datetime, limit: Optional[int] = None) -> Iterator[Tuple[datetime, datetime]]:
+        count = 0
+        while start < end and (limit is None or count < limit):
+            stop = min(start + self.window, end)
+            yield start, stop
+            start, count = stop, count + 1
+    
+    def fetch_pages(self, start: datetime, end: datetime) -> Iterator[List[Dict]]:
+        lower = {'createdAtGe': vapi_timestamp(start)}
+        upper = {'createdAtLt': vapi_timestamp(end)}
+        seen = set()
+        while True:
+            page = self.client.list_calls(limit=self.page_size, **lower, **upper)
+            fresh = [call for call in page if call['id'] not in seen]
+            seen.update(call['id'] for call in fresh)
+            if fresh:
+                yield fresh
+            if len(page) < self.page_size:
+                return
+            oldest = min(call['createdAt'] for call in page)
+            if fresh:
+                # Pages come newest first; the next one ends at the oldest call seen, inclusive, so calls
+                # sharing that timestamp are not skipped (the repeats are dropped above)
+                upper = {'createdAtLe': oldest}
+                continue
+            if all(call['createdAt'] == oldest for call in page) and self._overfull(oldest):
+                # Moving past `oldest` would skip calls that were never listed, so the window fails and
+                # its checkpoint stays behind it
+                raise ReconcileWindowError(
+                    f"More than {self.page_size} calls created at {oldest}; raise the reconcile page size"
+                )
+            # Nothing new at or after `oldest`, so carry on strictly before it
+            upper = {'createdAtLt': oldest}
+    
+    def _overfull(self, timestamp: str) -> bool:
+        # A full page of already-seen calls at one timestamp is either all of them or only some
+        same_moment = self.client.list_calls(limit=self.page_size + 1, createdAtGe=timestamp, createdAtLe=timestamp)
+        return len(same_moment) > self.page_size
+    
+    def apply(self, calls: List[Dict], stats: ReconcileStats):
+        existing = {
+            row['call_id']: row
+            for row in VapiCall.objects.filter(call_id__in=[call['id'] for call in calls]).values(
+                'id', 'call_id', 'business_id', *self._fields
+            )
+        }
+        
+        written = {}
+        with transaction.atomic():
+            with self.writer.buffered():
+                for call_data in calls:
+                    call = self._diff(call_data, existing.get(call_data['id']), stats)
+                    if call is not None:
+                        written[call_data['id']] = call
+            # The writer has flushed, so new rows carry their database ids
+            pks = {call_id: call.pk for call_id, call in written.items()}
+            pks.update({call_id: row['id'] for call_id, row in existing.items()})
+            stats.artifacts += self._write_artifacts(calls, pks)
+        
+        metrics.increment('vapi.reconcile.calls', value=len(calls), org=self.org_id)
+    
+    def _sync(self, windows: Iterator[Tuple[datetime, datetime]], stats: ReconcileStats, lock_key: str):
+        pending = deque()
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='vapi-reconcile') as executor:
+            try:
+                # At most `concurrency` windows are being fetched, each a few pages ahead of the writes;
+                # the oldest is applied while the rest load
+                for window in windows:
+                    pages = queue.Queue(maxsize=self.PAGE_BUFFER)
+                    pending.append((window, pages, executor.submit(self._produce, window, pages, stop)))
+                    if len(pending) >= self.concurrency:
+                        self._apply_window(*pending.popleft(), stats, lock_key)
+                while pending:
+                    self._apply_window(*pending.popleft(), stats, lock_key)
+            except BaseException:
+                stop.set()
+                for _, _, future in pending:
+                    future.cancel()
+                raise
+    
+    def _produce(self, window: Tuple[datetime, datetime], pages: queue.Queue, stop: threading.Event):
+        try:
+            for page in self.fetch_pages(*window):
+                if not self._put(pages, page, stop):
+                    return
+        except Exception as e:
+            self._put(pages, e, stop)
+            return
+        self._put(pages, None, stop)
+    
+    @staticmethod
+    def _put(pages: queue.Queue, item, stop: threading.Event) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _apply_window(self, window: Tuple[datetime, datetime], pages: queue.Queue, future, stats: ReconcileStats,
+                      lock_key: str):
+        batch, count = [], 0
+        while True:
+            page = pages.get()
+            if page is None:
+                break
+            if isinstance(page, Exception):
+                raise page
+            batch.extend(page)
+            count += len(page)
+            while len(batch) >= self.chunk_size:
+                self.apply(batch[:self.chunk_size], stats)
+                batch = batch[self.chunk_size:]
+            cache.touch(lock_key, self.LOCK_TIMEOUT)
+        if batch:
+            self.apply(batch, stats)
+        
+        # Only moves forward, so an ad-hoc backfill of older history never rewinds the checkpoint
+        VapiCallSyncCheckpoint.objects.filter(org_id=self.org_id, synced_until__lt=window[1]).update(
+            synced_until=window[1], calls_synced=F('calls_synced') + count, updated_at=timezone.now()
+        )
+        stats.windows += 1
+        stats.fetched += count
+        stats.synced_until = max(stats.synced_until, window[1]) if stats.synced_until else window[1]
+        cache.touch(lock_key, self.LOCK_TIMEOUT)
+    
+    def _diff(self, call_data: Dict, row: Optional[Dict], stats: ReconcileStats) -> Optional[VapiCall]:
+        values = {
+            field: self._fields[field].to_python(parse(call_data[key]))
+            for field, key, parse in CALL_FIELDS if key in call_data
+        }
+        
+        if row is None:
+            tenant = MetadataExtractor.get_tenant_from_metadata({'message': {'call': call_data}})
+            if tenant is None:
+                stats.unrouted += 1
+                return None
+            # Inserts carry the lifecycle on the row itself, so no transition query follows
+            call = self.writer.instance({'call_id': call_data['id'], 'business_id': tenant.id, **values})
+            stats.created += 1
+            return self.writer.write(call, set(values) - set(LIFECYCLE_FIELDS))
+        
+        changes = {field: value for field, value in values.items() if row[field] != value}
+        if not call_lifecycle.accepts(row['status'], values.get('status')):
+            for field in LIFECYCLE_FIELDS:
+                changes.pop(field, None)
+        if not changes:
+            stats.unchanged += 1
+            return None
+        
+        fields = set(changes)
+        if fields & set(LIFECYCLE_FIELDS):
+            fields.add('status')
+        stats.updated += 1
+        return self.writer.write(self.writer.instance({**row, **changes}), fields)
+    
+    def _write_artifacts(self, calls: List[Dict], pks: Dict[str, Any]) -> int:
+        transcripts = dict(
+            VapiCallTranscript.objects.filter(call_id__in=pks.values()).values_list('call_id', 'transcript')
+        )
+        analyses = {
+            row[0]: dict(zip(ANALYSIS_FIELDS, row[1:]))
+            for row in VapiCallAnalysis.objects.filter(call_id__in=pks.values()).values_list('call_id', *ANALYSIS_FIELDS)
+        }
+        
+        new_transcripts, new_analyses = [], []
+        for call_data in calls:
+            pk = pks.get(call_data['id'])
+            if pk is None:
+                continue
+            transcript, messages, analysis = call_artifacts(call_data)
+            if transcript and transcripts.get(pk) != transcript:
+                new_transcripts.append(VapiCallTranscript(call_id=pk, transcript=transcript, messages=messages))
+            if analysis and analyses.get(pk) != analysis:
+                new_analyses.append(VapiCallAnalysis(call_id=pk, **analysis))
+        
+        if new_transcripts:
+            VapiCallTranscript.objects.bulk_create(
+                new_transcripts, update_conflicts=True, unique_fields=['call'], update_fields=['transcript', 'messages']
+            )
+        if new_analyses:
+            VapiCallAnalysis.objects.bulk_create(
+                new_analyses, update_conflicts=True, unique_fields=['call'], update_fields=list(ANALYSIS_FIELDS)
+            )
+        return len(new_transcripts) + len(new_analyses)
@@ -1,39 +1,42 @@
+from dataclasses import dataclass
 from typing import Optional
-from django.core.cache import cache
 from django.http import HttpRequest
 from django.conf import settings
-from .value_objects import WebhookSignature
-from .optimizations import cached_method, cache_service, VapiCacheKeys
+from apps.core.cache import LocalLRUCache, get_async_redis_client, get_redis_client
+from apps.core.metrics import metrics
+from .value_objects import TenantSnapshot, WebhookSignature
+from .optimizations import vapi_cache_service, VapiCacheKeys
+from .tenant_cache import tenant_resolver
 import hashlib
 import hmac
-import time
+import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 
+TENANT_HEADER = 'X-Vapi-Tenant-Id'
+
 
 class VapiSecurityService:
     def __init__(self, secret: str):
         self.secret = secret
     
     def validate_webhook_signature(self, request: HttpRequest, body: bytes) -> bool:
-        signature_header = request.headers.get('X-Vapi-Signature')
+        is_valid = self.verify(request.headers.get('X-Vapi-Signature'), body)
+        if not is_valid:
+            logger.warning(f"Invalid webhook signature from {request.META.get('REMOTE_ADDR')}")
+        return is_valid
+    
+    def verify(self, signature_header: Optional[str], body: bytes) -> bool:
         if not signature_header:
-            logger.warning(f"Missing X-Vapi-Signature header from {request.META.get('REMOTE_ADDR')}")
             return False
         
         try:
             signature = WebhookSignature(signature_header)
-            expected_signature = self._generate_signature(body)
-            is_valid = hmac.compare_digest(signature.signature, expected_signature)
-            
-            if not is_valid:
-                logger.warning(f"Invalid webhook signature from {request.META.get('REMOTE_ADDR')}")
-            
-            return is_valid
         except ValueError as e:
             logger.warning(f"Invalid signature format: {e}")
             return False
+        return hmac.compare_digest(signature.signature, self._generate_signature(body))
     
     def _generate_signature(self, body: bytes) -> str:
         return hmac.new(
@@ -58,43 +61,195 @@ class VapiIPWhitelist:
         return ip in cls.VAPI_IPS
 
 
+# Token bucket refilled continuously at `rate` tokens per second up to `burst`. Redis' own clock
+# keeps every app server on the same timeline; the whole check is one EVALSHA round-trip.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = math.ceil((1 - tokens) * 1000 / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return {allowed, retry_after}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    allowed: bool
+    retry_after_ms: int = 0
+
+
 class WebhookRateLimiter:
-    def __init__(self, max_requests: int = 1000, window_seconds: int = 3600):
-        self.max_requests = max_requests
-        self.window_seconds = window_seconds
+    def __init__(self, client=None):
+        self._client = client
+        self._script = None
+    
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_redis_client()
+        return self._client
+    
+    def check(self, tenant: TenantSnapshot) -> RateLimitDecision:
+        if self._script is None:
+            self._script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        try:
+            allowed, retry_after = self._script(keys=[self._key(tenant)], args=self._limits(tenant))
+        except Exception as e:
+            logger.warning(f"Webhook rate limiter unavailable for tenant {tenant.id}: {e}")
+            return RateLimitDecision(True)
+        return self._decide(tenant, allowed, retry_after)
+    
+    async def acheck(self, tenant: TenantSnapshot) -> RateLimitDecision:
+        try:
+            script = get_async_redis_client().register_script(TOKEN_BUCKET_SCRIPT)
+            allowed, retry_after = await script(keys=[self._key(tenant)], args=self._limits(tenant))
+        except Exception as e:
+            logger.warning(f"Webhook rate limiter unavailable for tenant {tenant.id}: {e}")
+            return RateLimitDecision(True)
+        return self._decide(tenant, allowed, retry_after)
+    
+    def _decide(self, tenant: TenantSnapshot, allowed, retry_after) -> RateLimitDecision:
+        metrics.increment('vapi.webhook.rate_limit', outcome='allowed' if allowed else 'limited')
+        if not allowed:
+            logger.warning(f"Webhook rate limit exceeded for tenant {tenant.id}")
+        return RateLimitDecision(bool(allowed), int(retry_after))
+    
+    @staticmethod
+    def _key(tenant: TenantSnapshot) -> str:
+        return VapiCacheKeys.webhook_rate_limit(tenant.id)
+    
+    @staticmethod
+    def _limits(tenant: TenantSnapshot):
+        per_minute = tenant.webhook_rate_per_minute or settings.VAPI_WEBHOOK_RATE_PER_MINUTE
+        burst = tenant.webhook_burst or settings.VAPI_WEBHOOK_RATE_BURST
+        return [per_minute / 60, max(burst, 1)]
+
+
+# Secrets are read once per tenant and kept in process until the tenant's secret version moves on;
+# the version is re-read from the shared cache every few seconds. Versions are random tokens rather
+# than counters, so a flushed or evicted cache starts a new generation instead of reusing an old one.
+class WebhookVerifier:
+    def __init__(self, version_timeout: int = 5, max_size: int = 4096):
+        self._services = LocalLRUCache(max_size=max_size)
+        self._versions = LocalLRUCache(max_size=max_size, timeout=version_timeout)
     
-    def is_allowed(self, identifier: str) -> bool:
-        cache_key = f"vapi:rate_limit:{identifier}"
+    def get(self, tenant_id=None) -> Optional[VapiSecurityService]:
+        key = self._key(tenant_id)
+        version = self._versions.get(key)
+        if version is None:
+            version_key = VapiCacheKeys.webhook_secret_version(key)
+            version = vapi_cache_service.get(version_key)
+            if version is None:
+                version = uuid.uuid4().hex
+                vapi_cache_service.set(version_key, version)
+            self._versions.set(key, version)
         
-        current_data = cache.get(cache_key, {'count': 0, 'reset_time': time.time() + self.window_seconds})
+        entry = self._services.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        return self._store(key, version, self._load_secret(tenant_id))
+    
+    async def aget(self, tenant_id=None) -> Optional[VapiSecurityService]:
+        key = self._key(tenant_id)
+        version = self._versions.get(key)
+        if version is None:
+            version_key = VapiCacheKeys.webhook_secret_version(key)
+            version = await vapi_cache_service.aget(version_key)
+            if version is None:
+                version = uuid.uuid4().hex
+                await vapi_cache_service.aset(version_key, version)
+            self._versions.set(key, version)
         
-        if time.time() > current_data['reset_time']:
-            current_data = {'count': 1, 'reset_time': time.time() + self.window_seconds}
-        else:
-            current_data['count'] += 1
+        entry = self._services.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        return self._store(key, version, await self._aload_secret(tenant_id))
+    
+    def verify(self, body: bytes, signature_header: Optional[str], tenant_id=None) -> bool:
+        return self._check(self.get(tenant_id), body, signature_header, tenant_id)
+    
+    async def averify(self, body: bytes, signature_header: Optional[str], tenant_id=None) -> bool:
+        return self._check(await self.aget(tenant_id), body, signature_header, tenant_id)
+    
+    @staticmethod
+    def header_tenant(request: HttpRequest) -> Optional[uuid.UUID]:
+        # Dedicated assistants name their tenant in a header pushed with the assistant config, so the
+        # plain route knows which secret to check without reading the unverified body
+        value = request.headers.get(TENANT_HEADER)
+        try:
+            return uuid.UUID(value) if value else None
+        except ValueError:
+            return None
+    
+    def invalidate(self, tenant_id):
+        key = self._key(tenant_id)
+        vapi_cache_service.set(VapiCacheKeys.webhook_secret_version(key), uuid.uuid4().hex)
+        self._versions.delete(key)
+        self._services.delete(key)
+    
+    def _check(self, service: Optional[VapiSecurityService], body: bytes, signature_header: Optional[str], tenant_id) -> bool:
+        if service is None:
+            logger.warning(f"No webhook secret configured for tenant {tenant_id or 'shared'}")
+            return settings.DEBUG
         
-        if current_data['count'] > self.max_requests:
-            logger.warning(f"Rate limit exceeded for {identifier}")
-            return False
+        is_valid = service.verify(signature_header, body)
+        metrics.increment('vapi.webhook.signature', outcome='valid' if is_valid else 'invalid')
+        if not is_valid:
+            logger.warning(f"Invalid webhook signature for tenant {tenant_id or 'shared'}")
+        return is_valid
+    
+    def _store(self, key: str, version: str, secret: str) -> Optional[VapiSecurityService]:
+        service = VapiSecurityService(secret) if secret else None
+        self._services.set(key, (version, service))
+        return service
+    
+    def _load_secret(self, tenant_id) -> str:
+        if tenant_id is None:
+            return settings.VAPI_WEBHOOK_SECRET
+        return self._secrets(tenant_id).first() or settings.VAPI_WEBHOOK_SECRET
+    
+    async def _aload_secret(self, tenant_id) -> str:
+        if tenant_id is None:
+            return settings.VAPI_WEBHOOK_SECRET
+        return await self._secrets(tenant_id).afirst() or settings.VAPI_WEBHOOK_SECRET
+    
+    @staticmethod
+    def _secrets(tenant_id):
+        from .models import VapiConfiguration
         
-        cache.set(cache_key, current_data, self.window_seconds)
-        return True
+        return (
+            VapiConfiguration.objects.filter(business_id=tenant_id, is_active=True)
+            .exclude(server_secret='')
+            .values_list('server_secret', flat=True)
+        )
+    
+    @staticmethod
+    def _key(tenant_id) -> str:
+        return str(tenant_id) if tenant_id is not None else 'shared'
 
 
 class WebhookSecurityManager:
     def __init__(self, business):
         self.business = business
-        self.rate_limiter = WebhookRateLimiter()
-    
-    @cached_method(timeout=600, key_func=lambda self: VapiCacheKeys.business_config(self.business.id))
-    def _get_security_service(self) -> Optional[VapiSecurityService]:
-        try:
-            config = self.business.vapi_configurations.filter(is_active=True).first()
-            if config and config.server_secret:
-                return VapiSecurityService(config.server_secret)
-        except Exception as e:
-            logger.error(f"Error getting security service for business {self.business.id}: {e}")
-        return None
+        self.rate_limiter = webhook_rate_limiter
+        self.verifier = webhook_verifier
     
     def validate_request(self, request: HttpRequest, body: bytes) -> bool:
         client_ip = self._get_client_ip(request)
@@ -103,18 +258,18 @@ class WebhookSecurityManager:
             logger.warning(f"Request from non-whitelisted IP: {client_ip}")
             return False
         
-        if not self.rate_limiter.is_allowed(f"{self.business.id}:{client_ip}"):
+        tenant = tenant_resolver.get_by_id(self.business.id)
+        if tenant and not self.rate_limiter.check(tenant).allowed:
             return False
         
-        security_service = self._get_security_service()
-        if security_service:
-            return security_service.validate_webhook_signature(request, body)
-        
-        logger.warning(f"No security configuration for business {self.business.id}")
-        return settings.DEBUG
+        return self.verifier.verify(body, request.headers.get('X-Vapi-Signature'), self.business.id)
     
     def _get_client_ip(self, request: HttpRequest) -> str:
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
             return x_forwarded_for.split(',')[0].strip()
         return request.META.get('REMOTE_ADDR', 'unknown')
+
+
+webhook_rate_limiter = WebhookRateLimiter()
+webhook_verifier = WebhookVerifier()
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import VapiConfiguration, VapiCall, VapiCallTranscript, VapiCallAnalysis, VapiAppointmentIntegration
+from .call_writer import call_state_writer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -62,86 +63,30 @@ class VapiWebhookSerializer(serializers.Serializer):
             raise serializers.ValidationError("Call data is required")
         
         try:
-            call, created = VapiCall.objects.get_or_create(
-                call_id=call_data['id'],
-                defaults={
-                    'business': business,
-                    'org_id': call_data.get('orgId', ''),
-                    'type': call_data.get('type', ''),
-                    'status': call_data.get('status', ''),
-                    'ended_reason': call_data.get('endedReason', ''),
-                    'started_at': self._parse_datetime(call_data.get('startedAt')),
-                    'ended_at': self._parse_datetime(call_data.get('endedAt')),
-                    'cost': call_data.get('cost'),
-                    'cost_breakdown': call_data.get('costBreakdown', {}),
-                    'phone_number': call_data.get('phoneNumber', ''),
-                    'customer_number': call_data.get('customer', {}).get('number', ''),
-                    'assistant_id': call_data.get('assistantId', ''),
-                    'squad_id': call_data.get('squadId', ''),
-                    'phone_call_provider': call_data.get('phoneCallProvider', ''),
-                    'phone_call_transport': call_data.get('phoneCallTransport', ''),
-                }
-            )
-            
-            if not created:
-                self._update_call_fields(call, call_data)
+            # Single INSERT ... ON CONFLICT round-trip; concurrent events for a new call no longer race
+            call = call_state_writer.upsert(call_data, business, pk=self.context.get('call_pk'))
             
-            self._update_transcript(call, call_data)
-            self._update_analysis(call, call_data)
-            
-            if created:
-                logger.info(f"Created new call: {call.call_id}")
-            else:
-                logger.info(f"Updated existing call: {call.call_id}")
+            if self.context.get('save_artifacts', True):
+                self._update_transcript(call, message_data)
+                self._update_analysis(call, message_data)
             
+            logger.info(f"Upserted call: {call.call_id}")
             return call
             
         except Exception as e:
             logger.error(f"Error creating/updating call {call_data.get('id')}: {e}")
             raise serializers.ValidationError(f"Error processing call data: {str(e)}")
     
-    def _parse_datetime(self, dt_str):
-        if not dt_str:
-            return None
-        try:
-            from django.utils.dateparse import parse_datetime
-            return parse_datetime(dt_str)
-        except Exception:
-            return None
-    
-    def _update_call_fields(self, call, call_data):
-        update_fields = []
+    def _update_transcript(self, call, message_data):
+        from .transcripts import transcript_segments
         
-        for field, key in [
-            ('status', 'status'),
-            ('ended_reason', 'endedReason'),
-            ('cost', 'cost'),
-            ('ended_at', 'endedAt'),
-        ]:
-            if key in call_data:
-                value = call_data[key]
-                if field == 'ended_at':
-                    value = self._parse_datetime(value)
-                if getattr(call, field) != value:
-                    setattr(call, field, value)
-                    update_fields.append(field)
-        
-        if update_fields:
-            call.save(update_fields=update_fields)
-    
-    def _update_transcript(self, call, call_data):
-        if call_data.get('transcript'):
-            VapiCallTranscript.objects.update_or_create(
-                call=call,
-                defaults={
-                    'transcript': call_data['transcript'],
-                    'messages': call_data.get('messages', []),
-                }
-            )
+        # end-of-call-report carries the artifacts on the message; older payloads nested them in the call
+        source = message_data if message_data.get('transcript') else message_data.get('call', {})
+        transcript_segments.compact(call, source.get('transcript', ''), source.get('messages', []))
     
-    def _update_analysis(self, call, call_data):
-        if call_data.get('analysis'):
-            analysis_data = call_data['analysis']
+    def _update_analysis(self, call, message_data):
+        analysis_data = message_data.get('analysis') or message_data.get('call', {}).get('analysis')
+        if analysis_data:
             VapiCallAnalysis.objects.update_or_create(
                 call=call,
                 defaults={
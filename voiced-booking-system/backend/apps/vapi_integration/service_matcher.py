@@ -0,0 +1,243 @@
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from django.conf import settings
+from apps.core.cache import LocalLRUCache
+from .optimizations import vapi_cache_service, VapiCacheKeys
+from .value_objects import ServiceMatch
+import re
+import unicodedata
+import logging
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = frozenset({
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los', 'para', 'por', 'un', 'una', 'y',
+    'an', 'and', 'for', 'of', 'the', 'with',
+})
+
+SYNONYMS = {
+    'pelo': 'cabello',
+    'hair': 'cabello',
+    'haircut': 'corte cabello',
+    'cut': 'corte',
+    'beard': 'barba',
+    'tinte': 'color',
+    'coloracion': 'color',
+    'colour': 'color',
+    'manicure': 'manicura',
+    'pedicure': 'pedicura',
+    'nail': 'una',
+    'massage': 'masaje',
+    'cleaning': 'limpieza',
+    'waxing': 'depilacion',
+}
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+_WORD = re.compile(r'\w+')
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return ' '.join(_NON_ALNUM.sub(' ', text).split())
+
+
+def words(text: str) -> Tuple[str, ...]:
+    result = []
+    # Stopwords are checked before accent folding so "uña" is not mistaken for "una"
+    for word in _WORD.findall((text or '').lower()):
+        if word in STOPWORDS:
+            continue
+        result.extend(_singular(token) for token in normalize(word).split())
+    return tuple(result)
+
+
+def trigrams(tokens: Iterable[str]) -> FrozenSet[str]:
+    grams = set()
+    for token in tokens:
+        padded = f" {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def edit_distance(left: str, right: str, limit: int) -> int:
+    if abs(len(left) - len(right)) > limit:
+        return limit + 1
+    
+    previous_row = None
+    row = list(range(len(right) + 1))
+    for i, left_char in enumerate(left, 1):
+        before, previous_row, row = previous_row, row, [i] + [0] * len(right)
+        for j, right_char in enumerate(right, 1):
+            cost = 0 if left_char == right_char else 1
+            row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if i > 1 and j > 1 and left_char == right[j - 2] and left[i - 2] == right_char:
+                row[j] = min(row[j], before[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+    return row[-1]
+
+
+def _singular(token: str) -> str:
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+class ServiceMatcher:
+    MIN_CONFIDENCE = 0.45
+    TYPO_PENALTY = 0.15
+    
+    def __init__(self, services: Iterable[Dict[str, Any]], synonyms: Optional[Dict[str, str]] = None):
+        self.synonyms = synonyms if synonyms is not None else {**SYNONYMS, **getattr(settings, 'VAPI_SERVICE_SYNONYMS', {})}
+        self._entries = []
+        self._by_name = {}
+        self._token_index = {}
+        self._trigram_index = {}
+        self._vocabulary = set(self.synonyms)
+        
+        for service in services:
+            service_words = words(service['name'])
+            tokens = self._expand(service_words)
+            entry = (service, normalize(service['name']), frozenset(tokens), len(tokens), trigrams(tokens))
+            position = len(self._entries)
+            self._entries.append(entry)
+            self._by_name.setdefault(entry[1], position)
+            self._vocabulary.update(service_words)
+            for token in tokens:
+                self._token_index.setdefault(token, set()).add(position)
+            for gram in entry[4]:
+                self._trigram_index.setdefault(gram, set()).add(position)
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def match(self, query: str) -> Optional[ServiceMatch]:
+        matches = self.rank(query, limit=1)
+        return matches[0] if matches else None
+    
+    def rank(self, query: str, limit: int = 3) -> List[ServiceMatch]:
+        normalized = normalize(query)
+        if not normalized:
+            return []
+        
+        exact = self._by_name.get(normalized)
+        if exact is not None:
+            return [ServiceMatch(service=self._entries[exact][0], confidence=1.0)]
+        
+        weighted_tokens = self._query_tokens(words(query))
+        if not weighted_tokens:
+            return []
+        
+        query_trigrams = trigrams(token for token, _ in weighted_tokens)
+        scored = []
+        for position in self._candidates(weighted_tokens, query_trigrams):
+            score = self._score(weighted_tokens, query_trigrams, self._entries[position])
+            if score >= self.MIN_CONFIDENCE:
+                scored.append((score, position))
+        
+        # Ties go to the shortest name: "corte" should pick "Corte" over "Corte y peinado"
+        scored.sort(key=lambda item: (-item[0], self._entries[item[1]][3], item[1]))
+        return [
+            ServiceMatch(service=self._entries[position][0], confidence=round(score, 3))
+            for score, position in scored[:limit]
+        ]
+    
+    def _expand(self, service_words: Iterable[str]) -> Tuple[str, ...]:
+        tokens = []
+        for word in service_words:
+            tokens.extend(self.synonyms.get(word, word).split())
+        return tuple(tokens)
+    
+    def _query_tokens(self, query_words: Iterable[str]) -> List[Tuple[str, float]]:
+        weighted = []
+        for word in query_words:
+            weight = 1.0
+            if word not in self._vocabulary:
+                word, distance = self._correct(word)
+                weight -= self.TYPO_PENALTY * distance
+            weighted.extend((token, weight) for token in self._expand([word]))
+        return weighted
+    
+    def _correct(self, word: str) -> Tuple[str, int]:
+        limit = 0 if len(word) < 4 else 1 if len(word) < 7 else 2
+        best, best_distance = word, limit + 1
+        for candidate in self._vocabulary:
+            distance = edit_distance(word, candidate, limit)
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+        return (best, best_distance) if best_distance <= limit else (word, 0)
+    
+    def _candidates(self, weighted_tokens: List[Tuple[str, float]], query_trigrams: FrozenSet[str]) -> set:
+        candidates = set()
+        for token, _ in weighted_tokens:
+            candidates.update(self._token_index.get(token, ()))
+        for gram in query_trigrams:
+            candidates.update(self._trigram_index.get(gram, ()))
+        return candidates
+    
+    def _score(self, weighted_tokens: List[Tuple[str, float]], query_trigrams: FrozenSet[str], entry) -> float:
+        _, _, tokens, token_count, entry_trigrams = entry
+        overlap = sum(weight for token, weight in weighted_tokens if token in tokens)
+        if not overlap:
+            return 0.0
+        
+        precision = overlap / len(weighted_tokens)
+        recall = min(overlap / token_count, 1.0)
+        token_score = 2 * precision * recall / (precision + recall)
+        
+        shared = len(query_trigrams & entry_trigrams)
+        trigram_score = 2 * shared / (len(query_trigrams) + len(entry_trigrams))
+        return 0.7 * token_score + 0.3 * trigram_score
+
+
+class ServiceMatcherRegistry:
+    SERVICE_FIELDS = ('id', 'business_id', 'name', 'duration')
+    
+    def __init__(self, version_timeout: int = 5, max_size: int = 1024):
+        self._matchers = LocalLRUCache(max_size=max_size)
+        self._versions = LocalLRUCache(max_size=max_size, timeout=version_timeout)
+    
+    def match(self, business_id, service_name: str) -> Optional[ServiceMatch]:
+        if not service_name:
+            return None
+        
+        match = self.get_matcher(business_id).match(service_name)
+        if match is None:
+            logger.info(f"No service match for '{service_name}' in business {business_id}")
+        return match
+    
+    def get_matcher(self, business_id) -> ServiceMatcher:
+        key = str(business_id)
+        version = self._catalog_version(key)
+        entry = self._matchers.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        
+        matcher = ServiceMatcher(self._load_services(business_id))
+        self._matchers.set(key, (version, matcher))
+        return matcher
+    
+    def invalidate(self, business_id):
+        key = str(business_id)
+        vapi_cache_service.incr(VapiCacheKeys.service_catalog_version(key))
+        self._versions.delete(key)
+        self._matchers.delete(key)
+    
+    def _catalog_version(self, key: str) -> int:
+        version = self._versions.get(key)
+        if version is None:
+            version = vapi_cache_service.get(VapiCacheKeys.service_catalog_version(key)) or 0
+            self._versions.set(key, version)
+        return version
+    
+    def _load_services(self, business_id) -> List[Dict[str, Any]]:
+        from apps.services.models import Service
+        
+        return list(
+            Service.objects.filter(business_id=business_id).active()
+            .order_by('order', 'name')
+            .values(*self.SERVICE_FIELDS)
+        )
+
+
+service_matcher_registry = ServiceMatcherRegistry()
@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .service_matcher import service_matcher_registry
+from .tenant_cache import tenant_resolver
+
+
+@receiver([post_save, post_delete], sender='services.Service')
+def invalidate_service_matcher(sender, instance, **kwargs):
+    # Bumping the version before commit would let another worker cache the old catalog under the new version
+    business_id = instance.business_id
+    transaction.on_commit(lambda: service_matcher_registry.invalidate(business_id))
+
+
+@receiver([post_save, post_delete], sender='payments.Subscription')
+def invalidate_tenant_plan(sender, instance, **kwargs):
+    # Webhook rate limits come from the plan and are cached on the tenant snapshot
+    business_id = instance.business_id
+    transaction.on_commit(lambda: tenant_resolver.invalidate(business_id))
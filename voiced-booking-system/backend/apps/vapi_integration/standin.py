@@ -0,0 +1,322 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FaultProfile:
+    latency_ms: float = 0
+    jitter_ms: float = 0
+    error_rate: float = 0.0
+    error_status: int = 500
+    rate_limit_per_second: Optional[float] = None
+    rate_limit_burst: int = 10
+    seed: Optional[int] = None
+
+
+def _now() -> str:
+    return datetime.now(dt_timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+# In-memory Vapi resources: just enough of the real API's behaviour for the client,
+# tenant registration and the management commands to run offline
+class VapiStandInState:
+    def __init__(self, org_id: str = 'standin-org'):
+        self.org_id = org_id
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.assistants: Dict[str, Dict] = {}
+            self.calls: Dict[str, Dict] = {}
+            self.phone_numbers: Dict[str, Dict] = {}
+            self._next_number = 600000000
+    
+    def create_assistant(self, config: Dict) -> Dict:
+        return self._create(self.assistants, config)
+    
+    def update_assistant(self, assistant_id: str, config: Dict) -> Optional[Dict]:
+        return self._update(self.assistants, assistant_id, config)
+    
+    def delete_assistant(self, assistant_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self.assistants.pop(assistant_id, None)
+    
+    def create_call(self, payload: Dict) -> Dict:
+        return self._create(self.calls, {'type': 'outboundPhoneCall', 'status': 'queued', **payload})
+    
+    def add_call(self, call: Dict) -> Dict:
+        # Seeds calls that happened "elsewhere", e.g. inbound calls whose webhooks were lost
+        call = {'id': str(uuid.uuid4()), 'orgId': self.org_id, 'createdAt': _now(), **call}
+        call.setdefault('updatedAt', call['createdAt'])
+        with self._lock:
+            self.calls[call['id']] = call
+        return call
+    
+    def list_calls(self, params: Dict[str, str]) -> List[Dict]:
+        with self._lock:
+            calls = list(self.calls.values())
+        for param, compare in (
+            ('createdAtGt', lambda value, bound: value > bound),
+            ('createdAtGe', lambda value, bound: value >= bound),
+            ('createdAtLt', lambda value, bound: value < bound),
+            ('createdAtLe', lambda value, bound: value <= bound),
+        ):
+            if params.get(param):
+                calls = [call for call in calls if compare(call['createdAt'], params[param])]
+        for field in ('assistantId', 'phoneNumberId'):
+            if params.get(field):
+                calls = [call for call in calls if call.get(field) == params[field]]
+        
+        # Like Vapi, newest first and capped by `limit`
+        calls.sort(key=lambda call: call['createdAt'], reverse=True)
+        return calls[:int(params.get('limit') or 100)]
+    
+    def buy_phone_number(self, payload: Dict) -> Dict:
+        with self._lock:
+            self._next_number += 1
+            serial = self._next_number
+        area_code = payload.get('areaCode') or '34'
+        return self._create(self.phone_numbers, {
+            'provider': 'vapi',
+            'number': f'+{area_code}{serial}',
+            'status': 'active',
+            **payload,
+        })
+    
+    def update_phone_number(self, phone_number_id: str, config: Dict) -> Optional[Dict]:
+        return self._update(self.phone_numbers, phone_number_id, config)
+    
+    def _create(self, resources: Dict[str, Dict], fields: Dict) -> Dict:
+        created = _now()
+        resource = {**fields, 'id': str(uuid.uuid4()), 'orgId': self.org_id, 'createdAt': created, 'updatedAt': created}
+        with self._lock:
+            resources[resource['id']] = resource
+        return resource
+    
+    def _update(self, resources: Dict[str, Dict], resource_id: str, fields: Dict) -> Optional[Dict]:
+        with self._lock:
+            resource = resources.get(resource_id)
+            if resource is None:
+                return None
+            resource.update({**fields, 'id': resource_id, 'updatedAt': _now()})
+            return dict(resource)
+
+
+class FaultInjector:
+    def __init__(self, profile: FaultProfile):
+        self.profile = profile
+        self._random = random.Random(profile.seed)
+        self._lock = threading.Lock()
+        self._tokens = float(profile.rate_limit_burst)
+        self._refilled = time.monotonic()
+    
+    def delay(self) -> float:
+        with self._lock:
+            jitter = self._random.uniform(-self.profile.jitter_ms, self.profile.jitter_ms) if self.profile.jitter_ms else 0
+        return max(self.profile.latency_ms + jitter, 0) / 1000
+    
+    def failure(self) -> Optional[Tuple[int, Dict[str, str]]]:
+        retry_after = self._throttle()
+        if retry_after is not None:
+            return 429, {'Retry-After': str(retry_after)}
+        with self._lock:
+            failed = self.profile.error_rate and self._random.random() < self.profile.error_rate
+        return (self.profile.error_status, {}) if failed else None
+    
+    def _throttle(self) -> Optional[int]:
+        rate = self.profile.rate_limit_per_second
+        if not rate:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.profile.rate_limit_burst, self._tokens + (now - self._refilled) * rate)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return max(1, math.ceil((1 - self._tokens) / rate))
+
+
+ROUTES = [
+    ('POST', r'/assistant', 'create_assistant'),
+    ('GET', r'/assistant', 'list_assistants'),
+    ('GET', r'/assistant/(?P<id>[^/]+)', 'get_assistant'),
+    ('PATCH', r'/assistant/(?P<id>[^/]+)', 'update_assistant'),
+    ('DELETE', r'/assistant/(?P<id>[^/]+)', 'delete_assistant'),
+    ('POST', r'/call/phone', 'create_call'),
+    ('GET', r'/call', 'list_calls'),
+    ('GET', r'/call/(?P<id>[^/]+)', 'get_call'),
+    ('POST', r'/phone-number/buy', 'buy_phone_number'),
+    ('GET', r'/phone-number', 'list_phone_numbers'),
+    ('GET', r'/phone-number/(?P<id>[^/]+)', 'get_phone_number'),
+    ('PATCH', r'/phone-number/(?P<id>[^/]+)', 'update_phone_number'),
+]
+_COMPILED_ROUTES = [(method, re.compile(f'^{pattern}/?$'), name) for method, pattern, name in ROUTES]
+
+
+class VapiStandInHandler(BaseHTTPRequestHandler):
+    server_version = 'VapiStandIn/1.0'
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without TCP_NODELAY keep-alive clients stall on delayed ACKs
+    disable_nagle_algorithm = True
+    
+    def do_GET(self):
+        self._dispatch('GET')
+    
+    def do_POST(self):
+        self._dispatch('POST')
+    
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+    
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+    
+    def log_message(self, format, *args):
+        logger.debug(f"Vapi stand-in: {format % args}")
+    
+    def _dispatch(self, method: str):
+        standin = self.server.standin
+        url = urlsplit(self.path)
+        body = self._read_body()
+        standin.record(method, url.path)
+        
+        time.sleep(standin.faults.delay())
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            return self._respond(401, {'message': 'Missing API key'})
+        
+        failure = standin.faults.failure()
+        if failure is not None:
+            status, headers = failure
+            return self._respond(status, {'message': 'Injected failure'}, headers)
+        
+        for route_method, pattern, name in _COMPILED_ROUTES:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                status, payload = getattr(self, f'_{name}')(standin.state, body, params, **match.groupdict())
+                return self._respond(status, payload)
+        return self._respond(404, {'message': f'Cannot {method} {url.path}'})
+    
+    def _read_body(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+    
+    def _respond(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Clients that gave up (e.g. a read timeout under injected latency) are expected here
+            logger.debug(f"Vapi stand-in client went away before {self.path} was answered")
+    
+    @staticmethod
+    def _found(resource: Optional[Dict]) -> Tuple[int, Dict]:
+        return (200, resource) if resource is not None else (404, {'message': 'Not Found'})
+    
+    def _create_assistant(self, state, body, params):
+        return 201, state.create_assistant(body)
+    
+    def _list_assistants(self, state, body, params):
+        return 200, list(state.assistants.values())[:int(params.get('limit') or 100)]
+    
+    def _get_assistant(self, state, body, params, id):
+        return self._found(state.assistants.get(id))
+    
+    def _update_assistant(self, state, body, params, id):
+        return self._found(state.update_assistant(id, body))
+    
+    def _delete_assistant(self, state, body, params, id):
+        return self._found(state.delete_assistant(id))
+    
+    def _create_call(self, state, body, params):
+        return 201, state.create_call(body)
+    
+    def _list_calls(self, state, body, params):
+        return 200, state.list_calls(params)
+    
+    def _get_call(self, state, body, params, id):
+        return self._found(state.calls.get(id))
+    
+    def _buy_phone_number(self, state, body, params):
+        return 201, state.buy_phone_number(body)
+    
+    def _list_phone_numbers(self, state, body, params):
+        return 200, list(state.phone_numbers.values())
+    
+    def _get_phone_number(self, state, body, params, id):
+        return self._found(state.phone_numbers.get(id))
+    
+    def _update_phone_number(self, state, body, params, id):
+        return self._found(state.update_phone_number(id, body))
+
+
+# Point VAPI_BASE_URL at `url` to exercise the API client, tenant provisioning and the
+# management commands offline, with injected latency, errors and rate limiting
+class VapiStandIn:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, faults: Optional[FaultProfile] = None):
+        self.state = VapiStandInState()
+        self.faults = FaultInjector(faults or FaultProfile())
+        self.requests: List[Tuple[str, str]] = []
+        self._requests_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), VapiStandInHandler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self._thread = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+    
+    def record(self, method: str, path: str):
+        with self._requests_lock:
+            self.requests.append((method, path))
+    
+    def set_faults(self, faults: FaultProfile):
+        self.faults = FaultInjector(faults)
+    
+    def serve_forever(self, poll_interval: float = 0.05):
+        self._server.serve_forever(poll_interval)
+    
+    def start(self) -> 'VapiStandIn':
+        self._thread = threading.Thread(target=self.serve_forever, name='vapi-standin', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def __enter__(self) -> 'VapiStandIn':
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
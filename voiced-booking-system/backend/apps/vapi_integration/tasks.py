@@ -1,4 +1,5 @@
 from celery import shared_task
+from celery.signals import worker_ready
 from django.utils import timezone
 from django.db import models
 from django.db.models import Sum, Count, Q
@@ -127,6 +128,64 @@ def register_tenant_async(business_id: int, area_code: str = None):
         return {'success': False, 'error': str(e)}
 
 
+@shared_task
+def refresh_shared_agent():
+    from .multi_tenant_services import shared_agent_registry
+    
+    try:
+        agent_id = shared_agent_registry.refresh()
+        logger.info(f"Shared agent validated: {agent_id}")
+        return agent_id
+    except Exception as e:
+        logger.error(f"Shared agent refresh failed: {e}")
+        return None
+
+
+@shared_task
+def reconcile_vapi_calls(org_id: str = None):
+    from .reconciliation import CallReconciler
+    
+    try:
+        stats = CallReconciler(org_id=org_id).run()
+        if stats is None:
+            return "Call reconciliation already running"
+        return stats.as_dict()
+    except Exception as e:
+        # The checkpoint only covers fully applied windows, so the next run resumes where this one stopped
+        logger.error(f"Call reconciliation failed: {e}")
+        return {'error': str(e)}
+
+
+@shared_task
+def replenish_phone_number_pool():
+    from .phone_numbers import phone_number_pool
+    
+    try:
+        purchased = phone_number_pool.replenish()
+        logger.info(f"Phone number pool replenished: {purchased}")
+        return purchased
+    except Exception as e:
+        logger.error(f"Phone number pool replenishment failed: {e}")
+        return {'error': str(e)}
+
+
+@shared_task
+def configure_phone_number(number_id: int):
+    from .phone_numbers import phone_number_pool
+    
+    try:
+        return phone_number_pool.configure(number_id)
+    except Exception as e:
+        # Left unconfigured; the next pool replenishment retries it
+        logger.error(f"Phone number {number_id} configuration failed: {e}")
+        return False
+
+
+@worker_ready.connect
+def validate_shared_agent_on_boot(**kwargs):
+    refresh_shared_agent.delay()
+
+
 @shared_task
 def calculate_daily_usage_metrics(date_str: str = None):
     from datetime import date, datetime
@@ -0,0 +1,254 @@
+from typing import Dict, Optional
+import uuid
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from apps.core.cache import LocalLRUCache
+from apps.core.utils import instance_from_values
+from .optimizations import vapi_cache_service, VapiCacheKeys, VapiDataProcessor
+from .value_objects import TenantSnapshot
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TenantResolver:
+    BUSINESS_FIELDS = (
+        'id', 'slug', 'name', 'timezone', 'locale', 'currency', 'is_active',
+        'allow_voice_booking', 'require_approval', 'subscription_status',
+    )
+    CONFIG_FIELDS = ('webhook_timeout', 'max_duration_seconds', 'language')
+    PLAN_FIELDS = ('plan__max_webhooks_per_minute', 'plan__webhook_burst')
+    LIVE_SUBSCRIPTION_STATUSES = ('trialing', 'active', 'past_due')
+    
+    def __init__(self, local_timeout: int = 30, shared_timeout: int = 3600, max_size: int = 4096):
+        self.shared_timeout = shared_timeout
+        self._local = LocalLRUCache(max_size=max_size, timeout=local_timeout)
+    
+    def get_by_id(self, tenant_id) -> Optional[TenantSnapshot]:
+        key = VapiCacheKeys.tenant(tenant_id)
+        snapshot = self._local.get(key)
+        if snapshot is not None:
+            return snapshot
+        
+        snapshot = vapi_cache_service.get(key)
+        if snapshot is None:
+            snapshot = self._load(id=tenant_id)
+            if snapshot is None:
+                return None
+            vapi_cache_service.set(key, snapshot, self.shared_timeout)
+        
+        self._local.set(key, snapshot)
+        return snapshot
+    
+    async def aget_by_id(self, tenant_id) -> Optional[TenantSnapshot]:
+        key = VapiCacheKeys.tenant(tenant_id)
+        snapshot = self._local.get(key)
+        if snapshot is not None:
+            return snapshot
+        
+        snapshot = await vapi_cache_service.aget(key)
+        if snapshot is None:
+            snapshot = await self._aload(id=tenant_id)
+            if snapshot is None:
+                return None
+            await vapi_cache_service.aset(key, snapshot, self.shared_timeout)
+        
+        self._local.set(key, snapshot)
+        return snapshot
+    
+    def get_by_slug(self, slug: str) -> Optional[TenantSnapshot]:
+        if not slug:
+            return None
+        
+        key = VapiCacheKeys.tenant_slug(slug)
+        tenant_id = self._local.get(key) or vapi_cache_service.get(key)
+        if tenant_id:
+            snapshot = self.get_by_id(tenant_id)
+            if snapshot and snapshot.slug == slug:
+                self._local.set(key, tenant_id)
+                return snapshot
+        
+        snapshot = self._load(slug=slug)
+        if snapshot is None:
+            return None
+        
+        vapi_cache_service.set(key, snapshot.id, self.shared_timeout)
+        vapi_cache_service.set(VapiCacheKeys.tenant(snapshot.id), snapshot, self.shared_timeout)
+        self._local.set(key, snapshot.id)
+        self._local.set(VapiCacheKeys.tenant(snapshot.id), snapshot)
+        return snapshot
+    
+    def invalidate(self, business_id, slug: Optional[str] = None):
+        keys = [VapiCacheKeys.tenant(business_id)]
+        if slug:
+            keys.append(VapiCacheKeys.tenant_slug(slug))
+        
+        for key in keys:
+            self._local.delete(key)
+            vapi_cache_service.delete(key)
+    
+    def to_business(self, snapshot: TenantSnapshot):
+        from apps.businesses.models import Business
+        
+        loaded = {**{field: getattr(snapshot, field) for field in self.BUSINESS_FIELDS}, 'id': uuid.UUID(snapshot.id)}
+        return instance_from_values(Business, loaded)
+    
+    def _load(self, **lookup) -> Optional[TenantSnapshot]:
+        from apps.businesses.models import Business
+        from .models import VapiConfiguration
+        
+        try:
+            row = Business.objects.filter(**lookup).values(*self.BUSINESS_FIELDS).first()
+        except (ValueError, ValidationError):
+            return None
+        if not row:
+            return None
+        
+        config = VapiConfiguration.objects.filter(
+            business_id=row['id'], is_active=True
+        ).values(*self.CONFIG_FIELDS).first()
+        plan = self._plans(row['id']).first()
+        return self._snapshot(row, config, plan)
+    
+    async def _aload(self, **lookup) -> Optional[TenantSnapshot]:
+        from apps.businesses.models import Business
+        from .models import VapiConfiguration
+        
+        try:
+            row = await Business.objects.filter(**lookup).values(*self.BUSINESS_FIELDS).afirst()
+        except (ValueError, ValidationError):
+            return None
+        if not row:
+            return None
+        
+        config = await VapiConfiguration.objects.filter(
+            business_id=row['id'], is_active=True
+        ).values(*self.CONFIG_FIELDS).afirst()
+        plan = await self._plans(row['id']).afirst()
+        return self._snapshot(row, config, plan)
+    
+    def _plans(self, business_id):
+        from apps.payments.models import Subscription
+        
+        return Subscription.objects.filter(
+            business_id=business_id, status__in=self.LIVE_SUBSCRIPTION_STATUSES, deleted_at__isnull=True
+        ).order_by('-current_period_end').values(*self.PLAN_FIELDS)
+    
+    @staticmethod
+    def _snapshot(row: Dict, config: Optional[Dict], plan: Optional[Dict]) -> TenantSnapshot:
+        config = config or {}
+        plan = plan or {}
+        return TenantSnapshot(
+            **{**row, 'id': str(row['id'])},
+            webhook_timeout=config.get('webhook_timeout'),
+            max_duration_seconds=config.get('max_duration_seconds'),
+            language=config.get('language'),
+            webhook_rate_per_minute=plan.get('plan__max_webhooks_per_minute'),
+            webhook_burst=plan.get('plan__webhook_burst'),
+        )
+
+
+class TenantRoutingTable:
+    LOCAL_KEY = 'table'
+    
+    def __init__(self, local_timeout: int = 30, shared_timeout: int = 86400):
+        self.shared_timeout = shared_timeout
+        self._local = LocalLRUCache(max_size=1, timeout=local_timeout)
+    
+    def resolve(self, phone_number_id: Optional[str] = None, phone_number: Optional[str] = None,
+                assistant_id: Optional[str] = None) -> Optional[str]:
+        return self._lookup(self._get_table(), phone_number_id, phone_number, assistant_id)
+    
+    async def aresolve(self, phone_number_id: Optional[str] = None, phone_number: Optional[str] = None,
+                       assistant_id: Optional[str] = None) -> Optional[str]:
+        table = self._local.get(self.LOCAL_KEY)
+        if table is None:
+            table = await vapi_cache_service.aget(VapiCacheKeys.routing_table())
+            if table is None:
+                table = await self.arebuild()
+            self._local.set(self.LOCAL_KEY, table)
+        return self._lookup(table, phone_number_id, phone_number, assistant_id)
+    
+    def rebuild(self) -> Dict[str, str]:
+        table = self._build(self._rows())
+        vapi_cache_service.set(VapiCacheKeys.routing_table(), table, self.shared_timeout)
+        self._local.set(self.LOCAL_KEY, table)
+        logger.info(f"Rebuilt tenant routing table with {len(table)} routes")
+        return table
+    
+    async def arebuild(self) -> Dict[str, str]:
+        table = self._build([row async for row in self._rows()])
+        await vapi_cache_service.aset(VapiCacheKeys.routing_table(), table, self.shared_timeout)
+        self._local.set(self.LOCAL_KEY, table)
+        logger.info(f"Rebuilt tenant routing table with {len(table)} routes")
+        return table
+    
+    def _rows(self):
+        from .models import VapiConfiguration
+        
+        return VapiConfiguration.objects.filter(is_active=True).values_list(
+            'business_id', 'phone_number_id', 'phone_number', 'assistant_id', 'is_shared_agent'
+        )
+    
+    def _build(self, rows) -> Dict[str, str]:
+        table = {}
+        assistant_owners = {}
+        shared_agents = {settings.VAPI_SHARED_AGENT_ID} - {''}
+        for business_id, phone_number_id, phone_number, assistant_id, is_shared_agent in rows:
+            business_id = str(business_id)
+            for route in (
+                self._route('phone_number_id', phone_number_id),
+                self._route('phone_number', phone_number),
+            ):
+                if route:
+                    table[route] = business_id
+            if is_shared_agent:
+                shared_agents.add(assistant_id)
+            elif assistant_id:
+                assistant_owners.setdefault(assistant_id, set()).add(business_id)
+        
+        # A shared assistant serves every tenant, so only dedicated ones can route; that holds even
+        # while a single tenant sits on the shared agent
+        for assistant_id, owners in assistant_owners.items():
+            if len(owners) == 1 and assistant_id not in shared_agents:
+                table[self._route('assistant_id', assistant_id)] = owners.pop()
+        return table
+    
+    def invalidate(self):
+        self._local.delete(self.LOCAL_KEY)
+        vapi_cache_service.delete(VapiCacheKeys.routing_table())
+    
+    def _get_table(self) -> Dict[str, str]:
+        table = self._local.get(self.LOCAL_KEY)
+        if table is not None:
+            return table
+        
+        table = vapi_cache_service.get(VapiCacheKeys.routing_table())
+        if table is None:
+            return self.rebuild()
+        
+        self._local.set(self.LOCAL_KEY, table)
+        return table
+    
+    def _lookup(self, table: Dict[str, str], phone_number_id: Optional[str], phone_number: Optional[str],
+                assistant_id: Optional[str]) -> Optional[str]:
+        for route in (
+            self._route('phone_number_id', phone_number_id),
+            self._route('phone_number', phone_number),
+            self._route('assistant_id', assistant_id),
+        ):
+            if route and route in table:
+                return table[route]
+        return None
+    
+    @staticmethod
+    def _route(kind: str, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        if kind == 'phone_number':
+            value = VapiDataProcessor.normalize_phone_number(value)
+        return f"{kind}:{value}"
+
+
+tenant_resolver = TenantResolver()
+tenant_routing_table = TenantRoutingTable()
@@ -0,0 +1,98 @@
+"""
+Hash-based assistant sync tests
+"""
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase
+from apps.core.factories import BusinessFactory
+from apps.vapi_integration.api_client import VapiBusinessService
+from apps.vapi_integration.assistant_sync import AssistantSynchronizer
+from apps.vapi_integration.models import VapiConfiguration
+from apps.vapi_integration.tenant_cache import tenant_routing_table
+from apps.vapi_integration.tests_standin import StandInTestMixin
+
+
+class AssistantSynchronizerTests(StandInTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.configs = [self._config(index, is_shared_agent=False) for index in range(4)]
+        self.shared = self._config(4, is_shared_agent=True, assistant_id='shared-agent')
+        self.reports = []
+
+    def _config(self, index, **fields):
+        return VapiConfiguration.objects.create(
+            business=BusinessFactory(),
+            phone_number_id=f'phone-{index}',
+            server_url='https://voiced.local/vapi/webhook/',
+            **fields,
+        )
+
+    def _sync(self, **kwargs):
+        options = {'workers': 2, 'progress': self.reports.append, 'progress_every': 2}
+        return AssistantSynchronizer(**{**options, **kwargs}).run(VapiConfiguration.objects.all())
+
+    def _writes(self):
+        return [request for request in self.standin.requests if request[0] != 'GET']
+
+    def test_only_changed_assistants_are_pushed(self):
+        first = self._sync()
+        self.assertEqual((first.created, first.shared, first.failed), (4, 1, 0))
+        self.assertEqual(len(self.standin.state.assistants), 4)
+
+        self.standin.requests.clear()
+        second = self._sync()
+        self.assertEqual((second.unchanged, second.updated), (4, 0))
+        self.assertEqual(self.standin.requests, [])
+
+        config = VapiConfiguration.objects.get(pk=self.configs[1].pk)
+        config.first_message = 'Bienvenido'
+        config.save()
+        third = self._sync()
+
+        self.assertEqual((third.updated, third.unchanged), (1, 3))
+        self.assertEqual(self._writes(), [('PATCH', f'/assistant/{config.assistant_id}')])
+        self.assertEqual(self.standin.state.assistants[config.assistant_id]['firstMessage'], 'Bienvenido')
+        self.assertEqual(VapiConfiguration.objects.get(pk=self.shared.pk).assistant_id, 'shared-agent')
+
+    def test_missing_assistants_are_recreated(self):
+        self._sync()
+        config = VapiConfiguration.objects.get(pk=self.configs[0].pk)
+        self.standin.state.delete_assistant(config.assistant_id)
+        VapiConfiguration.objects.update(assistant_config_hash='stale')
+
+        stats = self._sync(force=True)
+
+        recreated = VapiConfiguration.objects.get(pk=config.pk)
+        self.assertEqual((stats.created, stats.updated), (1, 3))
+        self.assertNotEqual(recreated.assistant_id, config.assistant_id)
+        self.assertEqual(recreated.assistant_config_hash, VapiBusinessService(recreated.business).assistant_payload(recreated)[1])
+
+    def test_reports_progress(self):
+        stats = self._sync()
+
+        self.assertEqual(stats.done, stats.total)
+        self.assertGreaterEqual(len(self.reports), 3)
+        self.assertEqual(self.reports[-1].done, 5)
+
+    def test_routing_table_is_invalidated_once_per_run(self):
+        with patch.object(tenant_routing_table, 'rebuild') as rebuild, \
+                patch.object(tenant_routing_table, 'invalidate') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                stats = self._sync()
+
+        self.assertEqual(stats.created, 4)
+        invalidate.assert_called_once_with()
+        rebuild.assert_not_called()
+        config = VapiConfiguration.objects.get(pk=self.configs[2].pk)
+        self.assertEqual(tenant_routing_table.resolve(assistant_id=config.assistant_id), str(config.business_id))
+
+    def test_command_reports_businesses_without_a_configuration(self):
+        business = BusinessFactory(name='Sin Configurar')
+        output = StringIO()
+
+        call_command('vapi_management', 'sync-assistants', '--workers', '2', stdout=output)
+
+        self.assertIn(f'Failed to sync assistant for {business.name}: No active VAPI configuration found', output.getvalue())
+        self.assertIn('4 created', output.getvalue())
+        self.assertIn('1 without a configuration', output.getvalue())
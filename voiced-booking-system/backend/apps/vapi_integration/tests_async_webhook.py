@@ -0,0 +1,184 @@
+"""
+Async webhook endpoint tests
+"""
+import hashlib
+import hmac
+import json
+import threading
+import uuid
+from functools import partial
+from unittest.mock import AsyncMock, patch
+from django.core.cache import cache
+from django.db import transaction
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from apps.core.factories import BusinessFactory
+from apps.core.metrics import MetricsRecorder
+from apps.core.testing import LOCMEM_CACHE, vapi_webhook
+from apps.businesses.models import Business
+from apps.vapi_integration.api_client import VapiBusinessService
+from apps.vapi_integration.models import VapiCall, VapiConfiguration
+from apps.vapi_integration.optimizations import VapiCacheKeys
+from apps.vapi_integration.security import TENANT_HEADER, RateLimitDecision, WebhookVerifier
+from apps.vapi_integration.views import VapiWebhookView
+
+
+def _sign(body, secret='test_vapi_webhook_secret'):
+    return hmac.new(secret.encode('utf-8'), body.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+_webhook = partial(vapi_webhook, call_id='call-async-1', status='in-progress')
+
+
+@override_settings(CACHES=LOCMEM_CACHE, VAPI_WEBHOOK_INGESTION_MODE='sync')
+class VapiWebhookViewTests(TransactionTestCase):
+    def setUp(self):
+        self.business = BusinessFactory()
+        self.view = VapiWebhookView.as_view()
+
+    async def _post(self, body, signature=None, tenant_id=None, headers=None):
+        request = RequestFactory().post(
+            '/vapi/webhook/', data=body, content_type='application/json', headers=headers,
+            HTTP_X_VAPI_SIGNATURE=signature if signature is not None else _sign(body),
+        )
+        if tenant_id is None:
+            return await self.view(request)
+        return await self.view(request, tenant_id=tenant_id)
+
+    async def test_processes_events_for_the_resolved_tenant(self):
+        response = await self._post(json.dumps(_webhook('status-update', tenant_id=self.business.id)))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['status'], 'success')
+        call = await VapiCall.objects.aget(call_id='call-async-1')
+        self.assertEqual(call.business_id, self.business.id)
+
+    async def test_rejects_malformed_payloads_and_unknown_tenants(self):
+        self.assertEqual((await self._post('{not json')).status_code, 400)
+
+        response = await self._post(json.dumps(_webhook('status-update', tenant_id=uuid.uuid4())))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['error'], 'Business not found in metadata')
+
+    @patch('apps.vapi_integration.views.webhook_rate_limiter.acheck', new_callable=AsyncMock)
+    async def test_rate_limited_tenants_get_429(self, acheck):
+        acheck.return_value = RateLimitDecision(False, retry_after_ms=1500)
+
+        response = await self._post(json.dumps(_webhook('status-update', tenant_id=self.business.id)))
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(acheck.call_args.args[0].id, str(self.business.id))
+        self.assertFalse(await VapiCall.objects.aexists())
+
+    @patch('apps.vapi_integration.views._process_webhook')
+    async def test_in_flight_duplicates_ask_for_a_retry(self, process):
+        process.return_value = {'status': 'in_flight', 'event': 'status-update', 'error': 'Event is still being processed'}
+
+        response = await self._post(json.dumps(_webhook('status-update', tenant_id=self.business.id)))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('Retry-After', response)
+
+    async def test_rejects_unsigned_and_tampered_bodies_before_parsing(self):
+        body = json.dumps(_webhook('status-update', tenant_id=self.business.id))
+
+        self.assertEqual((await self._post(body, signature='')).status_code, 401)
+        self.assertEqual((await self._post(body.replace('in-progress', 'ended'), signature=_sign(body))).status_code, 401)
+        self.assertEqual((await self._post('{not json', signature='0' * 64)).status_code, 401)
+        self.assertFalse(await VapiCall.objects.aexists())
+
+    async def test_tenant_route_verifies_with_the_tenant_secret(self):
+        await VapiConfiguration.objects.acreate(
+            business=self.business, server_url='https://example.com/vapi/webhook/', server_secret='tenant-secret',
+            is_shared_agent=False,
+        )
+        # The tenant route is authoritative, so metadata pointing elsewhere is ignored
+        body = json.dumps(_webhook('status-update', tenant_id=uuid.uuid4(), call_id='call-async-2'))
+
+        self.assertEqual((await self._post(body, tenant_id=self.business.id)).status_code, 401)
+        response = await self._post(body, signature=_sign(body, 'tenant-secret'), tenant_id=self.business.id)
+
+        self.assertEqual(response.status_code, 200)
+        call = await VapiCall.objects.aget(call_id='call-async-2')
+        self.assertEqual(call.business_id, self.business.id)
+
+    async def test_plain_route_takes_dedicated_tenants_from_the_header(self):
+        config = await VapiConfiguration.objects.acreate(
+            business=self.business, server_url='https://example.com/vapi/webhook/', server_secret='tenant-secret',
+            is_shared_agent=False,
+        )
+        body = json.dumps(_webhook('status-update', tenant_id=self.business.id, call_id='call-async-3'))
+        headers = {TENANT_HEADER: str(self.business.id)}
+
+        response = await self._post(body, signature=_sign(body, 'tenant-secret'), headers=headers)
+
+        self.assertEqual(response.status_code, 200)
+        call = await VapiCall.objects.aget(call_id='call-async-3')
+        self.assertEqual(call.business_id, self.business.id)
+        self.assertEqual((await self._post(body, signature=_sign(body, 'other-secret'), headers=headers)).status_code, 401)
+        # Without the header the body is never consulted for a tenant, so only the shared secret is tried
+        self.assertEqual((await self._post(body, signature=_sign(body, 'tenant-secret'))).status_code, 401)
+
+        business = await Business.objects.aget(pk=self.business.pk)
+        assistant = VapiBusinessService(business).assistant_payload(config)[0]
+        self.assertEqual(assistant['server']['headers'], headers)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class WebhookVerifierTests(TransactionTestCase):
+    def setUp(self):
+        self.business = BusinessFactory()
+        self.config = VapiConfiguration.objects.create(
+            business=self.business, server_url='https://example.com/vapi/webhook/', server_secret='first-secret',
+            is_shared_agent=False,
+        )
+        self.verifier = WebhookVerifier()
+
+    def test_loads_each_secret_once(self):
+        self.assertTrue(self.verifier.verify(b'{}', _sign('{}', 'first-secret'), self.business.id))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(self.verifier.verify(b'{}', _sign('{}', 'first-secret'), self.business.id))
+            self.assertFalse(self.verifier.verify(b'{}', _sign('{}'), self.business.id))
+            self.assertTrue(self.verifier.verify(b'{}', _sign('{}')))
+
+    def test_secret_rotation_invalidates_the_cached_verifier(self):
+        self.verifier.verify(b'{}', _sign('{}', 'first-secret'), self.business.id)
+
+        self.config.server_secret = 'second-secret'
+        self.config.save()
+        self.verifier._versions.clear()
+
+        self.assertFalse(self.verifier.verify(b'{}', _sign('{}', 'first-secret'), self.business.id))
+        self.assertTrue(self.verifier.verify(b'{}', _sign('{}', 'second-secret'), self.business.id))
+
+    def test_rotation_moves_the_secret_version_on_commit(self):
+        version_key = VapiCacheKeys.webhook_secret_version(str(self.business.id))
+        self.verifier.verify(b'{}', _sign('{}', 'first-secret'), self.business.id)
+        version = cache.get(version_key)
+
+        with transaction.atomic():
+            self.config.server_secret = 'second-secret'
+            self.config.save(update_fields=['server_secret'])
+            # Other workers still read the old row, so a new version now would cache the old secret
+            self.assertEqual(cache.get(version_key, version), version)
+
+        self.assertNotEqual(cache.get(version_key), version)
+
+
+class MetricsFlushTests(SimpleTestCase):
+    @patch('apps.core.metrics.get_redis_client')
+    def test_due_flush_does_not_block_the_recording_caller(self, get_redis_client):
+        released = threading.Event()
+        get_redis_client.return_value.pipeline.return_value.execute.side_effect = lambda: released.wait(5)
+        recorder = MetricsRecorder(flush_interval=1)
+        recorder._last_flush -= 5
+
+        recorder.increment('vapi.webhook.signature', outcome='valid')
+        recorder.increment('vapi.webhook.signature', outcome='valid')
+
+        self.assertTrue(recorder._flusher.is_alive())
+        released.set()
+        recorder._flusher.join(5)
+        get_redis_client.return_value.pipeline.return_value.execute.assert_called_once_with()
+        self.assertEqual(recorder.snapshot()['vapi.webhook.signature|outcome=valid']['count'], 2)
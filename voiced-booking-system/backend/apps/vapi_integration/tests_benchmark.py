@@ -0,0 +1,76 @@
+"""
+Webhook replay benchmark tests
+"""
+import json
+import os
+from unittest import skipUnless
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from apps.core.testing import LOCMEM_CACHE
+from apps.vapi_integration import functions
+from apps.vapi_integration.benchmark import WebhookBenchmark, compare, ensure_tenants, load_recording, percentile
+from apps.vapi_integration.models import VapiCall
+from apps.vapi_integration.optimizations import VapiCacheKeys, vapi_cache_service
+
+
+class BenchmarkReportTests(SimpleTestCase):
+    def test_nearest_rank_percentiles(self):
+        values = [float(value) for value in range(1, 101)]
+
+        self.assertEqual(percentile(values, 50), 50.0)
+        self.assertEqual(percentile(values, 99), 99.0)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_flags_regressions_against_a_baseline(self):
+        baseline = {'throughput_eps': 100.0, 'event_types': {'tool-calls': {'p95_ms': 10.0, 'p99_ms': 20.0, 'queries_per_event': 3}}}
+        report = {'throughput_eps': 85.0, 'event_types': {'tool-calls': {'p95_ms': 10.5, 'p99_ms': 30.0, 'queries_per_event': 3}}}
+
+        self.assertEqual(compare(report, baseline), ['tool-calls p99_ms: 20.0 -> 30.0', 'throughput_eps: 100.0 -> 85.0'])
+
+    def test_recordings_are_grouped_per_call(self):
+        lines = [json.dumps({'message': {'type': event_type, 'call': {'id': call_id}}})
+                 for call_id, event_type in [('a', 'status-update'), ('b', 'status-update'), ('a', 'end-of-call-report')]]
+
+        calls = load_recording(lines)
+
+        self.assertEqual([[event['message']['type'] for event in call] for call in calls],
+                         [['status-update', 'end-of-call-report'], ['status-update']])
+
+
+@override_settings(CACHES=LOCMEM_CACHE, VAPI_WEBHOOK_DEDUPE_TTL=60)
+class WebhookBenchmarkTests(TransactionTestCase):
+    def setUp(self):
+        vapi_cache_service.set(VapiCacheKeys.shared_agent(), 'bench-shared-agent')
+
+    def tearDown(self):
+        # Voice function pool threads keep their test database connections; later non-DB tests get a fresh pool
+        if functions._executor is not None:
+            functions._executor.shutdown(wait=True)
+            functions._executor = None
+
+    def _run(self, calls, tenants, concurrency):
+        return WebhookBenchmark(ensure_tenants(tenants), calls=calls, concurrency=concurrency).run()
+
+    def test_replays_synthetic_calls_through_the_processor(self):
+        report = self._run(calls=2, tenants=2, concurrency=1)
+
+        self.assertEqual(report['overall']['count'], 16)
+        self.assertEqual(report['overall']['errors'], 0)
+        self.assertEqual(set(report['event_types']), {'assistant-request', 'status-update', 'tool-calls', 'function-call', 'end-of-call-report'})
+        self.assertEqual(VapiCall.objects.filter(status='ended').count(), 2)
+        self.assertIsNotNone(report['event_types']['status-update']['queries_per_event'])
+        json.dumps(report)
+
+    @skipUnless(os.environ.get('VAPI_BENCHMARK'), 'set VAPI_BENCHMARK=1 to run the webhook benchmark')
+    def test_latency_slo(self):
+        # Sized through the environment so the same entry point runs against a local Postgres/Redis
+        report = self._run(
+            calls=int(os.environ.get('VAPI_BENCHMARK_CALLS', 20)),
+            tenants=int(os.environ.get('VAPI_BENCHMARK_TENANTS', 2)),
+            concurrency=int(os.environ.get('VAPI_BENCHMARK_CONCURRENCY', 1)),
+        )
+        if os.environ.get('VAPI_BENCHMARK_OUTPUT'):
+            with open(os.environ['VAPI_BENCHMARK_OUTPUT'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+        self.assertEqual(report['overall']['errors'], 0)
+        self.assertTrue(report['slo']['met'], report['slo']['breaches'])
@@ -0,0 +1,52 @@
+"""
+Per-call context preloading tests
+"""
+from datetime import time
+from django.test import TestCase, override_settings
+from apps.businesses.models import BusinessHours
+from apps.core.factories import BusinessFactory, ServiceFactory
+from apps.core.testing import LOCMEM_CACHE
+from apps.vapi_integration.call_context import CallContextStore, call_context_store
+from apps.vapi_integration.event_handlers import FunctionCallHandler
+from apps.vapi_integration.models import VapiCall
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CallContextStoreTests(TestCase):
+    def setUp(self):
+        self.business = BusinessFactory()
+        self.service = ServiceFactory(business=self.business, name='Corte de pelo', duration=30)
+        BusinessHours.objects.create(
+            business=self.business, day_of_week=0, open_time=time(9), close_time=time(18)
+        )
+        BusinessHours.objects.create(business=self.business, day_of_week=6, is_closed=True)
+        self.call = VapiCall.objects.create(business=self.business, call_id='call-ctx-1')
+
+    def test_build_collects_catalog_and_hours(self):
+        context = CallContextStore().build(self.call)
+
+        self.assertEqual(context.tenant.id, str(self.business.id))
+        self.assertEqual([service['name'] for service in context.services], ['Corte de pelo'])
+        self.assertEqual(context.hours_for(0)['open_time'], time(9))
+        self.assertTrue(context.hours_for(6)['is_closed'])
+        self.assertIsNone(context.hours_for(3))
+
+    def test_function_calls_read_preloaded_context(self):
+        call_context_store.preload(self.call)
+        handler = FunctionCallHandler()
+
+        with self.assertNumQueries(0):
+            services = handler._execute_function(self.call, 'get_business_services', {})
+            monday = handler._execute_function(self.call, 'get_business_hours', {'date': '2030-01-07'})
+            sunday = handler._execute_function(self.call, 'get_business_hours', {'date': '2030-01-06'})
+
+        self.assertEqual(services[0]['id'], self.service.id)
+        self.assertEqual(monday['open_time'], '09:00:00')
+        self.assertFalse(sunday['open'])
+
+    def test_missing_context_is_rebuilt_on_demand(self):
+        call_context_store.discard(self.call.call_id)
+
+        context = call_context_store.get(self.call)
+
+        self.assertEqual(context.call_id, 'call-ctx-1')
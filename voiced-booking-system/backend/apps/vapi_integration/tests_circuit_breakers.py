@@ -0,0 +1,177 @@
+"""
+Named circuit breaker tests
+"""
+import requests
+from unittest.mock import patch
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import SimpleTestCase, override_settings
+from apps.core.circuit_breakers import BreakerPolicy, CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError
+from apps.core.metrics import MetricsRecorder
+from apps.core.testing import LOCMEM_CACHE
+from apps.vapi_integration.api_client import VapiAPIClient, is_vapi_outage
+from apps.vapi_integration.standin import FaultProfile, VapiStandIn
+
+POLICY = BreakerPolicy(window_seconds=60, bucket_seconds=10, min_requests=4, failure_rate=0.5, cooldown_seconds=30)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _fail():
+    raise requests.ConnectionError('down')
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.clock = Clock()
+        self.recorder = MetricsRecorder(flush_interval=0)
+        patcher = patch('apps.core.circuit_breakers.metrics', self.recorder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _breaker(self, name='vapi.get_assistant', **kwargs):
+        return CircuitBreaker(name, POLICY, clock=self.clock, **kwargs)
+
+    def _trip(self, breaker):
+        for _ in range(POLICY.min_requests):
+            with self.assertRaises(requests.ConnectionError):
+                breaker.call(_fail)
+
+    def test_opens_on_failure_rate_once_the_window_has_enough_requests(self):
+        breaker = self._breaker()
+        for _ in range(3):
+            breaker.call(lambda: 'ok')
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                breaker.call(_fail)
+        self.assertEqual(breaker.state(), 'closed')
+
+        with self.assertRaises(requests.ConnectionError):
+            breaker.call(_fail)
+        self.assertEqual(breaker.state(), 'open')
+        with self.assertRaises(CircuitOpenError) as raised:
+            breaker.call(lambda: 'ok')
+        self.assertEqual(raised.exception.retry_after, 30)
+        self.assertEqual(self.recorder.snapshot('circuit_breaker.rejected')['circuit_breaker.rejected|breaker=vapi.get_assistant']['count'], 1)
+
+    def test_failures_outside_the_window_are_forgotten(self):
+        breaker = self._breaker()
+        for _ in range(3):
+            with self.assertRaises(requests.ConnectionError):
+                breaker.call(_fail)
+
+        self.clock.now += 70
+        with self.assertRaises(requests.ConnectionError):
+            breaker.call(_fail)
+
+        self.assertEqual(breaker.state(), 'closed')
+
+    def test_state_is_shared_per_name_only(self):
+        self._trip(self._breaker())
+
+        with self.assertRaises(CircuitOpenError):
+            self._breaker().call(lambda: 'ok')
+        self.assertEqual(self._breaker('vapi.buy_phone_number').call(lambda: 'ok'), 'ok')
+
+    def test_half_open_trial_closes_or_reopens(self):
+        breaker = self._breaker()
+        self._trip(breaker)
+        self.clock.now += 31
+        self.assertEqual(breaker.state(), 'half_open')
+
+        with self.assertRaises(requests.ConnectionError):
+            breaker.call(_fail)
+        self.assertEqual(breaker.state(), 'open')
+
+        self.clock.now += 31
+        trial = breaker.acquire()
+        with self.assertRaises(CircuitOpenError):
+            breaker.acquire()
+        breaker.record(trial, failed=False)
+
+        self.assertEqual(breaker.state(), 'closed')
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+        states = self.recorder.snapshot('circuit_breaker.state')
+        self.assertEqual(states['circuit_breaker.state|breaker=vapi.get_assistant,state=open']['count'], 2)
+        self.assertEqual(states['circuit_breaker.state|breaker=vapi.get_assistant,state=closed']['count'], 1)
+
+    def test_classifier_decides_what_counts_as_failure(self):
+        breaker = self._breaker(is_failure=lambda exc: isinstance(exc, DatabaseError))
+
+        for _ in range(POLICY.min_requests):
+            with self.assertRaises(ValueError):
+                breaker.call(lambda: int('not a number'))
+
+        self.assertEqual(breaker.state(), 'closed')
+
+    def test_unavailable_state_fails_open(self):
+        breaker = self._breaker()
+
+        with patch('apps.core.circuit_breakers.cache.get', side_effect=ConnectionError('redis down')):
+            self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+
+    @override_settings(CIRCUIT_BREAKER_POLICIES={'vapi.buy_phone_number': {'cooldown_seconds': 120}})
+    def test_registry_applies_per_name_policies(self):
+        registry = CircuitBreakerRegistry()
+
+        self.assertEqual(registry.get('vapi.buy_phone_number').policy.cooldown_seconds, 120)
+        self.assertEqual(registry.get('vapi.get_call').policy.cooldown_seconds, 30)
+        self.assertIs(registry.get('vapi.get_call'), registry.get('vapi.get_call'))
+
+
+class VapiOutageClassifierTests(SimpleTestCase):
+    def _http_error(self, status):
+        response = requests.Response()
+        response.status_code = status
+        return requests.HTTPError(response=response)
+
+    def test_only_outages_count(self):
+        self.assertTrue(is_vapi_outage(requests.ConnectTimeout()))
+        self.assertTrue(is_vapi_outage(self._http_error(503)))
+        self.assertTrue(is_vapi_outage(self._http_error(429)))
+        self.assertFalse(is_vapi_outage(self._http_error(404)))
+        self.assertFalse(is_vapi_outage(ValueError()))
+
+
+@override_settings(CACHES=LOCMEM_CACHE, VAPI_API_KEY='standin-key', VAPI_HTTP_MAX_RETRIES=0,
+                   CIRCUIT_BREAKER_MIN_REQUESTS=2, CIRCUIT_BREAKER_FAILURE_RATE=0.5)
+class VapiClientBreakerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.standin = VapiStandIn().start()
+        self.addCleanup(self.standin.stop)
+        registry = CircuitBreakerRegistry()
+        patcher = patch('apps.vapi_integration.api_client.circuit_breakers', registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(cache.clear)
+
+    def test_failing_endpoint_does_not_open_other_endpoints(self):
+        with override_settings(VAPI_BASE_URL=self.standin.url):
+            client = VapiAPIClient()
+            self.standin.set_faults(FaultProfile(error_rate=1.0, error_status=503))
+            for _ in range(2):
+                with self.assertRaises(requests.HTTPError):
+                    client.buy_phone_number(area_code='34')
+            with self.assertRaises(CircuitOpenError):
+                client.buy_phone_number(area_code='34')
+
+            self.standin.set_faults(FaultProfile())
+            self.assertEqual(client.list_phone_numbers(), [])
+        self.assertEqual(len(self.standin.requests), 3)
+
+    def test_not_found_lookups_never_open_the_circuit(self):
+        with override_settings(VAPI_BASE_URL=self.standin.url):
+            client = VapiAPIClient()
+            for _ in range(3):
+                with self.assertRaises(requests.HTTPError):
+                    client.get_assistant('missing')
+        self.assertEqual(len(self.standin.requests), 3)
@@ -0,0 +1,258 @@
+"""
+Voice function and event dispatch registry tests
+"""
+import json
+import threading
+import time
+from unittest.mock import Mock, patch
+from django.test import SimpleTestCase, TestCase
+from apps.core.factories import BusinessFactory
+from apps.core.metrics import MetricsRecorder
+from apps.core.testing import vapi_webhook
+from apps.vapi_integration.call_memo import call_result_memo
+from apps.vapi_integration.deadlines import Deadline, deadline_scope
+from apps.vapi_integration.event_handlers import EventHandlerRegistry, FunctionCallHandler
+from apps.vapi_integration.functions import DEGRADED_RESPONSE, VoiceFunctionRegistry, voice_functions
+from apps.vapi_integration.models import VapiCall
+from apps.vapi_integration.processors import WebhookProcessor
+from apps.vapi_integration.value_objects import VapiEventType
+
+
+class VoiceFunctionRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = VoiceFunctionRegistry()
+        self.call = Mock(business_id='tenant-1')
+        self.context = Mock()
+        patcher = patch('apps.vapi_integration.functions.call_context_store')
+        patcher.start().get.return_value = self.context
+        self.addCleanup(patcher.stop)
+
+    def test_builtin_functions_carry_metadata(self):
+        booking = voice_functions.get('book_appointment')
+
+        self.assertFalse(booking.read_only)
+        self.assertTrue(voice_functions.get('get_business_hours').cacheable)
+        self.assertIn(
+            'check_service_availability',
+            [tool['function']['name'] for tool in voice_functions.tool_definitions()]
+        )
+
+    def test_tenant_functions_override_global_ones(self):
+        self.registry.register('get_offers', timeout_ms=300)(lambda call, context, parameters: 'global')
+        self.registry.register('get_offers', business_id='tenant-1')(lambda call, context, parameters: 'tenant')
+
+        self.assertEqual(self.registry.execute(self.call, 'get_offers', {}), 'tenant')
+        self.assertEqual(self.registry.execute(Mock(business_id='tenant-2'), 'get_offers', {}), 'global')
+        self.assertEqual(len(self.registry.available('tenant-1')), 1)
+
+    def test_dispatch_is_instrumented(self):
+        recorder = MetricsRecorder(flush_interval=0)
+        self.registry.register('echo')(lambda call, context, parameters: parameters)
+
+        with patch('apps.vapi_integration.functions.metrics', recorder):
+            self.registry.execute(self.call, 'echo', {'value': 1})
+            with self.assertRaises(ValueError):
+                self.registry.execute(self.call, 'missing', {})
+
+        snapshot = recorder.snapshot()
+        self.assertEqual(snapshot['vapi.function|function=echo,outcome=ok']['count'], 1)
+        self.assertEqual(snapshot['vapi.function.unknown']['count'], 1)
+
+    def test_read_only_batches_run_concurrently(self):
+        # Neither read can return until the other has started, so a sequential run breaks the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def slow(call, context, parameters):
+            barrier.wait()
+            return threading.current_thread().name
+
+        self.registry.register('slow_a')(slow)
+        self.registry.register('slow_b')(slow)
+        self.registry.register('write', read_only=False)(lambda call, context, parameters: threading.current_thread().name)
+
+        outcomes = self.registry.execute_many(self.call, [('slow_a', {}), ('slow_b', {}), ('write', {}), ('missing', {})])
+
+        self.assertEqual((outcomes[0][1], outcomes[1][1]), (None, None))
+        self.assertTrue(outcomes[0][0].startswith('voice-function'))
+        self.assertEqual(outcomes[2], (threading.current_thread().name, None))
+        self.assertIsInstance(outcomes[3][1], ValueError)
+
+    def test_writes_keep_their_place_in_a_batch(self):
+        events = []
+
+        def read(name):
+            def handler(call, context, parameters):
+                events.append(f'{name}:start')
+                time.sleep(0.02)
+                events.append(f'{name}:end')
+            return handler
+
+        for name in ('a', 'b', 'c', 'd'):
+            self.registry.register(name)(read(name))
+        self.registry.register('write', read_only=False)(lambda call, context, parameters: events.append('write'))
+
+        self.registry.execute_many(self.call, [('a', {}), ('b', {}), ('write', {}), ('c', {}), ('d', {})])
+
+        write = events.index('write')
+        self.assertEqual(sorted(events[:write]), ['a:end', 'a:start', 'b:end', 'b:start'])
+        self.assertEqual(sorted(events[write + 1:]), ['c:end', 'c:start', 'd:end', 'd:start'])
+
+
+class CallResultMemoTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = VoiceFunctionRegistry()
+        self.call = Mock(business_id='tenant-1', call_id='call-memo-1')
+        patcher = patch('apps.vapi_integration.functions.call_context_store')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(call_result_memo.invalidate, 'call-memo-1')
+        self.lookup = Mock(return_value={'available': True})
+        self.registry.register('lookup', cacheable=True)(self.lookup)
+        self.registry.register('book', read_only=False)(lambda call, context, parameters: {'success': True})
+
+    def test_repeated_calls_are_answered_from_memory(self):
+        self.registry.execute(self.call, 'lookup', {'service_name': 'Corte', 'date': '2030-01-07'})
+
+        result = self.registry.execute(self.call, 'lookup', {'date': '2030-01-07', 'service_name': ' corte '})
+
+        self.assertEqual(result, {'available': True})
+        self.assertEqual(self.lookup.call_count, 1)
+
+    def test_memo_is_per_call_and_cleared_by_writes(self):
+        self.registry.execute(self.call, 'lookup', {'date': '2030-01-07'})
+        self.registry.execute(Mock(business_id='tenant-1', call_id='call-memo-2'), 'lookup', {'date': '2030-01-07'})
+        self.registry.execute(self.call, 'book', {})
+        self.registry.execute(self.call, 'lookup', {'date': '2030-01-07'})
+
+        self.assertEqual(self.lookup.call_count, 3)
+
+    def test_reads_overlapping_a_write_are_not_memoized(self):
+        def lookup(call, context, parameters):
+            # A write lands while this read is still running
+            call_result_memo.invalidate(call.call_id)
+            return {'available': True}
+
+        self.registry.register('racing_lookup', cacheable=True)(lookup)
+        self.registry.execute(self.call, 'racing_lookup', {'date': '2030-01-07'})
+
+        self.assertEqual(call_result_memo.get('call-memo-1', 'racing_lookup', {'date': '2030-01-07'}), (False, None))
+
+
+class DeadlineBudgetTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = VoiceFunctionRegistry()
+        self.call = Mock(business_id='tenant-1')
+        patcher = patch('apps.vapi_integration.functions.call_context_store')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.recorder = MetricsRecorder(flush_interval=0)
+        patcher = patch('apps.vapi_integration.deadlines.metrics', self.recorder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_budget_comes_from_tenant_webhook_timeout(self):
+        deadline = Deadline.for_tenant(Mock(id='tenant-1', webhook_timeout=3000))
+
+        self.assertEqual(deadline.budget_ms, 2500)
+        self.assertGreater(deadline.remaining_ms, 2400)
+
+    def test_slow_read_returns_fallback_within_budget(self):
+        def slow(call, context, parameters):
+            time.sleep(0.3)
+            return 'late'
+
+        self.registry.register('slow')(slow)
+        self.registry.register('slow_cached', fallback=lambda call, parameters: {'cached': True})(slow)
+
+        started = time.perf_counter()
+        with deadline_scope(Deadline(50, tenant_id='tenant-1')):
+            outcomes = self.registry.execute_many(self.call, [('slow', {}), ('slow_cached', {})])
+
+        self.assertEqual(outcomes, [(DEGRADED_RESPONSE, None), ({'cached': True}, None)])
+        self.assertLess(time.perf_counter() - started, 0.25)
+        snapshot = self.recorder.snapshot('vapi.deadline.overrun')
+        self.assertEqual(snapshot['vapi.deadline.overrun|function=slow,stage=function,tenant=tenant-1']['count'], 1)
+
+    @patch('apps.vapi_integration.functions._get_executor')
+    def test_lone_reads_run_on_the_request_thread(self, get_executor):
+        self.registry.register('where')(lambda call, context, parameters: threading.current_thread().name)
+
+        with deadline_scope(Deadline(1000)):
+            self.assertEqual(self.registry.execute(self.call, 'where', {}), threading.current_thread().name)
+
+        get_executor.assert_not_called()
+
+    def test_writes_do_not_start_without_budget(self):
+        handler = Mock(return_value='booked')
+        self.registry.register('book', read_only=False, timeout_ms=4000)(handler)
+
+        with deadline_scope(Deadline(1000, started=time.monotonic() - 0.8)):
+            self.assertEqual(self.registry.execute(self.call, 'book', {}), DEGRADED_RESPONSE)
+        with deadline_scope(Deadline(1000)):
+            self.assertEqual(self.registry.execute(self.call, 'book', {}), 'booked')
+
+        handler.assert_called_once()
+
+    @patch('apps.vapi_integration.functions._get_executor')
+    def test_spent_budget_submits_nothing(self, get_executor):
+        handler = Mock(return_value='open')
+        self.registry.register('hours')(handler)
+        self.registry.register('services', fallback=lambda call, parameters: {'cached': True})(handler)
+
+        with deadline_scope(Deadline(100, started=time.monotonic() - 1)):
+            self.assertEqual(self.registry.execute(self.call, 'hours', {}), DEGRADED_RESPONSE)
+            outcomes = self.registry.execute_many(self.call, [('hours', {}), ('services', {})])
+
+        self.assertEqual(outcomes, [(DEGRADED_RESPONSE, None), ({'cached': True}, None)])
+        get_executor.assert_not_called()
+        handler.assert_not_called()
+
+
+class WebhookDeadlineTests(TestCase):
+    def setUp(self):
+        self.business = BusinessFactory()
+
+    def _webhook(self):
+        webhook = vapi_webhook('tool-calls', call_id='call-late-1', tenant_id=self.business.id)
+        webhook['message']['toolCallList'] = [{'id': 'tc-1', 'function': {'name': 'get_business_hours', 'arguments': {}}}]
+        return webhook
+
+    @patch('apps.vapi_integration.event_handlers.voice_functions.execute_many')
+    def test_spent_budget_answers_without_running_handlers(self, execute_many):
+        result = WebhookProcessor(self.business).process_webhook(self._webhook(), started=time.monotonic() - 60)
+
+        execute_many.assert_not_called()
+        self.assertEqual([entry['toolCallId'] for entry in result['results']], ['tc-1'])
+        self.assertFalse(VapiCall.objects.exists())
+
+
+class FunctionCallHandlerTests(SimpleTestCase):
+    @patch('apps.vapi_integration.event_handlers.voice_functions')
+    def test_tool_call_list_returns_vapi_results(self, mock_functions):
+        mock_functions.execute_many.return_value = [({'open': True}, None), (None, ValueError('Unknown function: nope'))]
+        event_data = {'message': {'type': 'tool-calls', 'toolCallList': [
+            {'id': 'tc-1', 'type': 'function', 'function': {'name': 'get_business_hours', 'arguments': '{"date": "2030-01-07"}'}},
+            {'id': 'tc-2', 'type': 'function', 'function': {'name': 'nope', 'arguments': {}}},
+        ]}}
+
+        response = FunctionCallHandler().handle(Mock(call_id='call-1'), event_data)
+
+        mock_functions.execute_many.assert_called_once()
+        self.assertEqual(mock_functions.execute_many.call_args[0][1], [('get_business_hours', {'date': '2030-01-07'}), ('nope', {})])
+        self.assertEqual(response['results'], [
+            {'toolCallId': 'tc-1', 'name': 'get_business_hours', 'result': json.dumps({'open': True})},
+            {'toolCallId': 'tc-2', 'name': 'nope', 'error': 'Unknown function: nope'},
+        ])
+
+
+class EventHandlerRegistryTests(SimpleTestCase):
+    def test_routes_by_event_type(self):
+        registry = EventHandlerRegistry()
+
+        self.assertIsInstance(registry.get_handler(VapiEventType('tool-calls')), FunctionCallHandler)
+        self.assertIsNone(registry.get_handler(VapiEventType('speech-started')))
+
+    def test_unhandled_events(self):
+        result = EventHandlerRegistry(handlers=[]).handle_event(VapiEventType('hang'), Mock(), {})
+
+        self.assertEqual(result, {'status': 'unhandled_event', 'event_type': 'hang'})
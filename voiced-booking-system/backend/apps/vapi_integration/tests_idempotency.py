@@ -0,0 +1,82 @@
+"""
+Webhook idempotency ledger tests
+"""
+from functools import partial
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from apps.core.metrics import metrics
+from apps.core.testing import vapi_webhook
+from apps.vapi_integration.idempotency import DUPLICATE, FIRST, IN_FLIGHT, WebhookLedger
+from apps.vapi_integration.processors import WebhookProcessor
+from apps.vapi_integration.value_objects import VapiEventType
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+_webhook = partial(vapi_webhook, call_id='call-dedupe-1', timestamp=1700000000000)
+
+
+@override_settings(VAPI_WEBHOOK_DEDUPE_TTL=3600)
+class WebhookLedgerTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.ledger = WebhookLedger(client=FakeRedis())
+
+    def test_fingerprints_only_fire_and_forget_events(self):
+        report = self.ledger.fingerprint(VapiEventType('end-of-call-report'), _webhook('end-of-call-report'))
+
+        self.assertEqual(report, 'call-dedupe-1:end-of-call-report:1700000000000')
+        self.assertIsNone(self.ledger.fingerprint(VapiEventType('tool-calls'), _webhook('tool-calls')))
+
+    def test_claims_each_delivery_once_until_released(self):
+        self.assertEqual(self.ledger.claim('call-dedupe-1:status-update:1'), FIRST)
+        self.assertEqual(self.ledger.claim('call-dedupe-1:status-update:1'), IN_FLIGHT)
+
+        self.ledger.release('call-dedupe-1:status-update:1')
+        self.assertEqual(self.ledger.claim('call-dedupe-1:status-update:1'), FIRST)
+        self.ledger.complete('call-dedupe-1:status-update:1')
+        self.assertEqual(self.ledger.claim('call-dedupe-1:status-update:1'), DUPLICATE)
+        snapshot = metrics.snapshot('vapi.webhook.dedupe')
+        self.assertEqual(snapshot['vapi.webhook.dedupe|outcome=duplicate']['count'], 1)
+        self.assertEqual(snapshot['vapi.webhook.dedupe|outcome=in_flight']['count'], 1)
+
+    def test_in_flight_duplicates_are_retryable_failures(self):
+        self.ledger.claim('call-dedupe-1:end-of-call-report:1700000000000')
+
+        with patch('apps.vapi_integration.processors.webhook_ledger', self.ledger):
+            result = WebhookProcessor().process_webhook(_webhook('end-of-call-report'))
+
+        self.assertEqual(result['status'], 'in_flight')
+        self.assertIn('error', result)
+        # The first delivery still owns the lease, so it can release it for a later retry
+        self.assertEqual(self.ledger.claim('call-dedupe-1:end-of-call-report:1700000000000'), IN_FLIGHT)
+
+    @patch('apps.vapi_integration.processors.MetadataExtractor.get_business_from_metadata')
+    def test_failed_deliveries_are_retried_and_duplicates_skip_processing(self, get_business):
+        get_business.return_value = None
+        with patch('apps.vapi_integration.processors.webhook_ledger', self.ledger):
+            WebhookProcessor().process_webhook(_webhook('end-of-call-report'))
+            self.assertEqual(self.ledger.claim('call-dedupe-1:end-of-call-report:1700000000000'), FIRST)
+            self.ledger.complete('call-dedupe-1:end-of-call-report:1700000000000')
+            get_business.reset_mock()
+
+            with self.assertNumQueries(0):
+                result = WebhookProcessor().process_webhook(_webhook('end-of-call-report'))
+
+        self.assertEqual(result['status'], 'duplicate')
+        get_business.assert_not_called()
@@ -0,0 +1,62 @@
+"""
+Webhook stream ingestion tests
+"""
+import json
+from unittest.mock import patch, Mock
+from django.test import SimpleTestCase, override_settings
+from apps.core.testing import vapi_webhook
+from apps.vapi_integration.ingestion import WebhookEventStream, WebhookStreamConsumer
+
+
+class WebhookEventStreamTests(SimpleTestCase):
+    @override_settings(VAPI_WEBHOOK_INGESTION_MODE='stream')
+    def test_accepts_fire_and_forget_events(self):
+        for event_type in ('status-update', 'speech-started', 'transcript', 'hang', 'end-of-call-report'):
+            self.assertTrue(WebhookEventStream.accepts(vapi_webhook(event_type)))
+
+    @override_settings(VAPI_WEBHOOK_INGESTION_MODE='stream')
+    def test_keeps_reply_events_synchronous(self):
+        for event_type in ('assistant-request', 'function-call', 'tool-calls', 'bogus'):
+            self.assertFalse(WebhookEventStream.accepts(vapi_webhook(event_type)))
+
+    @override_settings(VAPI_WEBHOOK_INGESTION_MODE='sync')
+    def test_sync_mode_never_enqueues(self):
+        self.assertFalse(WebhookEventStream.accepts(vapi_webhook('status-update')))
+
+
+@override_settings(VAPI_WEBHOOK_STREAM_MAX_DELIVERIES=3)
+class WebhookStreamConsumerTests(SimpleTestCase):
+    def setUp(self):
+        patcher = patch('apps.vapi_integration.ingestion.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.event_stream = Mock()
+        self.consumer = WebhookStreamConsumer('test-consumer', event_stream=self.event_stream)
+
+    @patch('apps.vapi_integration.processors.WebhookProcessor')
+    def test_acks_processed_events(self, mock_processor):
+        mock_processor.return_value.process_webhook.return_value = {'status': 'success'}
+        messages = [('1-0', {'payload': json.dumps(vapi_webhook('status-update'))})]
+
+        self.assertEqual(self.consumer.process_batch(messages), 1)
+        self.event_stream.ack.assert_called_once_with(['1-0'])
+
+    @patch('apps.vapi_integration.processors.WebhookProcessor')
+    def test_failed_events_stay_pending_until_max_deliveries(self, mock_processor):
+        mock_processor.return_value.process_webhook.return_value = {'error': 'Business not found in metadata'}
+        messages = [('1-0', {'payload': json.dumps(vapi_webhook('status-update'))})]
+
+        self.event_stream.delivery_count.return_value = 1
+        self.consumer.process_batch(messages)
+        self.event_stream.dead_letter.assert_not_called()
+        self.event_stream.ack.assert_called_once_with([])
+
+        self.event_stream.delivery_count.return_value = 3
+        self.consumer.process_batch(messages)
+        self.event_stream.dead_letter.assert_called_once_with('1-0', messages[0][1])
+
+    def test_malformed_entries_are_dead_lettered(self):
+        messages = [('1-0', {'payload': 'not-json'})]
+
+        self.consumer.process_batch(messages)
+        self.event_stream.dead_letter.assert_called_once_with('1-0', {'payload': 'not-json'})
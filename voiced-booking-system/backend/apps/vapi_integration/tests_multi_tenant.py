@@ -4,14 +4,19 @@ Multi-tenant VAPI Integration Tests
 import json
 from unittest.mock import patch, Mock
 from django.test import TestCase, override_settings
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from apps.businesses.models import Business
+from apps.core.testing import LOCMEM_CACHE
+from apps.vapi_integration.event_handlers import AssistantRequestHandler
 from apps.vapi_integration.models import VapiConfiguration
 from apps.vapi_integration.multi_tenant_services import (
     SharedAgentManager, 
+    SharedAgentRegistry,
     TenantRegistrationService, 
     MetadataExtractor
 )
+from apps.vapi_integration.optimizations import VapiCacheKeys, vapi_cache_service
 
 User = get_user_model()
 
@@ -45,6 +50,77 @@ class SharedAgentManagerTests(TestCase):
         self.assertEqual(agent_id, 'new-shared-agent-456')
 
 
+@override_settings(
+    CACHES=LOCMEM_CACHE,
+    VAPI_SHARED_AGENT_ID='shared-agent-123'
+)
+@patch('apps.vapi_integration.multi_tenant_services.get_redis_client')
+class SharedAgentRegistryTests(TestCase):
+    @patch('apps.vapi_integration.multi_tenant_services.VapiAPIClient')
+    def test_agent_id_is_resolved_once_per_process(self, mock_client, mock_redis):
+        registry = SharedAgentRegistry()
+
+        self.assertEqual(registry.get_agent_id(wait=True), 'shared-agent-123')
+        self.assertEqual(registry.get_agent_id(), 'shared-agent-123')
+
+        mock_client.return_value.get_assistant.assert_called_once_with('shared-agent-123')
+        mock_client.return_value.create_assistant.assert_not_called()
+        mock_redis.return_value.lock.assert_called_once()
+
+    @patch('apps.vapi_integration.tasks.refresh_shared_agent.delay')
+    @patch('apps.vapi_integration.multi_tenant_services.VapiAPIClient')
+    def test_cold_cache_answers_without_calling_vapi(self, mock_client, delay, mock_redis):
+        cache.clear()
+        registry = SharedAgentRegistry()
+
+        with patch('apps.vapi_integration.multi_tenant_services.threading.Thread') as thread:
+            self.assertEqual(registry.get_agent_id(), 'shared-agent-123')
+            self.assertEqual(registry.get_agent_id(), 'shared-agent-123')
+
+        # The broker publish is handed to a thread, once per refresh interval
+        thread.assert_called_once()
+        delay.assert_not_called()
+        thread.call_args.kwargs['target']()
+        delay.assert_called_once_with()
+        mock_client.return_value.get_assistant.assert_not_called()
+        mock_redis.return_value.lock.assert_not_called()
+
+    @override_settings(VAPI_SHARED_AGENT_ID='')
+    @patch('apps.vapi_integration.multi_tenant_services.threading.Thread')
+    def test_cold_cache_never_answers_with_an_empty_id(self, thread, mock_redis):
+        cache.clear()
+        registry = SharedAgentRegistry()
+
+        self.assertIsNone(registry.get_agent_id())
+
+        vapi_cache_service.set(VapiCacheKeys.shared_agent(), 'resolved-agent')
+        self.assertEqual(registry.get_agent_id(), 'resolved-agent')
+        cache.clear()
+        registry._local.clear()
+        # Once resolved, the id stays usable even after both caches have let it go
+        self.assertEqual(registry.get_agent_id(), 'resolved-agent')
+
+    @override_settings(VAPI_SHARED_AGENT_ID='')
+    @patch('apps.vapi_integration.multi_tenant_services.threading.Thread')
+    def test_assistant_request_without_agent_is_an_error(self, thread, mock_redis):
+        cache.clear()
+        with patch('apps.vapi_integration.event_handlers.shared_agent_registry', SharedAgentRegistry()):
+            result = AssistantRequestHandler()._assistant_response()
+
+        self.assertEqual(result['status'], 'error')
+        self.assertNotIn('assistantId', result)
+
+    @patch('apps.vapi_integration.multi_tenant_services.VapiAPIClient')
+    def test_refresh_creates_agent_when_configured_one_is_gone(self, mock_client, mock_redis):
+        mock_client.return_value.get_assistant.side_effect = Exception("Not found")
+        mock_client.return_value.create_assistant.return_value = {'id': 'new-shared-agent-456'}
+        registry = SharedAgentRegistry()
+
+        self.assertEqual(registry.refresh(), 'new-shared-agent-456')
+        self.assertEqual(SharedAgentRegistry().get_agent_id(), 'new-shared-agent-456')
+        mock_client.return_value.create_assistant.assert_called_once()
+
+
 class TenantRegistrationServiceTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -0,0 +1,184 @@
+"""
+Event-type-aware webhook persistence tests
+"""
+from functools import partial
+from decimal import Decimal
+from django.db import transaction
+from django.test import TestCase
+from apps.core.factories import BusinessFactory
+from apps.core.testing import vapi_webhook
+from apps.vapi_integration.call_writer import CallStateWriter
+from apps.vapi_integration.models import VapiCall, VapiCallAnalysis, VapiCallTranscript, VapiCallTranscriptSegment
+from apps.vapi_integration.persistence import CallPersistence
+from apps.vapi_integration.transcripts import TranscriptSegmentStore
+from apps.vapi_integration.value_objects import VapiEventType
+
+
+_webhook = partial(vapi_webhook, call_id='call-persist-1')
+
+
+class CallPersistenceTests(TestCase):
+    def setUp(self):
+        self.business = BusinessFactory()
+        self.persistence = CallPersistence()
+
+    def _persist(self, event_type, webhook_data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.persistence.persist(VapiEventType(event_type), webhook_data, self.business)
+
+    def test_realtime_events_never_touch_the_database(self):
+        with self.assertNumQueries(0):
+            call = self._persist('speech-started', _webhook('speech-started'))
+
+        self.assertEqual(call.call_id, 'call-persist-1')
+        self.assertFalse(VapiCall.objects.exists())
+
+    def test_status_events_only_write_changes(self):
+        created = self._persist('status-update', _webhook('status-update', status='queued'))
+
+        with self.assertNumQueries(0):
+            self._persist('status-update', _webhook('status-update', status='queued'))
+            call = self._persist('function-call', _webhook('function-call'))
+        with self.assertNumQueries(1):
+            self._persist('status-update', _webhook('status-update', status='in-progress'))
+
+        self.assertEqual(call.pk, created.pk)
+        self.assertEqual(VapiCall.objects.get().status, 'in-progress')
+
+        self._persist('status-update', _webhook('status-update', status='ended'))
+        with self.assertNumQueries(0):
+            self._persist('status-update', _webhook('status-update', status='ringing'))
+        self.assertEqual(VapiCall.objects.get().status, 'ended')
+
+    def test_rolled_back_updates_are_not_remembered(self):
+        self._persist('status-update', _webhook('status-update', status='queued'))
+
+        with self.assertRaises(RuntimeError):
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    self.persistence.persist(VapiEventType('status-update'), _webhook('status-update', status='in-progress'), self.business)
+                    raise RuntimeError('handler failed')
+        self.assertEqual(VapiCall.objects.get().status, 'queued')
+
+        self._persist('status-update', _webhook('status-update', status='in-progress'))
+        self.assertEqual(VapiCall.objects.get().status, 'in-progress')
+
+    def test_only_end_of_call_report_writes_artifacts(self):
+        webhook_data = _webhook('status-update', status='ended')
+        webhook_data['message'].update({'transcript': 'Hola', 'analysis': {'summary': 'Reserva'}})
+        self._persist('status-update', webhook_data)
+        self.assertFalse(VapiCallTranscript.objects.exists())
+
+        webhook_data['message']['type'] = 'end-of-call-report'
+        self._persist('end-of-call-report', webhook_data)
+
+        self.assertEqual(VapiCallTranscript.objects.get().transcript, 'Hola')
+        self.assertEqual(VapiCallAnalysis.objects.get().summary, 'Reserva')
+
+
+class CallStateWriterTests(TestCase):
+    def setUp(self):
+        self.business = BusinessFactory()
+        self.writer = CallStateWriter()
+
+    def _write(self, call, **values):
+        state = {'id': call.pk, 'call_id': call.call_id, 'business_id': self.business.pk, **values}
+        self.writer.write(self.writer.instance(state), values.keys())
+
+    def test_upsert_is_one_statement_once_the_pk_is_known(self):
+        created = self.writer.upsert({'id': 'call-upsert-1', 'status': 'queued', 'customer': {'number': '+34600000000'}}, self.business)
+        redelivered = self.writer.upsert({'id': 'call-upsert-1', 'status': 'queued'}, self.business)
+        with self.assertNumQueries(1):
+            updated = self.writer.upsert({'id': 'call-upsert-1', 'cost': 0.25}, self.business, pk=created.pk)
+
+        call = VapiCall.objects.get()
+        self.assertEqual(redelivered.pk, created.pk)
+        self.assertEqual(updated.pk, created.pk)
+        self.assertEqual(call.pk, created.pk)
+        self.assertEqual((call.status, str(call.cost), call.customer_number), ('queued', '0.2500', '+34600000000'))
+
+    def test_new_rows_skip_the_lifecycle_transition(self):
+        with self.assertNumQueries(2):
+            self.writer.upsert({'id': 'call-upsert-1', 'status': 'in-progress'}, self.business)
+        # A redelivered insert merges into the existing row, so its status still goes through a transition
+        self.writer.upsert({'id': 'call-upsert-1', 'status': 'ended'}, self.business)
+
+        self.assertEqual(VapiCall.objects.get().status, 'ended')
+
+    def test_buffered_writes_coalesce_per_call(self):
+        first = self.writer.upsert({'id': 'call-upsert-1', 'status': 'queued'}, self.business)
+        second = self.writer.upsert({'id': 'call-upsert-2', 'status': 'queued'}, self.business)
+        self.writer.window_ms = 60000
+
+        with self.assertNumQueries(1):
+            with self.writer.buffered():
+                self._write(first, cost=Decimal('0.1'))
+                self._write(second, cost=Decimal('0.2'))
+                self._write(first, cost=Decimal('0.3'))
+
+        self.assertEqual(
+            dict(VapiCall.objects.values_list('call_id', 'cost')),
+            {'call-upsert-1': Decimal('0.3'), 'call-upsert-2': Decimal('0.2')},
+        )
+
+    def test_out_of_order_status_never_regresses(self):
+        call = self.writer.upsert({'id': 'call-upsert-1', 'status': 'in-progress'}, self.business)
+        self.writer.upsert({'id': 'call-upsert-1', 'status': 'ended', 'endedReason': 'customer-ended-call'}, self.business)
+
+        with self.assertNumQueries(1):
+            self._write(call, status='ringing')
+        self.writer.upsert({'id': 'call-upsert-1', 'status': 'in-progress', 'endedReason': None}, self.business)
+        with self.writer.buffered():
+            self._write(call, status='forwarding')
+            self._write(call, status='queued')
+
+        call = VapiCall.objects.get()
+        self.assertEqual((call.status, call.ended_reason), ('ended', 'customer-ended-call'))
+
+
+class TranscriptSegmentStoreTests(TestCase):
+    def setUp(self):
+        self.business = BusinessFactory()
+        self.call = VapiCall.objects.create(business=self.business, call_id='call-persist-1')
+        self.store = TranscriptSegmentStore()
+
+    def _transcript(self, seq, role, text, transcript_type='final'):
+        return {'type': 'transcript', 'timestamp': seq, 'role': role, 'transcript': text, 'transcriptType': transcript_type}
+
+    def test_appends_final_segments_once(self):
+        with self.assertNumQueries(1):
+            with self.store.buffered():
+                self.store.append('call-persist-1', self._transcript(1, 'user', 'Hola'))
+                self.store.append('call-persist-1', self._transcript(2, 'user', 'Quiero', 'partial'))
+                self.store.append('call-persist-1', self._transcript(3, 'assistant', 'Buenos días'))
+        self.store.append('call-persist-1', self._transcript(1, 'user', 'Hola'))
+
+        transcript, messages = self.store.assemble('call-persist-1')
+
+        self.assertEqual(transcript, 'User: Hola\nAI: Buenos días')
+        self.assertEqual(len(messages), 2)
+
+    def test_segments_sharing_a_millisecond_are_both_kept(self):
+        with self.store.buffered():
+            self.store.append('call-persist-1', self._transcript(1700000000000, 'user', 'Hola'))
+            self.store.append('call-persist-1', self._transcript(1700000000000, 'assistant', 'Buenos días'))
+            self.store.append('call-persist-1', self._transcript('1700000000000', 'user', 'Hola'))
+        self.store.append('call-persist-1', self._transcript('2023-11-14T22:13:20.001Z', 'user', 'Sí'))
+
+        self.assertEqual(VapiCallTranscriptSegment.objects.count(), 3)
+        self.assertEqual(VapiCallTranscriptSegment.objects.order_by('seq').last().seq, 1700000000001)
+
+    def test_segments_without_a_usable_timestamp_are_skipped(self):
+        self.assertIsNone(self.store.append('call-persist-1', self._transcript(None, 'user', 'Hola')))
+        self.assertIsNone(self.store.append('call-persist-1', self._transcript('yesterday', 'user', 'Hola')))
+
+        self.assertFalse(VapiCallTranscriptSegment.objects.exists())
+
+    def test_end_of_call_report_compacts_segments(self):
+        self.store.append('call-persist-1', self._transcript(1, 'user', 'Hola'))
+        webhook_data = _webhook('end-of-call-report')
+
+        CallPersistence().persist(VapiEventType('end-of-call-report'), webhook_data, self.business)
+
+        self.assertEqual(VapiCallTranscript.objects.get().transcript, 'User: Hola')
+        self.assertFalse(VapiCallTranscriptSegment.objects.exists())
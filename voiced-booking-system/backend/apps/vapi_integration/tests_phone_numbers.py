@@ -0,0 +1,105 @@
+"""
+Phone number pool tests
+"""
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from apps.core.factories import BusinessFactory
+from apps.core.testing import LOCMEM_CACHE
+from apps.vapi_integration.api_client import VapiAPIClient
+from apps.vapi_integration.models import VapiPhoneNumber
+from apps.vapi_integration.multi_tenant_services import TenantRegistrationService, shared_agent_registry
+from apps.vapi_integration.optimizations import VapiCacheKeys, vapi_cache_service
+from apps.vapi_integration.phone_numbers import PhoneNumberPool, phone_number_pool
+from apps.vapi_integration.tests_standin import StandInTestMixin
+
+
+@override_settings(CACHES=LOCMEM_CACHE, VAPI_PHONE_POOL_TARGETS={'34': 3, '1415': 1})
+class PhoneNumberPoolTests(StandInTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.pool = PhoneNumberPool()
+        self.shared_agent = VapiAPIClient().create_assistant({'name': 'Shared'})['id']
+        shared_agent_registry.invalidate()
+        vapi_cache_service.set(VapiCacheKeys.shared_agent(), self.shared_agent)
+        self.standin.requests.clear()
+
+    def test_replenish_fills_each_area_code_to_its_target(self):
+        self.assertEqual(self.pool.replenish(), {'34': 3, '1415': 1})
+        self.assertEqual((self.pool.available('34'), self.pool.available('1415')), (3, 1))
+        self.assertEqual(len(self.standin.state.phone_numbers), 4)
+
+        self.standin.requests.clear()
+        self.assertEqual(self.pool.replenish(), {'34': 0, '1415': 0})
+        self.assertEqual(self.standin.requests, [])
+
+    @override_settings(VAPI_PHONE_POOL_MAX_PURCHASES=2)
+    def test_replenish_caps_purchases_per_run(self):
+        self.assertEqual(self.pool.replenish(), {'34': 2, '1415': 0})
+
+    def test_registration_claims_a_pooled_number_without_calling_vapi(self):
+        self.pool.replenish()
+        business = BusinessFactory()
+        self.standin.requests.clear()
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            result = TenantRegistrationService().register_tenant(business, area_code='34')
+
+        self.assertTrue(result['success'], result)
+        self.assertEqual(self.standin.requests, [])
+        number = VapiPhoneNumber.objects.get(phone_number_id=result['phone_number_id'])
+        self.assertEqual((number.business, number.area_code), (business, '34'))
+        self.assertEqual(business.vapi_configurations.get().phone_number_id, number.phone_number_id)
+
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(self.standin.requests, [('PATCH', f'/phone-number/{number.phone_number_id}')])
+        remote = self.standin.state.phone_numbers[number.phone_number_id]
+        self.assertEqual(remote['assistantId'], self.shared_agent)
+        self.assertEqual(remote['metadata']['tenant_id'], str(business.id))
+        self.assertIsNotNone(VapiPhoneNumber.objects.get(pk=number.pk).configured_at)
+
+    def test_registration_buys_a_number_when_the_pool_is_empty(self):
+        business = BusinessFactory()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = TenantRegistrationService().register_tenant(business, area_code='1415')
+
+        self.assertTrue(result['success'], result)
+        self.assertEqual([method for method, _ in self.standin.requests], ['POST', 'PATCH'])
+        self.assertEqual(VapiPhoneNumber.objects.get().business, business)
+
+    def test_number_bought_for_a_registration_cannot_be_claimed_by_another(self):
+        business, competitor = BusinessFactory(), BusinessFactory()
+        purchase = phone_number_pool.purchase
+        claims = []
+
+        def purchase_then_compete(*args, **kwargs):
+            number = purchase(*args, **kwargs)
+            claims.append(phone_number_pool.claim(competitor, '1415'))
+            return number
+
+        with patch.object(phone_number_pool, 'purchase', side_effect=purchase_then_compete):
+            result = TenantRegistrationService().register_tenant(business, area_code='1415')
+
+        self.assertTrue(result['success'], result)
+        self.assertEqual(claims, [None])
+        self.assertEqual(VapiPhoneNumber.objects.get().business, business)
+
+    def test_claim_honours_the_area_code(self):
+        self.pool.replenish()
+        first, second = BusinessFactory(), BusinessFactory()
+
+        self.assertEqual(self.pool.claim(first, '1415').area_code, '1415')
+        self.assertIsNone(self.pool.claim(second, '1415'))
+        self.assertEqual(self.pool.claim(second).area_code, '34')
+        self.assertEqual(self.pool.available(), 2)
+
+    def test_replenish_configures_numbers_left_pending(self):
+        self.pool.replenish()
+        number = self.pool.claim(BusinessFactory(), '34')
+
+        self.pool.replenish()
+
+        self.assertIsNotNone(VapiPhoneNumber.objects.get(pk=number.pk).configured_at)
+        self.assertEqual(self.standin.state.phone_numbers[number.phone_number_id]['assistantId'], self.shared_agent)
@@ -0,0 +1,114 @@
+"""
+Vapi call reconciliation tests
+"""
+import requests
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from apps.core.factories import BusinessFactory
+from apps.core.testing import LOCMEM_CACHE
+from apps.vapi_integration.models import VapiCall, VapiCallAnalysis, VapiCallSyncCheckpoint, VapiCallTranscript
+from apps.vapi_integration.reconciliation import CallReconciler, ReconcileWindowError, vapi_timestamp
+from apps.vapi_integration.standin import FaultProfile
+from apps.vapi_integration.tests_standin import StandInTestMixin
+
+START = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+UNTIL = START + timedelta(days=3)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, VAPI_HTTP_MAX_RETRIES=0, VAPI_RECONCILE_OVERLAP_MINUTES=60)
+class CallReconcilerTests(StandInTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = BusinessFactory()
+
+    def _reconciler(self, **kwargs):
+        options = {'org_id': 'org-1', 'page_size': 2, 'chunk_size': 2, 'concurrency': 2, 'window': timedelta(days=1)}
+        return CallReconciler(**{**options, **kwargs})
+
+    def _seed(self, hours, **fields):
+        return self.standin.state.add_call({
+            'createdAt': vapi_timestamp(START + timedelta(hours=hours)),
+            'status': 'ended',
+            'metadata': {'tenant_id': str(self.business.id)},
+            **fields,
+        })
+
+    def test_backfills_missing_calls_with_artifacts(self):
+        calls = [self._seed(hours) for hours in (1, 2, 2, 3, 30, 60)]
+        self._seed(5, artifact={'transcript': 'User: Hola', 'messages': [{'role': 'user'}]},
+                   analysis={'summary': 'Reserva', 'successEvaluation': True})
+        self.standin.state.add_call({'createdAt': vapi_timestamp(START + timedelta(hours=4)), 'status': 'ended'})
+
+        stats = self._reconciler().run(since=START, until=UNTIL)
+
+        self.assertEqual((stats.windows, stats.fetched, stats.created, stats.unrouted), (3, 8, 7, 1))
+        self.assertEqual(VapiCall.objects.filter(business=self.business).count(), 7)
+        self.assertTrue(VapiCall.objects.filter(call_id=calls[0]['id'], status='ended').exists())
+        self.assertEqual(VapiCallTranscript.objects.get().transcript, 'User: Hola')
+        self.assertEqual(VapiCallAnalysis.objects.get().success_evaluation, 'True')
+        self.assertEqual(VapiCallSyncCheckpoint.objects.get(org_id='org-1').synced_until, UNTIL)
+
+    def test_updates_stale_rows_and_skips_unchanged_ones(self):
+        ended = self._seed(1, cost=0.25, endedReason='customer-ended-call', endedAt='2025-01-01T01:05:00Z')
+        unchanged = self._seed(2)
+        VapiCall.objects.create(business=self.business, call_id=ended['id'], status='in-progress')
+        VapiCall.objects.create(business=self.business, call_id=unchanged['id'], org_id='standin-org', status='ended')
+
+        stats = self._reconciler().run(since=START, until=START + timedelta(days=1))
+
+        call = VapiCall.objects.get(call_id=ended['id'])
+        self.assertEqual((stats.updated, stats.unchanged, stats.created), (1, 1, 0))
+        self.assertEqual((call.status, call.ended_reason, call.cost), ('ended', 'customer-ended-call', Decimal('0.2500')))
+
+    def test_resumes_from_the_checkpoint(self):
+        self._seed(1)
+        late = self._seed(50)
+
+        first = self._reconciler().run(since=START, until=UNTIL, max_windows=1)
+        self.assertEqual(first.synced_until, START + timedelta(days=1))
+        self.assertFalse(VapiCall.objects.filter(call_id=late['id']).exists())
+
+        self.standin.requests.clear()
+        second = self._reconciler().run(until=UNTIL)
+
+        self.assertEqual(second.created, 1)
+        self.assertEqual(second.synced_until, UNTIL)
+        # Resuming re-scans the overlap before the checkpoint, then the two remaining days
+        self.assertEqual(len(self.standin.requests), 3)
+
+    def test_failed_window_leaves_the_checkpoint_behind_it(self):
+        self._seed(1)
+        reconciler = self._reconciler(concurrency=1)
+        reconciler.run(since=START, until=START + timedelta(days=1))
+
+        self.standin.set_faults(FaultProfile(error_rate=1.0, error_status=400))
+        with self.assertRaises(requests.HTTPError):
+            reconciler.run(until=UNTIL)
+
+        self.assertEqual(VapiCallSyncCheckpoint.objects.get(org_id='org-1').synced_until, START + timedelta(days=1))
+        self.standin.set_faults(FaultProfile())
+        self.assertEqual(reconciler.run(until=UNTIL).synced_until, UNTIL)
+
+    def test_windows_are_applied_page_by_page(self):
+        for hours in (1, 2, 3, 4, 5):
+            self._seed(hours)
+        reconciler = self._reconciler(page_size=2, chunk_size=2)
+
+        with patch.object(reconciler, 'apply', wraps=reconciler.apply) as apply:
+            stats = reconciler.run(since=START, until=START + timedelta(days=1))
+
+        self.assertEqual(stats.created, 5)
+        self.assertEqual([len(call.args[0]) for call in apply.call_args_list], [2, 2, 1])
+
+    def test_more_calls_at_one_instant_than_a_page_fail_the_window(self):
+        self._seed(1)
+        for _ in range(3):
+            self._seed(30)
+        reconciler = self._reconciler(concurrency=1)
+
+        with self.assertRaises(ReconcileWindowError):
+            reconciler.run(since=START, until=UNTIL)
+
+        self.assertEqual(VapiCallSyncCheckpoint.objects.get(org_id='org-1').synced_until, START + timedelta(days=1))
@@ -0,0 +1,84 @@
+"""
+Service name matching tests
+"""
+from django.test import SimpleTestCase, TestCase, override_settings
+from apps.core.factories import BusinessFactory, ServiceFactory
+from apps.core.testing import LOCMEM_CACHE
+from apps.vapi_integration.domain_services import AppointmentBookingDomainService
+from apps.vapi_integration.service_matcher import ServiceMatcher, service_matcher_registry
+
+CATALOG = [
+    {'id': 1, 'name': 'Corte de pelo'},
+    {'id': 2, 'name': 'Corte de barba'},
+    {'id': 3, 'name': 'Coloración'},
+    {'id': 4, 'name': 'Uñas de gel'},
+    {'id': 5, 'name': 'Masaje relajante'},
+]
+
+
+class ServiceMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = ServiceMatcher(CATALOG)
+
+    def test_accents_word_order_and_stopwords(self):
+        self.assertEqual(self.matcher.match('corte pelo').service_id, 1)
+        self.assertEqual(self.matcher.match('COLORACION').confidence, 1.0)
+        self.assertEqual(self.matcher.match('una uña de gel').service_id, 4)
+
+    def test_synonyms_and_typos(self):
+        self.assertEqual(self.matcher.match('corte de cabello').service_id, 1)
+        self.assertEqual(self.matcher.match('haircut').service_id, 1)
+        self.assertEqual(self.matcher.match('tinte').service_id, 3)
+        self.assertEqual(self.matcher.match('massaje relajante').service_id, 5)
+
+        match = self.matcher.match('corte de pleo')
+        self.assertEqual(match.service_id, 1)
+        self.assertLess(match.confidence, 1.0)
+
+    def test_ranks_best_match_first(self):
+        ranked = self.matcher.rank('corte barba')
+
+        self.assertEqual(ranked[0].service_id, 2)
+        self.assertGreater(ranked[0].confidence, ranked[1].confidence)
+
+    def test_rejects_unrelated_names(self):
+        self.assertIsNone(self.matcher.match('alquiler de coche'))
+        self.assertIsNone(self.matcher.match(''))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ServiceMatcherRegistryTests(TestCase):
+    def setUp(self):
+        self.business = BusinessFactory()
+        self.service = ServiceFactory(business=self.business, name='Corte de pelo', duration=30)
+
+    def test_matches_without_query_once_built(self):
+        service_matcher_registry.get_matcher(self.business.id)
+
+        with self.assertNumQueries(0):
+            service = AppointmentBookingDomainService(self.business)._find_service('corte pelo')
+
+        self.assertEqual(service.pk, self.service.pk)
+        self.assertEqual(service.duration, 30)
+
+    def test_service_changes_rebuild_the_index(self):
+        service_matcher_registry.get_matcher(self.business.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            ServiceFactory(business=self.business, name='Manicura')
+
+        self.assertEqual(service_matcher_registry.match(self.business.id, 'manicure').name, 'Manicura')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.delete()
+        self.assertIsNone(service_matcher_registry.match(self.business.id, 'corte de pelo'))
+
+    def test_catalog_version_moves_only_on_commit(self):
+        matcher = service_matcher_registry.get_matcher(self.business.id)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            ServiceFactory(business=self.business, name='Manicura')
+            self.assertIs(service_matcher_registry.get_matcher(self.business.id), matcher)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(service_matcher_registry.match(self.business.id, 'manicure').name, 'Manicura')
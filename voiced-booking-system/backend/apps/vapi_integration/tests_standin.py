@@ -0,0 +1,85 @@
+"""
+Local Vapi stand-in server tests
+"""
+import time
+import requests
+from django.test import SimpleTestCase, TestCase, override_settings
+from apps.core.factories import BusinessFactory
+from apps.core.testing import LOCMEM_CACHE
+from apps.vapi_integration.api_client import VapiAPIClient
+from apps.vapi_integration.multi_tenant_services import TenantRegistrationService, shared_agent_registry
+from apps.vapi_integration.optimizations import VapiCacheKeys, vapi_cache_service
+from apps.vapi_integration.standin import FaultProfile, VapiStandIn
+
+
+class StandInTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.standin = VapiStandIn().start()
+        self.addCleanup(self.standin.stop)
+        settings_override = override_settings(VAPI_BASE_URL=self.standin.url, VAPI_API_KEY='standin-key')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _get(self, path, **kwargs):
+        return requests.get(f'{self.standin.url}{path}', headers={'Authorization': 'Bearer standin-key'}, timeout=5, **kwargs)
+
+
+class VapiStandInTests(StandInTestMixin, SimpleTestCase):
+    def test_client_round_trip(self):
+        client = VapiAPIClient()
+
+        assistant = client.create_assistant({'name': 'Recepción'})
+        client.update_assistant(assistant['id'], {'firstMessage': 'Hola'})
+        number = client.buy_phone_number(area_code='34', name='Madrid')
+        client.update_phone_number(number['id'], {'assistantId': assistant['id']})
+        call = client.create_phone_call('+34600000001', assistant['id'], phone_number_id=number['id'])
+
+        self.assertEqual(client.get_assistant(assistant['id'])['firstMessage'], 'Hola')
+        self.assertEqual(client.list_phone_numbers()[0]['assistantId'], assistant['id'])
+        self.assertEqual(client.get_call(call['id'])['customer'], {'number': '+34600000001'})
+        self.assertTrue(client.delete_assistant(assistant['id']))
+        self.assertEqual(self._get(f"/assistant/{assistant['id']}").status_code, 404)
+
+    def test_lists_calls_newest_first_with_created_at_bounds(self):
+        for created_at in ('2025-01-01T10:00:00.000Z', '2025-01-02T10:00:00.000Z', '2025-01-03T10:00:00.000Z'):
+            self.standin.state.add_call({'createdAt': created_at, 'status': 'ended'})
+
+        calls = VapiAPIClient().list_calls(limit=2, createdAtGt='2025-01-01T10:00:00.000Z')
+
+        self.assertEqual([call['createdAt'][:10] for call in calls], ['2025-01-03', '2025-01-02'])
+
+    def test_injects_failures_rate_limits_and_latency(self):
+        self.assertEqual(requests.get(f'{self.standin.url}/assistant', timeout=5).status_code, 401)
+
+        self.standin.set_faults(FaultProfile(error_rate=1.0, error_status=503))
+        self.assertEqual(self._get('/assistant').status_code, 503)
+
+        self.standin.set_faults(FaultProfile(rate_limit_per_second=1, rate_limit_burst=2))
+        statuses = [self._get('/assistant') for _ in range(3)]
+        self.assertEqual([response.status_code for response in statuses], [200, 200, 429])
+        self.assertEqual(statuses[-1].headers['Retry-After'], '1')
+
+        self.standin.set_faults(FaultProfile(latency_ms=100))
+        started = time.perf_counter()
+        self._get('/phone-number')
+        self.assertGreaterEqual(time.perf_counter() - started, 0.1)
+        self.assertEqual(self.standin.requests[-1], ('GET', '/phone-number'))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TenantRegistrationStandInTests(StandInTestMixin, TestCase):
+    def test_registers_a_tenant_offline(self):
+        shared_agent = VapiAPIClient().create_assistant({'name': 'Shared'})
+        shared_agent_registry.invalidate()
+        vapi_cache_service.set(VapiCacheKeys.shared_agent(), shared_agent['id'])
+        business = BusinessFactory()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = TenantRegistrationService().register_tenant(business, area_code='34')
+
+        self.assertTrue(result['success'], result)
+        number = self.standin.state.phone_numbers[result['phone_number_id']]
+        self.assertEqual(number['assistantId'], shared_agent['id'])
+        self.assertEqual(number['metadata']['tenant_id'], str(business.id))
+        self.assertEqual(business.vapi_configurations.get().phone_number, number['number'])
@@ -0,0 +1,141 @@
+"""
+Tenant resolution cache tests
+"""
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from apps.payments.models import Subscription, SubscriptionPlan
+from apps.core.factories import BusinessFactory
+from apps.core.testing import LOCMEM_CACHE
+from apps.vapi_integration.multi_tenant_services import MetadataExtractor
+from apps.vapi_integration.models import VapiConfiguration
+from apps.vapi_integration.security import WebhookRateLimiter
+from apps.vapi_integration.tenant_cache import TenantResolver, TenantRoutingTable, tenant_resolver
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TenantResolverTests(TestCase):
+    def setUp(self):
+        self.business = BusinessFactory(slug='peluqueria-ana', allow_voice_booking=False)
+        self.resolver = TenantResolver()
+
+    def test_snapshot_fields(self):
+        snapshot = self.resolver.get_by_id(self.business.id)
+
+        self.assertEqual(snapshot.id, str(self.business.id))
+        self.assertEqual(snapshot.slug, 'peluqueria-ana')
+        self.assertEqual(snapshot.timezone, 'Europe/Madrid')
+        self.assertFalse(snapshot.accepts_voice_bookings)
+
+    def test_steady_state_does_not_query(self):
+        self.resolver.get_by_id(self.business.id)
+        self.resolver.get_by_slug('peluqueria-ana')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolver.get_by_id(self.business.id).name, self.business.name)
+            self.assertEqual(self.resolver.get_by_slug('peluqueria-ana').id, str(self.business.id))
+
+    def test_unknown_or_malformed_tenant(self):
+        self.assertIsNone(self.resolver.get_by_id('not-a-uuid'))
+        self.assertIsNone(self.resolver.get_by_slug('missing'))
+
+    def test_business_save_invalidates(self):
+        tenant_resolver.get_by_id(self.business.id)
+        self.business.name = 'Peluquería Ana'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.business.save()
+
+        self.assertEqual(tenant_resolver.get_by_id(self.business.id).name, 'Peluquería Ana')
+
+    def test_snapshot_is_kept_until_the_save_commits(self):
+        tenant_resolver.get_by_id(self.business.id)
+        self.business.name = 'Peluquería Ana'
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.business.save()
+            self.assertNotEqual(tenant_resolver.get_by_id(self.business.id).name, 'Peluquería Ana')
+
+        self.assertEqual(len(callbacks), 1)
+
+    def test_metadata_extractor_returns_business_without_query(self):
+        webhook_data = {'message': {'call': {'metadata': {'tenant_id': str(self.business.id)}}}}
+        tenant_resolver.get_by_id(self.business.id)
+
+        with self.assertNumQueries(0):
+            business = MetadataExtractor.get_business_from_metadata(webhook_data)
+
+        self.assertEqual(business.pk, self.business.pk)
+        self.assertEqual(business.slug, 'peluqueria-ana')
+
+    def test_snapshot_carries_plan_webhook_limits(self):
+        self.assertIsNone(self.resolver.get_by_id(self.business.id).webhook_rate_per_minute)
+
+        plan = SubscriptionPlan.objects.create(name='Pro', price_monthly=49, max_webhooks_per_minute=1200, webhook_burst=200)
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.create(
+                business=self.business, plan=plan, status='active',
+                current_period_start=timezone.now(), current_period_end=timezone.now() + timedelta(days=30),
+            )
+        snapshot = tenant_resolver.get_by_id(self.business.id)
+
+        self.assertEqual((snapshot.webhook_rate_per_minute, snapshot.webhook_burst), (1200, 200))
+        self.assertEqual(WebhookRateLimiter._limits(snapshot), [20, 200])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TenantRoutingTableTests(TestCase):
+    def setUp(self):
+        self.business = BusinessFactory()
+        self.other_business = BusinessFactory()
+        VapiConfiguration.objects.create(
+            business=self.business,
+            phone_number_id='pn-123',
+            phone_number='+34 600 111 222',
+            assistant_id='shared-agent',
+            server_url='https://example.com/vapi/webhook/',
+            metadata={'note': 'configured without tenant metadata'},
+        )
+        VapiConfiguration.objects.create(
+            business=self.other_business,
+            phone_number_id='pn-456',
+            assistant_id='shared-agent',
+            server_url='https://example.com/vapi/webhook/',
+        )
+        self.routing_table = TenantRoutingTable()
+
+    def test_resolves_by_phone_number_id_and_dialed_number(self):
+        self.assertEqual(self.routing_table.resolve(phone_number_id='pn-123'), str(self.business.id))
+        self.assertEqual(self.routing_table.resolve(phone_number='+34600111222'), str(self.business.id))
+
+    def test_shared_assistant_is_not_a_route(self):
+        self.assertIsNone(self.routing_table.resolve(assistant_id='shared-agent'))
+
+    @override_settings(VAPI_SHARED_AGENT_ID='env-shared-agent')
+    def test_single_tenant_on_the_shared_agent_is_not_a_route(self):
+        VapiConfiguration.objects.filter(business=self.other_business).delete()
+        dedicated = BusinessFactory()
+        VapiConfiguration.objects.create(
+            business=dedicated, phone_number_id='pn-789', assistant_id='dedicated-agent', is_shared_agent=False,
+            server_url='https://example.com/vapi/webhook/',
+        )
+        VapiConfiguration.objects.create(
+            business=BusinessFactory(), phone_number_id='pn-790', assistant_id='env-shared-agent', is_shared_agent=False,
+            server_url='https://example.com/vapi/webhook/',
+        )
+
+        self.assertIsNone(self.routing_table.resolve(assistant_id='shared-agent'))
+        self.assertIsNone(self.routing_table.resolve(assistant_id='env-shared-agent'))
+        self.assertEqual(self.routing_table.resolve(assistant_id='dedicated-agent'), str(dedicated.id))
+
+    def test_lookups_after_build_do_not_query(self):
+        self.routing_table.rebuild()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.routing_table.resolve(phone_number_id='pn-456'), str(self.other_business.id))
+
+    def test_metadata_extractor_falls_back_to_routing(self):
+        webhook_data = {'message': {'call': {'id': 'call-1', 'phoneNumberId': 'pn-123'}}}
+
+        tenant_info = MetadataExtractor.extract_tenant_info(webhook_data)
+
+        self.assertEqual(tenant_info['tenant_id'], str(self.business.id))
@@ -0,0 +1,89 @@
+"""
+Vapi API transport tests
+"""
+import requests
+from unittest.mock import patch
+from django.test import SimpleTestCase, override_settings
+from apps.core.metrics import MetricsRecorder
+from apps.vapi_integration.api_client import VapiAPIClient
+from apps.vapi_integration.standin import FaultProfile, VapiStandIn
+from apps.vapi_integration.transport import VapiTransport
+
+AUTH = {'Authorization': 'Bearer standin-key'}
+
+
+@override_settings(VAPI_HTTP_MAX_RETRIES=2, VAPI_HTTP_BACKOFF_BASE=0.25, VAPI_HTTP_RETRY_AFTER_MAX=30)
+class VapiTransportTests(SimpleTestCase):
+    def setUp(self):
+        self.standin = VapiStandIn().start()
+        self.addCleanup(self.standin.stop)
+        self.sleeps = []
+        self.transport = VapiTransport(sleep=self.sleeps.append)
+        self.recorder = MetricsRecorder(flush_interval=0)
+        patcher = patch('apps.vapi_integration.transport.metrics', self.recorder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _request(self, method, path, endpoint='get_assistant', **kwargs):
+        return self.transport.request(method, f'{self.standin.url}{path}', endpoint, headers=AUTH, **kwargs)
+
+    def test_retries_idempotent_requests_with_jittered_backoff(self):
+        self.standin.set_faults(FaultProfile(error_rate=1.0, error_status=503))
+
+        response = self._request('GET', '/assistant')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.standin.requests), 3)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertTrue(0 <= self.sleeps[0] <= 0.25 and 0 <= self.sleeps[1] <= 0.5)
+        self.assertEqual(self.recorder.snapshot('vapi.api.retry')['vapi.api.retry|endpoint=get_assistant']['count'], 2)
+
+    def test_never_repeats_a_failed_post(self):
+        self.standin.set_faults(FaultProfile(error_rate=1.0, error_status=503))
+
+        self.assertEqual(self._request('POST', '/phone-number/buy', 'buy_phone_number', json={}).status_code, 503)
+        self.assertEqual(len(self.standin.requests), 1)
+
+        self.standin.set_faults(FaultProfile(error_rate=1.0, error_status=503))
+        self._request('PATCH', '/assistant/a-1', 'update_assistant', idempotent=True, json={})
+        self.assertEqual(len(self.standin.requests), 4)
+
+    def test_honors_retry_after_even_for_posts(self):
+        self.standin.set_faults(FaultProfile(rate_limit_per_second=0.5, rate_limit_burst=1))
+        self._request('POST', '/assistant', 'create_assistant', json={})
+
+        response = self._request('POST', '/assistant', 'create_assistant', json={})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.sleeps, [2.0, 2.0])
+
+    @override_settings(VAPI_HTTP_RETRY_AFTER_MAX=1)
+    def test_gives_up_when_retry_after_exceeds_the_cap(self):
+        self.standin.set_faults(FaultProfile(rate_limit_per_second=0.5, rate_limit_burst=1))
+        self._request('GET', '/assistant')
+
+        self.assertEqual(self._request('GET', '/assistant').status_code, 429)
+        self.assertEqual(self.sleeps, [])
+
+    @override_settings(VAPI_HTTP_ENDPOINT_READ_TIMEOUTS={'get_assistant': 0.05})
+    def test_read_timeouts_are_bounded_per_endpoint(self):
+        self.standin.set_faults(FaultProfile(latency_ms=300))
+
+        with self.assertRaises(requests.ReadTimeout):
+            self._request('GET', '/assistant')
+
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertEqual(self.transport.timeout_for('buy_phone_number')[1], 30)
+        errors = self.recorder.snapshot('vapi.api.error')
+        self.assertEqual(errors['vapi.api.error|endpoint=get_assistant,reason=ReadTimeout']['count'], 3)
+
+    def test_clients_share_one_pooled_session(self):
+        with override_settings(VAPI_BASE_URL=self.standin.url, VAPI_API_KEY='standin-key'):
+            first, second = VapiAPIClient(transport=self.transport), VapiAPIClient(transport=self.transport)
+            assistant = first.create_assistant({'name': 'Pool'})
+            second.get_assistant(assistant['id'])
+
+        self.assertIs(first.transport.session, second.transport.session)
+        self.assertIs(VapiAPIClient().transport, VapiAPIClient().transport)
+        timings = self.recorder.snapshot('vapi.api')
+        self.assertEqual(timings['vapi.api|endpoint=get_assistant,status=200']['count'], 1)
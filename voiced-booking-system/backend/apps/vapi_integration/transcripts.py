@@ -0,0 +1,88 @@
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from django.utils.dateparse import parse_datetime
+from .models import VapiCallTranscript, VapiCallTranscriptSegment
+import hashlib
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptSegmentStore:
+    ROLE_LABELS = {'assistant': 'AI', 'user': 'User'}
+    
+    def __init__(self):
+        self._local = threading.local()
+    
+    def append(self, call_id: str, message: Dict) -> Optional[VapiCallTranscriptSegment]:
+        if message.get('transcriptType', 'final') != 'final' or not message.get('transcript'):
+            return None
+        
+        seq = self._timestamp_ms(message.get('timestamp'))
+        if seq is None:
+            # Without Vapi's timestamp a segment can be neither ordered nor recognised when redelivered
+            logger.warning(f"Skipped transcript segment for call {call_id} with timestamp {message.get('timestamp')!r}")
+            return None
+        
+        # The timestamp orders segments; the fingerprint collapses redeliveries onto one row
+        role, text = message.get('role', ''), message['transcript']
+        segment = VapiCallTranscriptSegment(
+            call_id=call_id,
+            seq=seq,
+            fingerprint=hashlib.sha1(f"{seq}:{role}:{text}".encode()).hexdigest(),
+            role=role,
+            text=text,
+        )
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            self._write([segment])
+        else:
+            buffer.append(segment)
+        return segment
+    
+    @contextmanager
+    def buffered(self):
+        self._local.buffer = []
+        try:
+            yield
+        finally:
+            buffer, self._local.buffer = self._local.buffer, None
+            self._write(buffer)
+    
+    def assemble(self, call_id: str) -> Tuple[str, List[Dict]]:
+        segments = VapiCallTranscriptSegment.objects.filter(call_id=call_id).order_by('seq').values_list('seq', 'role', 'text')
+        lines = []
+        messages = []
+        for seq, role, text in segments:
+            lines.append(f"{self.ROLE_LABELS.get(role, role or 'Unknown')}: {text}")
+            messages.append({'role': role, 'message': text, 'time': seq})
+        return '\n'.join(lines), messages
+    
+    def compact(self, call, transcript: str = '', messages: Optional[List[Dict]] = None):
+        if not transcript:
+            transcript, messages = self.assemble(call.call_id)
+        if transcript:
+            VapiCallTranscript.objects.update_or_create(
+                call=call,
+                defaults={'transcript': transcript, 'messages': messages or []}
+            )
+        VapiCallTranscriptSegment.objects.filter(call_id=call.call_id).delete()
+    
+    @staticmethod
+    def _timestamp_ms(value) -> Optional[int]:
+        if isinstance(value, str):
+            parsed = parse_datetime(value)
+            if parsed is not None:
+                return int(parsed.timestamp() * 1000)
+        try:
+            return int(float(value)) if value not in (None, '') else None
+        except (TypeError, ValueError, OverflowError):
+            return None
+    
+    def _write(self, segments: List[VapiCallTranscriptSegment]):
+        if segments:
+            VapiCallTranscriptSegment.objects.bulk_create(segments, ignore_conflicts=True)
+
+
+transcript_segments = TranscriptSegmentStore()
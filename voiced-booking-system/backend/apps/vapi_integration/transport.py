@@ -0,0 +1,120 @@
+from datetime import datetime, timezone as dt_timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional, Tuple
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from apps.core.metrics import metrics
+import os
+import random
+import threading
+import time
+import requests
+import logging
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Read timeouts in seconds; purchases, assistant writes and call listings legitimately take longer than lookups
+ENDPOINT_READ_TIMEOUTS = {
+    'buy_phone_number': 30,
+    'create_assistant': 20,
+    'update_assistant': 20,
+    'list_calls': 30,
+}
+
+
+class VapiTransport:
+    def __init__(self, sleep: Callable[[float], None] = time.sleep):
+        self._sleep = sleep
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+    
+    @property
+    def session(self) -> requests.Session:
+        # Pooled sockets must not be shared with forked workers, so each process builds its own session
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session = self._build_session()
+                    self._pid = os.getpid()
+        return self._session
+    
+    def timeout_for(self, endpoint: str) -> Tuple[float, float]:
+        overrides = getattr(settings, 'VAPI_HTTP_ENDPOINT_READ_TIMEOUTS', {})
+        read_timeout = overrides.get(endpoint) or ENDPOINT_READ_TIMEOUTS.get(endpoint) or settings.VAPI_HTTP_READ_TIMEOUT
+        return settings.VAPI_HTTP_CONNECT_TIMEOUT, read_timeout
+    
+    def request(self, method: str, url: str, endpoint: str, idempotent: Optional[bool] = None, **kwargs) -> requests.Response:
+        method = method.upper()
+        retryable = method in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        kwargs.setdefault('timeout', self.timeout_for(endpoint))
+        attempts = settings.VAPI_HTTP_MAX_RETRIES + 1
+        
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                self._record(endpoint, started, type(e).__name__)
+                # A connect timeout never reached Vapi, so even a POST is safe to send again
+                if last_attempt or not (retryable or isinstance(e, requests.ConnectTimeout)):
+                    raise
+                self._backoff(endpoint, attempt)
+                continue
+            
+            self._record(endpoint, started, response.status_code)
+            # A 429 means Vapi refused the request before acting on it, whatever the verb
+            if last_attempt or response.status_code not in RETRY_STATUSES or not (retryable or response.status_code == 429):
+                return response
+            if not self._backoff(endpoint, attempt, response.headers.get('Retry-After')):
+                return response
+            response.close()
+        return response
+    
+    def _backoff(self, endpoint: str, attempt: int, retry_after: Optional[str] = None) -> bool:
+        delay = self._parse_retry_after(retry_after)
+        if delay is None:
+            # Full jitter keeps workers that failed together from retrying together
+            delay = random.uniform(0, min(settings.VAPI_HTTP_BACKOFF_MAX, settings.VAPI_HTTP_BACKOFF_BASE * 2 ** attempt))
+        elif delay > settings.VAPI_HTTP_RETRY_AFTER_MAX:
+            logger.warning(f"Vapi asked to retry {endpoint} after {delay:.0f}s, giving up")
+            return False
+        
+        metrics.increment('vapi.api.retry', endpoint=endpoint)
+        self._sleep(delay)
+        return True
+    
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max((parsedate_to_datetime(value) - datetime.now(dt_timezone.utc)).total_seconds(), 0.0)
+        except (TypeError, ValueError):
+            return None
+    
+    @staticmethod
+    def _record(endpoint: str, started: float, outcome):
+        metrics.timing('vapi.api', (time.perf_counter() - started) * 1000, endpoint=endpoint, status=str(outcome))
+        if not isinstance(outcome, int) or outcome >= 400:
+            metrics.increment('vapi.api.error', endpoint=endpoint, reason=str(outcome))
+    
+    @staticmethod
+    def _build_session() -> requests.Session:
+        session = requests.Session()
+        # Retries are handled above with backoff and metrics, so urllib3's own are disabled
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.VAPI_HTTP_POOL_SIZE, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+
+vapi_transport = VapiTransport()
@@ -10,7 +10,8 @@ router.register(r'calls', views.VapiCallViewSet, basename='call')
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('webhook/', views.VapiWebhookViewSet.as_view({'post': 'create'}), name='webhook'),
+    path('webhook/', views.VapiWebhookView.as_view(), name='webhook'),
+    path('webhook/<uuid:tenant_id>/', views.VapiWebhookView.as_view(), name='tenant-webhook'),
     path('business/<int:business_id>/', include([
         path('calls/outbound/', views.VapiCallViewSet.as_view({'post': 'make_outbound_call'}), name='outbound-call'),
     ])),
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime
 
 
@@ -79,6 +79,61 @@ class VapiEventType:
     @property
     def is_end_of_call_report(self) -> bool:
         return self.value == 'end-of-call-report'
+    
+    @property
+    def requires_sync_response(self) -> bool:
+        return self.is_assistant_request or self.is_function_call
+
+
+@dataclass(frozen=True)
+class TenantSnapshot:
+    id: str
+    slug: str
+    name: str
+    timezone: str
+    locale: str
+    currency: str
+    is_active: bool
+    allow_voice_booking: bool
+    require_approval: bool
+    subscription_status: str
+    webhook_timeout: Optional[int] = None
+    max_duration_seconds: Optional[int] = None
+    language: Optional[str] = None
+    webhook_rate_per_minute: Optional[int] = None
+    webhook_burst: Optional[int] = None
+    
+    @property
+    def accepts_voice_bookings(self) -> bool:
+        return self.is_active and self.allow_voice_booking
+
+
+@dataclass(frozen=True)
+class CallContext:
+    call_id: str
+    tenant: TenantSnapshot
+    services: Tuple[Dict[str, Any], ...]
+    weekly_hours: Dict[int, Dict[str, Any]]
+    
+    def hours_for(self, day_of_week: int) -> Optional[Dict[str, Any]]:
+        return self.weekly_hours.get(day_of_week)
+    
+    def get_service(self, service_id) -> Optional[Dict[str, Any]]:
+        return next((service for service in self.services if str(service['id']) == str(service_id)), None)
+
+
+@dataclass(frozen=True)
+class ServiceMatch:
+    service: Dict[str, Any]
+    confidence: float
+    
+    @property
+    def service_id(self):
+        return self.service['id']
+    
+    @property
+    def name(self) -> str:
+        return self.service['name']
 
 
 @dataclass(frozen=True)
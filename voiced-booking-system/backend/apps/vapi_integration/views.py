@@ -2,20 +2,32 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
+from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.db.models import Sum, Count
 from datetime import date, datetime, timedelta
-from apps.core.permissions import IsBusinessMember
+from apps.core.permissions import BusinessStaffPermission
 from apps.businesses.models import Business
 from .models import VapiConfiguration, VapiCall, VapiUsageMetrics
 from .serializers import VapiConfigurationSerializer, VapiCallSerializer
-from .security import WebhookSecurityManager
+from .security import WebhookSecurityManager, webhook_rate_limiter, webhook_verifier
 from .processors import WebhookProcessor
+from .multi_tenant_services import MetadataExtractor
+from .tenant_cache import tenant_resolver
+from .ingestion import WebhookEventStream
+from .transcripts import transcript_segments
 from .api_client import VapiBusinessService
 from .value_objects import BusinessSlug
 from .tasks import calculate_daily_usage_metrics, generate_monthly_billing_report
+import json
+import math
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,7 +35,7 @@ logger = logging.getLogger(__name__)
 
 class VapiConfigurationViewSet(viewsets.ModelViewSet):
     serializer_class = VapiConfigurationSerializer
-    permission_classes = [IsAuthenticated, IsBusinessMember]
+    permission_classes = [IsAuthenticated, BusinessStaffPermission]
     
     def get_queryset(self):
         business_id = self.kwargs.get('business_id') or self.request.query_params.get('business_id')
@@ -139,7 +151,7 @@ class VapiConfigurationViewSet(viewsets.ModelViewSet):
 
 class VapiCallViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = VapiCallSerializer
-    permission_classes = [IsAuthenticated, IsBusinessMember]
+    permission_classes = [IsAuthenticated, BusinessStaffPermission]
     
     def get_queryset(self):
         business_id = self.kwargs.get('business_id') or self.request.query_params.get('business_id')
@@ -152,7 +164,7 @@ class VapiCallViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['post'])
     def make_outbound_call(self, request):
-        from .multi_tenant_services import SharedAgentManager
+        from .multi_tenant_services import shared_agent_registry
         from .api_client import VapiAPIClient
         
         business_id = self.kwargs.get('business_id') or request.data.get('business_id')
@@ -171,12 +183,11 @@ class VapiCallViewSet(viewsets.ReadOnlyModelViewSet):
                     'error': 'No VAPI configuration found for business'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            shared_agent = SharedAgentManager()
             client = VapiAPIClient()
             
             result = client.create_phone_call(
                 phone_number=phone_number,
-                assistant_id=shared_agent.shared_agent_id,
+                assistant_id=shared_agent_registry.get_agent_id(wait=True),
                 phone_number_id=config.phone_number_id,
                 metadata={'tenant_id': str(business.id), 'business_slug': business.slug}
             )
@@ -203,7 +214,9 @@ class VapiCallViewSet(viewsets.ReadOnlyModelViewSet):
                 'transcript': call.transcript.transcript,
                 'messages': call.transcript.messages
             })
-        return Response({'transcript': '', 'messages': []})
+        
+        transcript, messages = transcript_segments.assemble(call.call_id)
+        return Response({'transcript': transcript, 'messages': messages})
     
     @action(detail=True, methods=['get'])
     def analysis(self, request, pk=None):
@@ -217,17 +230,66 @@ class VapiCallViewSet(viewsets.ReadOnlyModelViewSet):
         return Response({'summary': '', 'structured_data': {}, 'success_evaluation': ''})
 
 
+def _process_webhook(business, webhook_data, started):
+    close_old_connections()
+    try:
+        return WebhookProcessor(business).process_webhook(webhook_data, started=started)
+    finally:
+        close_old_connections()
+
+
 @method_decorator(csrf_exempt, name='dispatch')
-class VapiWebhookViewSet(viewsets.ViewSet):
-    permission_classes = []
+class VapiWebhookView(View):
+    http_method_names = ['post']
     
-    def create(self, request):
-        processor = WebhookProcessor()
-        result = processor.process_webhook(request.data)
+    async def post(self, request, tenant_id=None):
+        started = time.monotonic()
+        signature = request.headers.get('X-Vapi-Signature')
+        if tenant_id is None:
+            tenant_id = webhook_verifier.header_tenant(request)
+        # The signature covers the exact bytes Vapi sent, so it is checked before the payload is trusted
+        if not await webhook_verifier.averify(request.body, signature, tenant_id):
+            return JsonResponse({'error': 'Invalid webhook signature'}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        try:
+            webhook_data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON payload'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if tenant_id is not None:
+            # A payload signed with the tenant's own secret is routed to that tenant, whatever its metadata says
+            call_data = webhook_data.setdefault('message', {}).setdefault('call', {})
+            call_data['metadata'] = {**(call_data.get('metadata') or {}), 'tenant_id': str(tenant_id)}
+        
+        if WebhookEventStream.accepts(webhook_data):
+            try:
+                message_id = await WebhookEventStream().apublish(webhook_data)
+                return JsonResponse({'status': 'accepted', 'message_id': message_id})
+            except Exception as e:
+                logger.error(f"Webhook stream unavailable, processing inline: {e}")
+        
+        tenant = await MetadataExtractor.aget_tenant_from_metadata(webhook_data)
+        if tenant is None:
+            logger.error("No business found in webhook metadata")
+            return JsonResponse({'error': 'Business not found in metadata'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        decision = await webhook_rate_limiter.acheck(tenant)
+        if not decision.allowed:
+            response = JsonResponse({'error': 'Rate limit exceeded'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(max(1, math.ceil(decision.retry_after_ms / 1000)))
+            return response
+        
+        business = tenant_resolver.to_business(tenant)
+        # Handlers and voice functions are synchronous ORM code. They run on a pool thread that is not
+        # pinned to the request thread, so slow webhooks don't queue behind each other on one thread.
+        result = await sync_to_async(_process_webhook, thread_sensitive=False)(business, webhook_data, started)
         
+        if result.get('status') == 'in_flight':
+            # Another delivery of this event holds the lease; a retryable status makes Vapi send it again
+            response = JsonResponse(result, status=status.HTTP_409_CONFLICT)
+            response['Retry-After'] = str(settings.VAPI_WEBHOOK_DEDUPE_LEASE)
+            return response
         if 'error' in result:
             logger.error(f"Webhook processing failed: {result}")
-            return Response(result, status=status.HTTP_400_BAD_REQUEST)
-        else:
-            logger.info("Webhook processed successfully")
-            return Response(result, status=status.HTTP_200_OK)
+            return JsonResponse(result, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse(result)
@@ -28,6 +28,18 @@ app.conf.beat_schedule = {
         'task': 'apps.analytics.tasks.update_daily_metrics',
         'schedule': 60.0 * 60.0,  # Hourly
     },
+    'refresh-vapi-shared-agent': {
+        'task': 'apps.vapi_integration.tasks.refresh_shared_agent',
+        'schedule': 60.0 * 15.0,  # Every 15 minutes
+    },
+    'reconcile-vapi-calls': {
+        'task': 'apps.vapi_integration.tasks.reconcile_vapi_calls',
+        'schedule': 60.0 * 60.0,  # Hourly
+    },
+    'replenish-phone-number-pool': {
+        'task': 'apps.vapi_integration.tasks.replenish_phone_number_pool',
+        'schedule': 60.0 * 10.0,  # Every 10 minutes
+    },
 }
 
 app.conf.timezone = 'UTC'
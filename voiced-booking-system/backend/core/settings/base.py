@@ -228,6 +228,9 @@ CORS_ALLOW_CREDENTIALS = config('CORS_ALLOW_CREDENTIALS', default=True, cast=boo
 # Redis Configuration
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 
+# Runtime metrics are aggregated in-process and flushed to Redis every N seconds (0 disables flushing)
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=10, cast=int)
+
 # Celery Configuration
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=REDIS_URL)
 CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default=REDIS_URL)
@@ -274,6 +277,80 @@ VAPI_BASE_URL = config('VAPI_BASE_URL', default='https://api.vapi.ai')
 VAPI_WEBHOOK_BASE_URL = config('VAPI_WEBHOOK_BASE_URL', default='https://yourdomain.com')
 VAPI_SHARED_AGENT_ID = config('VAPI_SHARED_AGENT_ID', default='')
 
+# Vapi webhook ingestion: 'sync' processes every event in the request,
+# 'stream' acks fire-and-forget events and drains them from a Redis stream
+VAPI_WEBHOOK_INGESTION_MODE = config('VAPI_WEBHOOK_INGESTION_MODE', default='sync')
+VAPI_WEBHOOK_STREAM = config('VAPI_WEBHOOK_STREAM', default='vapi:webhook:events')
+VAPI_WEBHOOK_STREAM_GROUP = config('VAPI_WEBHOOK_STREAM_GROUP', default='vapi-webhook-workers')
+VAPI_WEBHOOK_STREAM_MAXLEN = config('VAPI_WEBHOOK_STREAM_MAXLEN', default=100000, cast=int)
+VAPI_WEBHOOK_STREAM_MAX_DELIVERIES = config('VAPI_WEBHOOK_STREAM_MAX_DELIVERIES', default=5, cast=int)
+
+# Redelivered fire-and-forget webhooks are dropped for this many seconds (0 disables the ledger);
+# the lease stays shorter than the stream's reclaim idle time so a crashed worker's events are retried
+VAPI_WEBHOOK_DEDUPE_TTL = config('VAPI_WEBHOOK_DEDUPE_TTL', default=86400, cast=int)
+VAPI_WEBHOOK_DEDUPE_LEASE = config('VAPI_WEBHOOK_DEDUPE_LEASE', default=30, cast=int)
+
+# Per-tenant webhook token bucket for tenants without a subscription plan
+VAPI_WEBHOOK_RATE_PER_MINUTE = config('VAPI_WEBHOOK_RATE_PER_MINUTE', default=300, cast=int)
+VAPI_WEBHOOK_RATE_BURST = config('VAPI_WEBHOOK_RATE_BURST', default=60, cast=int)
+
+# Default per-webhook budget when a tenant has no configuration, and the share of it kept
+# back for returning the response to Vapi
+VAPI_WEBHOOK_TIMEOUT_MS = config('VAPI_WEBHOOK_TIMEOUT_MS', default=7500, cast=int)
+VAPI_WEBHOOK_DEADLINE_MARGIN_MS = config('VAPI_WEBHOOK_DEADLINE_MARGIN_MS', default=500, cast=int)
+
+# Read-only tool calls batched in one webhook run concurrently on this many threads
+VAPI_TOOL_CALL_WORKERS = config('VAPI_TOOL_CALL_WORKERS', default=8, cast=int)
+
+# Outbound Vapi API transport: one pooled session per process, (connect, read) timeouts in seconds
+# with per-endpoint read overrides, and jittered exponential retries for idempotent requests
+VAPI_HTTP_POOL_SIZE = config('VAPI_HTTP_POOL_SIZE', default=20, cast=int)
+VAPI_HTTP_CONNECT_TIMEOUT = config('VAPI_HTTP_CONNECT_TIMEOUT', default=3.05, cast=float)
+VAPI_HTTP_READ_TIMEOUT = config('VAPI_HTTP_READ_TIMEOUT', default=10, cast=float)
+VAPI_HTTP_MAX_RETRIES = config('VAPI_HTTP_MAX_RETRIES', default=3, cast=int)
+VAPI_HTTP_BACKOFF_BASE = config('VAPI_HTTP_BACKOFF_BASE', default=0.25, cast=float)
+VAPI_HTTP_BACKOFF_MAX = config('VAPI_HTTP_BACKOFF_MAX', default=8, cast=float)
+VAPI_HTTP_RETRY_AFTER_MAX = config('VAPI_HTTP_RETRY_AFTER_MAX', default=30, cast=float)
+
+# Call reconciliation pages Vapi's call listing in createdAt windows, several windows in flight at once,
+# and re-scans the overlap before the checkpoint so calls still in progress at the last run are refreshed
+VAPI_ORG_ID = config('VAPI_ORG_ID', default='default')
+VAPI_RECONCILE_LOOKBACK_DAYS = config('VAPI_RECONCILE_LOOKBACK_DAYS', default=30, cast=int)
+VAPI_RECONCILE_WINDOW_HOURS = config('VAPI_RECONCILE_WINDOW_HOURS', default=24, cast=int)
+VAPI_RECONCILE_OVERLAP_MINUTES = config('VAPI_RECONCILE_OVERLAP_MINUTES', default=120, cast=int)
+VAPI_RECONCILE_PAGE_SIZE = config('VAPI_RECONCILE_PAGE_SIZE', default=100, cast=int)
+VAPI_RECONCILE_CHUNK_SIZE = config('VAPI_RECONCILE_CHUNK_SIZE', default=200, cast=int)
+VAPI_RECONCILE_CONCURRENCY = config('VAPI_RECONCILE_CONCURRENCY', default=4, cast=int)
+
+# Dedicated assistants pushed to Vapi in parallel by `vapi_management sync-assistants`
+VAPI_ASSISTANT_SYNC_WORKERS = config('VAPI_ASSISTANT_SYNC_WORKERS', default=8, cast=int)
+
+# Purchased-but-unassigned phone numbers kept per area code, e.g. '34:10,1415:2', so registration
+# claims a number instead of buying one; replenishing buys at most this many numbers per run
+VAPI_PHONE_POOL_TARGETS = config(
+    'VAPI_PHONE_POOL_TARGETS',
+    default='',
+    cast=lambda v: {code.strip(): int(size) for code, size in (item.split(':') for item in v.split(',') if item.strip())}
+)
+VAPI_PHONE_POOL_MAX_PURCHASES = config('VAPI_PHONE_POOL_MAX_PURCHASES', default=20, cast=int)
+
+# Named circuit breakers ('vapi.<endpoint>', 'bookings.book_appointment') share state through the cache:
+# a breaker opens once the failure rate over the window reaches the threshold, then lets a few
+# trial requests through after the cooldown; CIRCUIT_BREAKER_POLICIES overrides these per name
+CIRCUIT_BREAKER_WINDOW = config('CIRCUIT_BREAKER_WINDOW', default=60, cast=int)
+CIRCUIT_BREAKER_MIN_REQUESTS = config('CIRCUIT_BREAKER_MIN_REQUESTS', default=10, cast=int)
+CIRCUIT_BREAKER_FAILURE_RATE = config('CIRCUIT_BREAKER_FAILURE_RATE', default=0.5, cast=float)
+CIRCUIT_BREAKER_COOLDOWN = config('CIRCUIT_BREAKER_COOLDOWN', default=30, cast=int)
+CIRCUIT_BREAKER_HALF_OPEN_REQUESTS = config('CIRCUIT_BREAKER_HALF_OPEN_REQUESTS', default=1, cast=int)
+CIRCUIT_BREAKER_POLICIES = {}
+
+# Extra modules that register voice functions on startup
+VAPI_FUNCTION_MODULES = config(
+    'VAPI_FUNCTION_MODULES',
+    default='',
+    cast=lambda v: [s.strip() for s in v.split(',') if s.strip()]
+)
+
 # Twilio Configuration (Optional)
 TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='')
 TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='')
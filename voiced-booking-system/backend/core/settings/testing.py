@@ -44,6 +44,12 @@ CACHES = {
     }
 }
 
+# Keep runtime metrics in-process during tests
+METRICS_FLUSH_INTERVAL = 0
+
+# No Redis in tests; the webhook ledger is enabled explicitly where exercised
+VAPI_WEBHOOK_DEDUPE_TTL = 0
+
 # Email backend for testing
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 